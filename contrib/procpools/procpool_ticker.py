@@ -0,0 +1,163 @@
+"""
+ProcPool Ticker
+
+Evennia contribution
+
+This is a TickerHandler doing the work of its subscribers in the
+Python process pool (see python_procpool.py), allowing game
+simulation (like AI planning, pathfinding or economy calculations)
+to use more than one CPU core.
+
+Every tick, the subscribing objects are sent to the process pool in
+batches of ProcPoolTicker.batch_size, as packed database references.
+In the pool process, each object is loaded fresh from the database
+and its hook at_tick_compute(*args, **kwargs) is called. This hook
+should only do computation - it must not change the object or the
+database - and return its (pickleable) result. Back in the main
+process, each object's hook at_tick_result(result) is then called
+with that result, in the main thread. This is where the result
+should be applied to the game world.
+
+Example:
+
+    from contrib.procpools.procpool_ticker import PROCPOOL_TICKER_HANDLER
+
+    # plan the route of npc every 10 seconds
+    PROCPOOL_TICKER_HANDLER.add(npc, 10)
+
+The hooks' names can be changed with the hook_key and result_key
+keywords to add(). Subscribers that are not database objects, and
+all subscribers if the process pool is not running, have both their
+hooks called in the main process directly.
+
+A new tick is not started before all results of the previous one
+have been applied. Pending write-behind changes (see
+src/server/writebehind.py) are written to the database before the
+subscribers are sent off, so the pool processes see the current
+state.
+
+Like other custom TickerHandlers, this one does not save its
+subscriptions over a reload on its own; call its save() and restore()
+methods from your AT_STARTSTOP_MODULE to do so.
+
+"""
+
+from time import time
+from twisted.internet.defer import DeferredList
+from contrib.procpools.python_procpool import run_async, get_procpool
+from src.scripts.tickerhandler import Ticker, TickerPool, TickerHandler
+from src.server.writebehind import WRITEBEHIND
+from src.utils.dbserialize import pack_dbobj, unpack_dbobj
+from src.utils.idmapper.base import flush_cache
+from src.utils.logger import log_trace, log_errmsg
+
+_GA = object.__getattribute__
+
+
+def _tick_compute(batch):
+    """
+    This is run in the process pool. batch is a list of (ref,
+    hook_key, args, kwargs) where ref is the packed reference of a
+    subscriber. Returns a list of (success, result or error
+    message), one for each subscriber.
+    """
+    # make sure the subscribers are loaded fresh from the database
+    flush_cache()
+    results = []
+    for ref, hook_key, args, kwargs in batch:
+        obj = unpack_dbobj(("__packed_dbobj__",) + tuple(ref))
+        if not obj:
+            results.append((False, "object was deleted"))
+            continue
+        try:
+            results.append((True, getattr(obj, hook_key)(*args, **kwargs)))
+        except Exception, e:
+            results.append((False, "%s: %s" % (e.__class__.__name__, e)))
+    return results
+
+
+class ProcPoolTicker(Ticker):
+    """
+    Ticker computing the ticks of its subscribers in the process pool.
+    """
+    # number of subscribers sent to a pool process at a time
+    batch_size = 50
+
+    def _callback(self):
+        """
+        Send the subscribers off to the process pool. Returns a
+        deferred firing when all results have been applied.
+        """
+        start = time()
+        subscriptions = self.subscriptions
+        pool = get_procpool()
+        local = []
+        batch = []
+        deferreds = []
+        for store_key in self._tick_keys():
+            obj, args, kwargs = subscriptions[store_key]
+            ref = pool and pack_dbobj(obj)
+            if ref and ref is not obj:
+                batch.append((store_key, ref[1:], args, kwargs))
+                if len(batch) >= self.batch_size:
+                    deferreds.append(self._send(batch))
+                    batch = []
+            else:
+                local.append(store_key)
+        if batch:
+            deferreds.append(self._send(batch))
+        for store_key in local:
+            obj, args, kwargs = subscriptions[store_key]
+            try:
+                result = _GA(obj, kwargs.get("hook_key", "at_tick_compute"))(*args, **kwargs)
+            except Exception:
+                log_trace()
+                continue
+            self._apply(store_key, result)
+        self._record(time() - start)
+        return DeferredList(deferreds)
+
+    def _send(self, batch):
+        "Send a batch of (store_key, ref, args, kwargs) to the process pool"
+        if WRITEBEHIND.pending:
+            WRITEBEHIND.flush()
+        return run_async(_tick_compute,
+                         [(ref, kwargs.get("hook_key", "at_tick_compute"), args, kwargs)
+                          for store_key, ref, args, kwargs in batch],
+                         at_return=self._apply_results,
+                         at_return_kwargs={"store_keys": [entry[0] for entry in batch]},
+                         at_err=self._batch_error)
+
+    def _apply_results(self, results, store_keys=None):
+        "Called in the main process with the results of a batch"
+        for store_key, (success, result) in zip(store_keys, results or ()):
+            if success:
+                self._apply(store_key, result)
+            else:
+                log_errmsg("ProcPoolTicker(%s): %s: %s" % (self.interval, store_key[0], result))
+
+    def _apply(self, store_key, result):
+        "Hand the result of a subscriber's tick to it"
+        subscription = self.subscriptions.get(store_key)
+        if subscription:
+            # the subscriber may have unsubscribed while we waited
+            obj, args, kwargs = subscription
+            try:
+                _GA(obj, kwargs.get("result_key", "at_tick_result"))(result)
+            except Exception:
+                log_trace()
+
+    def _batch_error(self, err):
+        "Called if a batch failed in the process pool"
+        log_errmsg("ProcPoolTicker(%s): %s" % (self.interval, err))
+
+
+class ProcPoolTickerPool(TickerPool):
+    ticker_class = ProcPoolTicker
+
+
+class ProcPoolTickerHandler(TickerHandler):
+    ticker_pool_class = ProcPoolTickerPool
+
+
+PROCPOOL_TICKER_HANDLER = ProcPoolTickerHandler(save_name="procpool_ticker_storage")
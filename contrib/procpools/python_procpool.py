@@ -167,6 +167,22 @@ _SESSIONS = None
 _PROC_ERR = "A process has ended with a probable error condition: process ended by signal 9."
 
 
+def get_procpool(procpool_name="PythonProcPool"):
+    """
+    Get the process pool, or False if it is not running. procpool_name
+    is the Service name of the procpool.
+    """
+    global _PPOOL, _SESSIONS
+    if _PPOOL is None:
+        # Try to load process Pool
+        from src.server.sessionhandler import SESSIONS as _SESSIONS
+        try:
+            _PPOOL = _SESSIONS.server.services.namedServices.get(procpool_name).pool
+        except AttributeError:
+            _PPOOL = False
+    return _PPOOL
+
+
 def run_async(to_execute, *args, **kwargs):
     """
     Runs a function or executes a code snippet asynchronously.
@@ -240,22 +256,14 @@ def run_async(to_execute, *args, **kwargs):
     your to_execute under sqlite3 you will probably run very slow or even get
     tracebacks.
 
-    """
-    # handle all global imports.
-    global _PPOOL, _SESSIONS
+    Returns the deferred of the execution, with the callbacks attached.
 
+    """
     # get the procpool name, if set in kwargs
-    procpool_name = kwargs.get("procpool_name", "PythonProcPool")
-
-    if _PPOOL is None:
-        # Try to load process Pool
-        from src.server.sessionhandler import SESSIONS as _SESSIONS
-        try:
-            _PPOOL = _SESSIONS.server.services.namedServices.get(procpool_name).pool
-        except AttributeError:
-            _PPOOL = False
+    procpool_name = kwargs.pop("procpool_name", "PythonProcPool")
+    _PPOOL = get_procpool(procpool_name)
 
-    use_timeout = kwargs.pop("proc_timeout", _PPOOL.timeout)
+    use_timeout = kwargs.pop("proc_timeout", _PPOOL and _PPOOL.timeout)
 
     # helper converters for callbacks/errbacks
     def convert_return(f):
@@ -323,3 +331,4 @@ def run_async(to_execute, *args, **kwargs):
     if callback:
         deferred.addCallback(callback, **callback_kwargs)
     deferred.addErrback(errback, **errback_kwargs)
+    return deferred
@@ -32,6 +32,8 @@ command line. The process is as follows:
 12) We have a unique cmdobject, primed for use. Call all hooks:
     at_pre_cmd(), cmdobj.parse(), cmdobj.func() and finally at_post_cmd().
 
+If command profiling is active (see src.commands.cmdprofiler), the time
+spent in each of these steps is recorded per command key.
 
 """
 
@@ -40,6 +42,8 @@ from traceback import format_exc
 from twisted.internet.defer import inlineCallbacks, returnValue
 from django.conf import settings
 from src.comms.channelhandler import CHANNELHANDLER
+from src.commands.cmdsethandler import CMDSET_MERGE_CACHE
+from src.commands.cmdprofiler import CMDPROFILER
 from src.utils import logger, utils
 from src.commands.cmdparser import at_multimatch_cmd
 from src.utils.utils import string_suggestions, make_iter, to_unicode
@@ -48,7 +52,6 @@ from django.utils.translation import ugettext as _
 
 __all__ = ("cmdhandler",)
 _GA = object.__getattribute__
-_CMDSET_MERGE_CACHE = {}
 
 # This decides which command parser is to be used.
 # You have to restart the server for changes to take effect.
@@ -206,12 +209,9 @@ def get_and_merge_cmdsets(caller, session, player, obj,
            if cmdset.key == "_CMDSET_ERROR"]
 
     if cmdsets:
-        # faster to do tuple on list than to build tuple directly
-        mergehash = tuple([id(cmdset) for cmdset in cmdsets])
-        if mergehash in _CMDSET_MERGE_CACHE:
-            # cached merge exist; use that
-            cmdset = _CMDSET_MERGE_CACHE[mergehash]
-        else:
+        mergekey = CMDSET_MERGE_CACHE.get_key(cmdsets)
+        cmdset = CMDSET_MERGE_CACHE.get(mergekey)
+        if cmdset is None:
             # we group and merge all same-prio cmdsets separately (this avoids
             # order-dependent clashes in certain cases, such as
             # when duplicates=True)
@@ -237,7 +237,7 @@ def get_and_merge_cmdsets(caller, session, player, obj,
             # store the full sets for diagnosis
             cmdset.merged_from = cmdsets
             # cache
-            _CMDSET_MERGE_CACHE[mergehash] = cmdset
+            CMDSET_MERGE_CACHE.set(mergekey, cmdset)
     else:
         cmdset = None
 
@@ -292,11 +292,17 @@ def cmdhandler(called_by, raw_string, testing=False, callertype="session", sessi
     # we assign the caller with preference 'bottom up'
     caller = obj or player or session
 
+    # profiling (None if not active)
+    timing = None if testing else CMDPROFILER.start()
+    cmdkey = None
+
     try:  # catch bugs in cmdhandler itself
         try:  # catch special-type commands
 
             cmdset = yield get_and_merge_cmdsets(caller, session, player, obj,
                                                   callertype, sessid)
+            if timing:
+                timing.mark("cmdsets")
             if not cmdset:
                 # this is bad and shouldn't happen.
                 raise NoCmdSets
@@ -310,7 +316,19 @@ def cmdhandler(called_by, raw_string, testing=False, callertype="session", sessi
             # Parse the input string and match to available cmdset.
             # This also checks for permissions, so all commands in match
             # are commands the caller is allowed to call.
-            matches = yield _COMMAND_PARSER(raw_string, cmdset, caller)
+            # The parser adds the time of its lock checks to
+            # CMDPROFILER.current, which is only set for the duration
+            # of this (synchronous) call.
+            CMDPROFILER.current = timing
+            try:
+                matches = _COMMAND_PARSER(raw_string, cmdset, caller)
+            finally:
+                CMDPROFILER.current = None
+            matches = yield matches
+            if timing:
+                timing.mark("cmdparser")
+                # the lock checks are done by the parser but timed separately
+                timing.add("cmdparser", -timing.phases.get("lockcheck", 0))
 
             # Deal with matches
 
@@ -391,16 +409,28 @@ def cmdhandler(called_by, raw_string, testing=False, callertype="session", sessi
                 # only return the command instance
                 returnValue(cmd)
 
+            cmdkey = cmd.key
+            if timing:
+                timing.mark("cmdparser")
+
             # pre-command hook
             yield cmd.at_pre_cmd()
+            if timing:
+                timing.mark("at_pre_cmd")
 
             # Parse and execute
             yield cmd.parse()
+            if timing:
+                timing.mark("parse")
             # (return value is normally None)
             ret = yield cmd.func()
+            if timing:
+                timing.mark("func")
 
             # post-command hook
             yield cmd.at_post_cmd()
+            if timing:
+                timing.mark("at_post_cmd")
 
             if cmd.save_for_next:
                 # store a reference to this command, possibly
@@ -434,9 +464,17 @@ def cmdhandler(called_by, raw_string, testing=False, callertype="session", sessi
                     # only return the command instance
                     returnValue(syscmd)
 
+                cmdkey = syscmd.key
+                if timing:
+                    timing.mark("cmdparser")
+
                 # parse and run the command
                 yield syscmd.parse()
+                if timing:
+                    timing.mark("parse")
                 yield syscmd.func()
+                if timing:
+                    timing.mark("func")
             elif sysarg:
                 # return system arg
                 caller.msg(exc.sysarg)
@@ -464,3 +502,7 @@ def cmdhandler(called_by, raw_string, testing=False, callertype="session", sessi
         string += " Please contact an admin and/or file a bug report."
         logger.log_trace(_(string))
         caller.msg(string % format_exc())
+
+    finally:
+        if timing and cmdkey:
+            CMDPROFILER.finish(timing, cmdkey)
@@ -5,7 +5,9 @@ replacing cmdparser function. The replacement parser must
 return a CommandCandidates object.
 """
 
+from time import time
 from src.utils.logger import log_trace
+from src.commands.cmdprofiler import CMDPROFILER
 from django.utils.translation import ugettext as _
 
 def cmdparser(raw_string, cmdset, caller, match_index=None):
@@ -46,15 +48,20 @@ def cmdparser(raw_string, cmdset, caller, match_index=None):
 
     matches = []
 
-    # match everything that begins with a matching cmdname.
+    # match everything that begins with a matching cmdname. The cmdset
+    # keeps an index of its lowercase keys/aliases, so we only need to
+    # look up each leading substring of the input in turn.
     l_raw_string = raw_string.lower()
-    for cmd in cmdset:
+    cmdindex, maxlen = cmdset.get_cmdname_index()
+    candidates = []
+    for ilen in xrange(1, min(len(l_raw_string), maxlen) + 1):
+        candidates.extend(cmdindex.get(l_raw_string[:ilen], ()))
+    # restore cmdset order so that tie-breaking below is not affected
+    candidates.sort(key=lambda cand: cand[0])
+    for order, cmdname, cmd in candidates:
         try:
-            matches.extend([create_match(cmdname, raw_string, cmd)
-                      for cmdname in [cmd.key] + cmd.aliases
-                        if cmdname and l_raw_string.startswith(cmdname.lower())
-                           and (not cmd.arg_regex or
-                             cmd.arg_regex.match(l_raw_string[len(cmdname):]))])
+            if not cmd.arg_regex or cmd.arg_regex.match(l_raw_string[len(cmdname):]):
+                matches.append(create_match(cmdname, raw_string, cmd))
         except Exception:
             log_trace("cmdhandler error. raw_input:%s" % raw_string)
 
@@ -71,7 +78,12 @@ def cmdparser(raw_string, cmdset, caller, match_index=None):
                                  caller, match_index=mindex)
 
     # only select command matches we are actually allowed to call.
-    matches = [match for match in matches if match[2].access(caller, 'cmd')]
+    if CMDPROFILER.current:
+        t0 = time()
+        matches = [match for match in matches if match[2].access(caller, 'cmd')]
+        CMDPROFILER.add_phase("lockcheck", time() - t0)
+    else:
+        matches = [match for match in matches if match[2].access(caller, 'cmd')]
 
     if len(matches) > 1:
         # See if it helps to analyze the match with preserved case but only if
@@ -0,0 +1,246 @@
+"""
+Command profiler
+
+This module holds optional instrumentation for the command handler.
+When activated, every command run through the cmdhandler is timed,
+split into the phases it passes through:
+
+  cmdsets     - gathering and merging the cmdsets available to the caller
+  cmdparser   - matching the input against the merged cmdset
+  lockcheck   - checking the 'cmd' lock of the matched commands
+  at_pre_cmd, parse, func, at_post_cmd - the command's own hooks
+  total       - the full time spent in the cmdhandler
+
+The number of SQL queries issued while handling the command is also
+recorded. All values are kept per command key in rolling windows of
+the last COMMAND_PROFILING_WINDOW samples, from which statistics and
+histograms can be drawn. Note that times are wall times - a command
+waiting for a deferred will include the wait, and queries issued by
+other code running during such a wait will be counted too.
+
+Profiling is turned on with settings.COMMAND_PROFILING or at run-time
+with CMDPROFILER.enable() (see the @cmdprofile command).
+"""
+
+import json
+from collections import deque, defaultdict
+from time import time
+from django.conf import settings
+from django.db import connection
+
+__all__ = ("CMDPROFILER", "RollingHistogram", "CommandProfiler")
+
+# the order in which phases are reported
+PHASES = ("cmdsets", "cmdparser", "lockcheck", "at_pre_cmd",
+          "parse", "func", "at_post_cmd", "total")
+# histogram bucket edges, in milliseconds
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class RollingHistogram(object):
+    """
+    Keeps the last <size> samples of a measured value and
+    calculates statistics and a histogram from them.
+    """
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0  # total number of samples ever added
+
+    def add(self, value):
+        "Add a sample, pushing out the oldest if the window is full"
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, percent, values=None):
+        "Get the given percentile (0-100) of the current window"
+        values = values if values is not None else sorted(self.samples)
+        if not values:
+            return 0
+        index = int(round(percent / 100.0 * (len(values) - 1)))
+        return values[index]
+
+    def stats(self):
+        """
+        Return a dict with the statistics of the current window.
+        """
+        values = sorted(self.samples)
+        if not values:
+            return {"count": self.count, "window": 0, "mean": 0, "min": 0,
+                    "p50": 0, "p90": 0, "p99": 0, "max": 0}
+        return {"count": self.count,
+                "window": len(values),
+                "mean": float(sum(values)) / len(values),
+                "min": values[0],
+                "p50": self.percentile(50, values),
+                "p90": self.percentile(90, values),
+                "p99": self.percentile(99, values),
+                "max": values[-1]}
+
+    def histogram(self, edges=TIME_BUCKETS):
+        """
+        Return a list of (upper edge, count) for the current window.
+        The last bucket has edge None and collects everything above
+        the last edge.
+        """
+        counts = [0] * (len(edges) + 1)
+        for value in self.samples:
+            for ibucket, edge in enumerate(edges):
+                if value < edge:
+                    counts[ibucket] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return zip(list(edges) + [None], counts)
+
+
+class CommandTiming(object):
+    """
+    Collects the measurements for a single run through the
+    cmdhandler. It is created by CommandProfiler.start() and
+    handed back to CommandProfiler.finish() when done.
+    """
+    def __init__(self):
+        self.start = time()
+        self.phases = {}
+        self._phase_start = self.start
+        self._nqueries = len(connection.queries)
+
+    def mark(self, phase):
+        """
+        Store the time passed since the last mark (or the start) as
+        the time of the given phase.
+        """
+        now = time()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self._phase_start
+        self._phase_start = now
+
+    def add(self, phase, seconds):
+        "Add time to a phase measured elsewhere"
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def queries(self):
+        "Number of SQL queries issued since the start"
+        return max(0, len(connection.queries) - self._nqueries)
+
+
+class CommandProfiler(object):
+    """
+    Stores rolling timing and SQL query statistics per command key.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.window = settings.COMMAND_PROFILING_WINDOW
+        self.current = None
+        self._forced_debug_cursor = False
+        self.reset()
+
+    def reset(self):
+        "Clear all gathered statistics"
+        self.timings = defaultdict(dict)
+        self.queries = {}
+
+    def enable(self, window=None):
+        """
+        Start profiling. Django only records queries when DEBUG is
+        set, so query recording is turned on for the default database
+        connection while profiling.
+        """
+        if window and window != self.window:
+            self.window = window
+            self.reset()
+        if not (connection.use_debug_cursor or
+                (connection.use_debug_cursor is None and settings.DEBUG)):
+            connection.use_debug_cursor = True
+            self._forced_debug_cursor = True
+        self.enabled = True
+
+    def disable(self):
+        "Stop profiling. Gathered statistics are kept."
+        self.enabled = False
+        self.current = None
+        if self._forced_debug_cursor:
+            connection.use_debug_cursor = None
+            self._forced_debug_cursor = False
+            connection.queries = []
+
+    def start(self):
+        """
+        Start measuring a command. Returns a CommandTiming, or None
+        if profiling is not active.
+        """
+        if not self.enabled:
+            return None
+        return CommandTiming()
+
+    def add_phase(self, phase, seconds):
+        """
+        Add time to a phase of the command currently measured. The
+        cmdhandler sets self.current to the command's timing only
+        while it calls code that cannot be handed the timing (like
+        the cmdparser), since several commands may be underway at
+        once.
+        """
+        if self.current:
+            self.current.add(phase, seconds)
+
+    def finish(self, timing, cmdkey):
+        """
+        Store a finished timing under the given command key.
+        """
+        if timing is None or not self.enabled:
+            return
+        timing.phases["total"] = time() - timing.start
+        phases = self.timings[cmdkey]
+        for phase, seconds in timing.phases.items():
+            if phase not in phases:
+                phases[phase] = RollingHistogram(self.window)
+            # stored in milliseconds
+            phases[phase].add(seconds * 1000.0)
+        if cmdkey not in self.queries:
+            self.queries[cmdkey] = RollingHistogram(self.window)
+        self.queries[cmdkey].add(timing.queries())
+        if self._forced_debug_cursor and len(connection.queries) > 1000:
+            # we are the only ones reading these, don't let them grow
+            connection.queries = []
+
+    def stats(self, cmdkey=None):
+        """
+        Get statistics as a dict {cmdkey: {"phases": {phase: stats},
+        "queries": stats}}, where stats are the dicts returned by
+        RollingHistogram.stats() (times are in ms). If cmdkey is given,
+        only that command's dict is returned (or None).
+        """
+        if cmdkey is not None:
+            if cmdkey not in self.timings:
+                return None
+            return {"phases": dict((phase, hist.stats())
+                                   for phase, hist in self.timings[cmdkey].items()),
+                    "queries": self.queries[cmdkey].stats()}
+        return dict((key, self.stats(key)) for key in self.timings)
+
+    def histogram(self, cmdkey, phase="total"):
+        "Get the histogram for one phase of a command, or None"
+        if phase in self.timings.get(cmdkey, {}):
+            return self.timings[cmdkey][phase].histogram()
+        return None
+
+    def dump(self, filename=None):
+        """
+        Dump the statistics as JSON to a file. Returns the file name
+        used.
+        """
+        filename = filename or settings.COMMAND_PROFILING_FILE
+        data = {"timestamp": time(),
+                "window": self.window,
+                "phases": PHASES,
+                "commands": self.stats()}
+        for cmdkey, cmdstats in data["commands"].items():
+            cmdstats["histogram"] = self.histogram(cmdkey)
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        return filename
+
+
+CMDPROFILER = CommandProfiler()
+if settings.COMMAND_PROFILING:
+    CMDPROFILER.enable()
@@ -14,10 +14,14 @@ See CmdHandler for practical examples on how to apply cmdsets
 together to create interesting in-game effects.
 """
 
+from itertools import count
 from django.utils.translation import ugettext as _
 from src.utils.utils import inherits_from, is_iter
 __all__ = ("CmdSet",)
 
+# unique, never re-used ids for cmdset instances
+_MERGE_IDS = count(1)
+
 
 class _CmdSetMeta(type):
     """
@@ -156,10 +160,14 @@ class CmdSet(object):
         # this is set only on merged sets, in cmdhandler.py, in order to
         # track, list and debug mergers correctly.
         self.merged_from = []
+        # stable identity and change counter, used to key merge caches
+        self._merge_id = _MERGE_IDS.next()
+        self._version = 0
 
         # initialize system
         self.at_cmdset_creation()
         self._contains_cache = {}
+        self._cmdname_index = None
 
     # Priority-sensitive merge operations for cmdsets
 
@@ -385,6 +393,9 @@ class CmdSet(object):
                 except ValueError:
                     system_commands.append(cmd)
 
+        self._cmdname_index = None
+        self._version += 1
+
     def remove(self, cmd):
         """
         Remove a command instance from the cmdset.
@@ -392,6 +403,8 @@ class CmdSet(object):
         """
         cmd = self._instantiate(cmd)
         self.commands = [oldcmd for oldcmd in self.commands if oldcmd != cmd]
+        self._cmdname_index = None
+        self._version += 1
 
     def get(self, cmd):
         """
@@ -436,6 +449,47 @@ class CmdSet(object):
             else:
                 unique[cmd.key] = cmd
         self.commands = unique.values()
+        self._cmdname_index = None
+        self._version += 1
+
+    def get_merge_key(self):
+        """
+        Returns a (merge_id, version) tuple identifying this cmdset
+        and its current content. Unlike id(), the merge_id is never
+        re-used by another cmdset, and the version changes whenever
+        commands are added to or removed from the set.
+        """
+        return (self._merge_id, self._version)
+
+    def get_cmdname_index(self):
+        """
+        Returns a tuple (index, maxlen) used by the cmdparser to look
+        up command candidates without scanning the whole cmdset.
+
+        index - dict mapping each lowercase command key/alias to a
+                list of (order, cmdname, cmd) tuples, where order is
+                the position the name would have had when iterating
+                over the cmdset and all its keys and aliases.
+        maxlen - the length of the longest key/alias in the set.
+
+        The index is built on first use and then reused for as long
+        as the set's commands remain unchanged, which means merged
+        sets cached by the cmdhandler only build it once.
+        """
+        if self._cmdname_index is None:
+            index = {}
+            maxlen = 0
+            order = 0
+            for cmd in self.commands:
+                for cmdname in [cmd.key] + cmd.aliases:
+                    if not cmdname:
+                        continue
+                    l_cmdname = cmdname.lower()
+                    index.setdefault(l_cmdname, []).append((order, cmdname, cmd))
+                    maxlen = max(maxlen, len(l_cmdname))
+                    order += 1
+            self._cmdname_index = (index, maxlen)
+        return self._cmdname_index
 
     def get_all_cmd_keys_and_aliases(self, caller=None):
         """
@@ -63,16 +63,107 @@ can then implement separate sets for different situations. For
 example, you can have a 'On a boat' set, onto which you then tack on
 the 'Fishing' set. Fishing from a boat? No problem!
 """
+from collections import OrderedDict, defaultdict
+from django.conf import settings
 from src.utils import logger, utils
 from src.commands.cmdset import CmdSet
 from src.server.models import ServerConfig
 
 from django.utils.translation import ugettext as _
-__all__ = ("import_cmdset", "CmdSetHandler")
+__all__ = ("import_cmdset", "CmdSetHandler", "CMDSET_MERGE_CACHE")
 
 _CACHED_CMDSETS = {}
 
 
+class CmdSetMergeCache(object):
+    """
+    Cache for merged cmdsets, used by the cmdhandler to avoid
+    re-merging the same cmdsets for every command.
+
+    Entries are keyed on the merge keys (see CmdSet.get_merge_key)
+    of the cmdsets that were merged, so a cmdset that changes or
+    goes away can never return a stale merge. The cache holds at
+    most settings.CMDSET_MERGE_CACHE_SIZE merges and drops the
+    least recently used one when full. CmdSetHandler invalidates
+    all merges involving its old current cmdset whenever it updates.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize if maxsize is not None else settings.CMDSET_MERGE_CACHE_SIZE
+        self.clear()
+
+    def clear(self):
+        "Empty the cache and reset all statistics."
+        self.cache = OrderedDict()
+        # merge_id -> set of cache keys the cmdset is part of
+        self.members = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _forget(self, key):
+        "Remove one cached merge and its member references."
+        self.cache.pop(key, None)
+        for merge_id, dum in key:
+            keys = self.members.get(merge_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.members[merge_id]
+
+    def get_key(self, cmdsets):
+        "Get the cache key for merging the given cmdsets, in order."
+        return tuple(cmdset.get_merge_key() for cmdset in cmdsets)
+
+    def get(self, key):
+        "Return a cached merged cmdset or None."
+        try:
+            cmdset = self.cache.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # re-insert to mark as most recently used
+        self.cache[key] = cmdset
+        self.hits += 1
+        return cmdset
+
+    def set(self, key, cmdset):
+        "Store a merged cmdset, evicting the oldest entry if needed."
+        if self.maxsize <= 0:
+            return
+        if key in self.cache:
+            self._forget(key)
+        while len(self.cache) >= self.maxsize:
+            self._forget(next(iter(self.cache)))
+            self.evictions += 1
+        self.cache[key] = cmdset
+        for merge_id, dum in key:
+            self.members[merge_id].add(key)
+
+    def invalidate(self, cmdset):
+        "Remove all cached merges in which cmdset took part."
+        try:
+            merge_id = cmdset.get_merge_key()[0]
+        except AttributeError:
+            return
+        keys = self.members.pop(merge_id, ())
+        for key in list(keys):
+            self._forget(key)
+            self.invalidations += 1
+
+    def stats(self):
+        "Return a dict of cache statistics."
+        return {"size": len(self.cache),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations}
+
+CMDSET_MERGE_CACHE = CmdSetMergeCache()
+
+
 class _ErrorCmdSet(CmdSet):
     "This is a special cmdset used to report errors"
     key = "_CMDSET_ERROR"
@@ -256,6 +347,10 @@ class CmdSetHandler(object):
                             cmdset.permanent = cmdset.key != '_ERROR_CMDSET'
                             self.cmdset_stack.append(cmdset)
 
+        if self.current:
+            # merges involving the old current set can't be used again
+            CMDSET_MERGE_CACHE.invalidate(self.current)
+
         # merge the stack into a new merged cmdset
         new_current = None
         self.mergetype_stack = []
@@ -14,6 +14,9 @@ from time import time as timemeasure
 
 from django.conf import settings
 from src.server.caches import get_cache_sizes
+from src.commands.cmdsethandler import CMDSET_MERGE_CACHE
+from src.typeclasses.models import TYPECLASS_REGISTRY
+from src.commands.cmdprofiler import CMDPROFILER, PHASES
 from src.server.sessionhandler import SESSIONS
 from src.scripts.models import ScriptDB
 from src.objects.models import ObjectDB
@@ -31,7 +34,7 @@ _attribute_cache = None
 # limit symbol import for API
 __all__ = ("CmdReload", "CmdReset", "CmdShutdown", "CmdPy",
            "CmdScripts", "CmdObjects", "CmdService", "CmdAbout",
-           "CmdTime", "CmdServerLoad")
+           "CmdTime", "CmdServerLoad", "CmdCmdProfile")
 
 
 class CmdReload(MuxCommand):
@@ -643,6 +646,11 @@ class CmdServerLoad(MuxCommand):
     {wAttributes{n are cached on-demand for speed. The total amount of
     memory used for this type of cache is also displayed.
 
+    The {wcmdset merge cache{n holds the merged command sets used by
+    the command handler, along with how often it was hit or missed.
+    The {wtypeclass registry{n similarly holds the typeclass paths
+    resolved so far.
+
     """
     key = "@server"
     aliases = ["@serverload", "@serverprocess"]
@@ -721,5 +729,102 @@ class CmdServerLoad(MuxCommand):
             base_mem = vmem - totcache[1] - attr_cache_info[1] - prop_cache_info[1]
             string += "\n{w Base Server usage (virtmem-idmapper-attrcache-propcache):{n %5.2f MB" % base_mem
 
+        mergestats = CMDSET_MERGE_CACHE.stats()
+        string += "\n{w Cmdset merge cache:{n %(size)i/%(maxsize)i merges, " \
+                  "%(hits)i hits, %(misses)i misses, %(evictions)i evictions, " \
+                  "%(invalidations)i invalidations" % mergestats
+        typeclassstats = TYPECLASS_REGISTRY.stats()
+        string += "\n{w Typeclass registry:{n %(size)i paths (%(failed)i failed), " \
+                  "%(hits)i hits, %(misses)i misses, " \
+                  "%(invalidations)i invalidations" % typeclassstats
+
         caller.msg(string)
 
+
+class CmdCmdProfile(MuxCommand):
+    """
+    show command timing statistics
+
+    Usage:
+      @cmdprofile[/switches] [command]
+
+    Switches:
+      on    - start profiling. Give a number to change how many
+              of the latest calls of each command are kept.
+      off   - stop profiling (the gathered statistics are kept)
+      reset - clear all gathered statistics
+      dump  - write all statistics to a file (given as argument or
+              the default set in settings)
+
+    Without arguments, this lists all profiled commands with the
+    number of calls and their median (p50), 90th percentile and max
+    times in milliseconds, slowest first. Giving a command key shows
+    the time spent in each phase of that command along with the
+    number of database queries it issued and a histogram of its
+    total times.
+    """
+    key = "@cmdprofile"
+    aliases = ["@cmdprof"]
+    locks = "cmd:perm(cmdprofile) or perm(Immortals)"
+    help_category = "System"
+
+    def func(self):
+        "Implement command"
+
+        caller = self.caller
+        switches = self.switches
+
+        if "on" in switches:
+            window = int(self.args) if self.args.isdigit() else None
+            CMDPROFILER.enable(window=window)
+            caller.msg("Command profiling started (keeping the last %i calls per command)." % CMDPROFILER.window)
+            return
+        if "off" in switches:
+            CMDPROFILER.disable()
+            caller.msg("Command profiling stopped.")
+            return
+        if "reset" in switches:
+            CMDPROFILER.reset()
+            caller.msg("Command profiling statistics were cleared.")
+            return
+        if "dump" in switches:
+            try:
+                filename = CMDPROFILER.dump(self.args or None)
+            except IOError, e:
+                caller.msg("{rCould not dump statistics:{n %s" % e)
+                return
+            caller.msg("Command profiling statistics were written to %s." % filename)
+            return
+
+        string = "Command profiling is %s." % (CMDPROFILER.enabled and "{gactive{n" or "{rinactive{n")
+        if self.args:
+            cmdkey = self.args.lower()
+            stats = CMDPROFILER.stats(cmdkey)
+            if not stats:
+                caller.msg("%s\nNo statistics found for '%s'." % (string, cmdkey))
+                return
+            table = prettytable.PrettyTable(["{wphase", "{wcalls", "{wmean (ms)", "{wp50",
+                                             "{wp90", "{wp99", "{wmax"])
+            table.align = 'l'
+            phases = stats["phases"]
+            for phase in PHASES + ("queries",):
+                pstats = stats["queries"] if phase == "queries" else phases.get(phase)
+                if pstats:
+                    table.add_row([phase, pstats["count"]] + ["%.2f" % pstats[key] for key
+                                   in ("mean", "p50", "p90", "p99", "max")])
+            histogram = CMDPROFILER.histogram(cmdkey)
+            hist = "\n".join("  %8s %i" % (edge and "<%gms" % edge or "more", count)
+                             for edge, count in histogram if count)
+            string += "\n{w%s{n:\n%s\n{wTotal times:{n\n%s" % (cmdkey, table, hist)
+        else:
+            stats = CMDPROFILER.stats()
+            table = prettytable.PrettyTable(["{wcommand", "{wcalls", "{wp50 (ms)", "{wp90",
+                                             "{wmax", "{wqueries (mean)"])
+            table.align = 'l'
+            for cmdkey, cstats in sorted(stats.items(), key=lambda tup: tup[1]["phases"]["total"]["p90"],
+                                         reverse=True):
+                total = cstats["phases"]["total"]
+                table.add_row([cmdkey, total["count"], "%.2f" % total["p50"], "%.2f" % total["p90"],
+                               "%.2f" % total["max"], "%.1f" % cstats["queries"]["mean"]])
+            string += "\n%s" % table
+        caller.msg(string)
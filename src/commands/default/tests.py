@@ -38,6 +38,7 @@ def dummy(self, *args, **kwargs):
     pass
 
 SESSIONS.data_out = dummy
+SESSIONS.data_out_multi = dummy
 SESSIONS.disconnect = dummy
 
 
@@ -193,6 +194,11 @@ class TestSystem(CommandTest):
         self.call(system.CmdObjects(), "", "Object subtype totals")
         self.call(system.CmdAbout(), "", None)
         self.call(system.CmdServerLoad(), "", "Server CPU and Memory load:")
+        self.call(system.CmdCmdProfile(), "/on", "Command profiling started")
+        self.char1.execute_cmd("look")
+        self.call(system.CmdCmdProfile(), "look", "Command profiling is active.\nlook:")
+        self.call(system.CmdCmdProfile(), "/off", "Command profiling stopped.")
+        self.call(system.CmdCmdProfile(), "/reset", "Command profiling statistics were cleared.")
 
 
 from src.commands.default import admin
@@ -23,8 +23,13 @@ update() on the channelhandler. Or use Channel.objects.delete() which
 does this for you.
 
 """
+from collections import defaultdict
 from src.comms.models import ChannelDB
 from src.commands import cmdset, command
+from src.commands.cmdsethandler import CMDSET_MERGE_CACHE
+
+# delayed import
+_SESSIONS = None
 
 
 class ChannelCommand(command.Command):
@@ -97,6 +102,12 @@ class ChannelHandler(object):
         """
         self.cached_channel_cmds = []
 
+    def _clear_cmdsets(self):
+        "Drop cached channel cmdsets and any cmdset merges using them."
+        for chan_cmdset in self.cached_cmdsets.values():
+            CMDSET_MERGE_CACHE.invalidate(chan_cmdset)
+        self.cached_cmdsets = {}
+
     def _format_help(self, channel):
         "builds a doc string"
         key = channel.key
@@ -129,12 +140,12 @@ class ChannelHandler(object):
                              obj=channel,
                              is_channel=True)
         self.cached_channel_cmds.append(cmd)
-        self.cached_cmdsets = {}
+        self._clear_cmdsets()
 
     def update(self):
         "Updates the handler completely."
         self.cached_channel_cmds = []
-        self.cached_cmdsets = {}
+        self._clear_cmdsets()
         for channel in ChannelDB.objects.get_all_channels():
             self.add_channel(channel)
 
@@ -158,3 +169,81 @@ class ChannelHandler(object):
             return chan_cmdset
 
 CHANNELHANDLER = ChannelHandler()
+
+
+class OnlineSubscribers(object):
+    """
+    In-memory index of the players subscribed to each channel that
+    are currently online, so a channel message does not need to look
+    up (and load) all of its subscribers from the database.
+
+    The sessionhandler reports players coming online and going
+    offline, and the channels report (un)subscriptions. The index is
+    built from the connected sessions the first time it is used,
+    and rebuilt whenever clear() has been called (such as after
+    the sessions were resynced with the portal).
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        "Empty the index, it will be rebuilt on next use."
+        self.channels = defaultdict(dict)  # {channel id: {player id: player}}
+        self.players = {}  # {online player id: set of channel ids}
+        self.built = False
+
+    def _build(self):
+        "Build the index from the currently connected sessions."
+        global _SESSIONS
+        if not _SESSIONS:
+            from src.server.sessionhandler import SESSIONS as _SESSIONS
+        self.built = True
+        for session in _SESSIONS.get_sessions():
+            if session.player:
+                self.player_online(session.player)
+
+    def player_online(self, player):
+        "Add a player's channels to the index."
+        if not self.built:
+            # this will include the new player
+            self._build()
+            return
+        player = player.dbobj
+        if player.id in self.players:
+            return
+        channel_ids = set()
+        for channel in player.subscription_set.all():
+            self.channels[channel.id][player.id] = player
+            channel_ids.add(channel.id)
+        self.players[player.id] = channel_ids
+
+    def player_offline(self, player):
+        "Remove a player from the index."
+        for channel_id in self.players.pop(player.id, ()):
+            self.channels[channel_id].pop(player.id, None)
+
+    def subscribe(self, channel, player):
+        "A player subscribed to a channel."
+        player = player.dbobj
+        if player.id in self.players:
+            self.channels[channel.id][player.id] = player
+            self.players[player.id].add(channel.id)
+
+    def unsubscribe(self, channel, player):
+        "A player unsubscribed from a channel."
+        self.channels[channel.id].pop(player.id, None)
+        if player.id in self.players:
+            self.players[player.id].discard(channel.id)
+
+    def remove_channel(self, channel):
+        "A channel was deleted."
+        for player_id in self.channels.pop(channel.id, {}):
+            self.players[player_id].discard(channel.id)
+
+    def get(self, channel):
+        "Return the online players subscribed to channel."
+        if not self.built:
+            self._build()
+        return self.channels[channel.id].values()
+
+ONLINE_SUBSCRIBERS = OnlineSubscribers()
@@ -3,10 +3,18 @@ Default Typeclass for Comms.
 
 See objects.objects for more information on Typeclassing.
 """
+from django.conf import settings
 from src.comms import Msg, TempMsg
 from src.typeclasses.typeclass import TypeClass
 from src.utils import logger
-from src.utils.utils import make_iter
+from src.utils.utils import make_iter, to_str
+
+_MSG_OFFLINE_PLAYERS = settings.CHANNEL_MSG_OFFLINE_PLAYERS
+
+# delayed imports
+_SESSIONS = None
+_DEFAULT_MSG = None
+_ONLINE_SUBSCRIBERS = None
 
 
 class Channel(TypeClass):
@@ -164,16 +172,40 @@ class Channel(TypeClass):
         """
         Method for grabbing all listeners that a message should be sent to on
         this channel, and sending them a message.
-        """
+
+        Only the subscribers currently online are messaged, unless
+        online is False and settings.CHANNEL_MSG_OFFLINE_PLAYERS is
+        set, in which case all subscribers are.
+        """
+        global _SESSIONS, _DEFAULT_MSG, _ONLINE_SUBSCRIBERS
+        if not _SESSIONS:
+            from src.server.sessionhandler import SESSIONS as _SESSIONS
+        if not _ONLINE_SUBSCRIBERS:
+            from src.comms.channelhandler import ONLINE_SUBSCRIBERS as _ONLINE_SUBSCRIBERS
+        if not _DEFAULT_MSG:
+            from src.players.player import Player
+            _DEFAULT_MSG = Player.msg.im_func
+        text = to_str(msg.message, force_string=True) if msg.message else ""
         # get all players connected to this channel and send to them
-        for player in self.dbobj.db_subscriptions.all():
+        sessions = []
+        if online or not _MSG_OFFLINE_PLAYERS:
+            players = _ONLINE_SUBSCRIBERS.get(self.dbobj)
+        else:
+            players = self.dbobj.db_subscriptions.all()
+        for player in players:
             player = player.typeclass
             try:
                 # note our addition of the from_channel keyword here. This could be checked
                 # by a custom player.msg() to treat channel-receives differently.
-                player.msg(msg.message, from_obj=msg.senders, from_channel=self.id)
+                if getattr(type(player).msg, "im_func", None) is _DEFAULT_MSG:
+                    # default msg() - gather sessions to send to all at once
+                    sessions.extend(player.dbobj._msg_sessions(text, msg.senders, None,
+                                                               {"from_channel": self.id}))
+                else:
+                    player.msg(msg.message, from_obj=msg.senders, from_channel=self.id)
             except AttributeError, e:
                 logger.log_trace("%s\nCannot send msg to player '%s'." % (e, player))
+        _SESSIONS.data_out_multi(sessions, text=text, from_channel=self.id)
 
     def msg(self, msgobj, header=None, senders=None, sender_strings=None,
             persistent=False, online=False, emit=False, external=False):
@@ -198,9 +230,11 @@ class Channel(TypeClass):
                 If True, a Msg will be created, using header and senders
                 keywords. If False, other keywords will be ignored.
         online (bool) - If this is set true, only messages people who are
-                online. Otherwise, messages all players connected. This can
-                make things faster, but may not trigger listeners on players
-                that are offline.
+                online. Otherwise, messages all players connected if
+                settings.CHANNEL_MSG_OFFLINE_PLAYERS is set (by default
+                only online players are messaged). Messaging offline
+                players is slower, but allows for triggering listeners
+                on players that are offline.
         emit (bool) - Signals to the message formatter that this message is
                 not to be directly associated with a name.
         """
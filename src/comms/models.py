@@ -36,6 +36,17 @@ _GA = object.__getattribute__
 _SA = object.__setattr__
 _DA = object.__delattr__
 
+# delayed import
+_ONLINE_SUBSCRIBERS = None
+
+
+def _get_online_subscribers():
+    "Delayed import of the index of online channel subscribers"
+    global _ONLINE_SUBSCRIBERS
+    if not _ONLINE_SUBSCRIBERS:
+        from src.comms.channelhandler import ONLINE_SUBSCRIBERS as _ONLINE_SUBSCRIBERS
+    return _ONLINE_SUBSCRIBERS
+
 
 #------------------------------------------------------------
 #
@@ -400,6 +411,7 @@ class ChannelDB(TypedObject):
             return False
         # subscribe
         self.db_subscriptions.add(player.dbobj)
+        _get_online_subscribers().subscribe(self, player)
         # post-join hook
         self.typeclass.post_join_channel(player)
         return True
@@ -415,6 +427,7 @@ class ChannelDB(TypedObject):
             return False
         # disconnect
         self.db_subscriptions.remove(player)
+        _get_online_subscribers().unsubscribe(self, player)
         # post-disconnect hook
         self.typeclass.post_leave_channel(player.dbobj)
         return True
@@ -434,6 +447,7 @@ class ChannelDB(TypedObject):
         """
         _GA(self, "attributes").clear()
         _GA(self, "aliases").clear()
+        _get_online_subscribers().remove_channel(self)
         super(ChannelDB, self).delete()
         from src.comms.channelhandler import CHANNELHANDLER
         CHANNELHANDLER.update()
@@ -133,6 +133,7 @@ def _cache_lockfuncs():
     "Updates the cache."
     global _LOCKFUNCS
     _LOCKFUNCS = {}
+    _PARSED_LOCKSTRINGS.clear()
     for modulepath in settings.LOCK_FUNC_MODULES:
         modulepath = utils.pypath_to_realpath(modulepath)
         mod = utils.mod_import(modulepath)
@@ -150,6 +151,87 @@ _RE_FUNCS = re.compile(r"\w+\([^)]*\)")
 _RE_SEPS = re.compile(r"(?<=[ )])AND(?=\s)|(?<=[ )])OR(?=\s)|(?<=[ )])NOT(?=\s)")
 _RE_OK = re.compile(r"%s|and|or|not")
 
+#
+# Compiled lock definitions
+#
+
+# parsed lockstrings, shared by all lockhandlers
+_PARSED_LOCKSTRINGS = {}
+_PARSED_LOCKSTRINGS_MAXSIZE = 1000
+
+
+def _compile_lockfunc(func, args, kwargs):
+    "Wrap one lock function call"
+    return lambda accessing_obj, accessed_obj: bool(func(accessing_obj, accessed_obj, *args, **kwargs))
+
+
+def _compile_not(check):
+    "Negate a compiled check"
+    return lambda accessing_obj, accessed_obj: not check(accessing_obj, accessed_obj)
+
+
+def _compile_and(check1, check2):
+    "Combine two compiled checks with a short-circuiting AND"
+    return lambda accessing_obj, accessed_obj: (check1(accessing_obj, accessed_obj) and
+                                                check2(accessing_obj, accessed_obj))
+
+
+def _compile_or(check1, check2):
+    "Combine two compiled checks with a short-circuiting OR"
+    return lambda accessing_obj, accessed_obj: (check1(accessing_obj, accessed_obj) or
+                                                check2(accessing_obj, accessed_obj))
+
+
+def _compile_lock(evalstring, lock_funcs):
+    """
+    Compile a lock definition into a single callable
+    check(accessing_obj, accessed_obj) returning True/False.
+
+    evalstring - a space-separated string of '%s' placeholders (one
+                 per entry in lock_funcs, in order) and the operators
+                 and/or/not, following normal Python precedence.
+    lock_funcs - tuple of (func, args, kwargs) for each placeholder.
+
+    Raises ValueError if the evalstring is malformed.
+    """
+    tokens = evalstring.split()
+    funcs = iter(lock_funcs)
+    pos = [0]
+
+    def peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+    def parse_not():
+        token = peek()
+        pos[0] += 1
+        if token == "not":
+            return _compile_not(parse_not())
+        elif token == "%s":
+            try:
+                return _compile_lockfunc(*funcs.next())
+            except StopIteration:
+                raise ValueError("Lock: too few lock functions.")
+        raise ValueError("Lock: unexpected '%s'." % token)
+
+    def parse_and():
+        check = parse_not()
+        while peek() == "and":
+            pos[0] += 1
+            check = _compile_and(check, parse_not())
+        return check
+
+    def parse_or():
+        check = parse_and()
+        while peek() == "or":
+            pos[0] += 1
+            check = _compile_or(check, parse_and())
+        return check
+
+    check = parse_or()
+    if pos[0] != len(tokens):
+        raise ValueError("Lock: unexpected '%s'." % peek())
+    return check
+
 
 #
 #
@@ -188,10 +270,26 @@ class LockHandler(object):
         stored as a string
                'atype:[NOT] lock()[[ AND|OR [NOT] lock()[...]];atype...
 
+        Each lock definition is compiled into a callable check (see
+        _compile_lock). Since many objects share the same lockstrings,
+        the parsed result is cached per lockstring.
         """
-        locks = {}
         if not storage_lockstring:
-            return locks
+            return {}
+        locks = _PARSED_LOCKSTRINGS.get(storage_lockstring)
+        if locks is None:
+            locks = self._do_parse_lockstring(storage_lockstring)
+            if len(_PARSED_LOCKSTRINGS) >= _PARSED_LOCKSTRINGS_MAXSIZE:
+                _PARSED_LOCKSTRINGS.clear()
+            _PARSED_LOCKSTRINGS[storage_lockstring] = locks
+        # return a copy since the handler may modify its locks
+        return dict(locks)
+
+    def _do_parse_lockstring(self, storage_lockstring):
+        """
+        Parse and compile a lockstring without involving the cache.
+        """
+        locks = {}
         duplicates = 0
         elist = []  # errors
         wlist = []  # warnings
@@ -224,17 +322,17 @@ class LockHandler(object):
             if len(lock_funcs) < nfuncs:
                 continue
             try:
-                # purge the eval string of any superfluous items, then test it
+                # purge the eval string of any superfluous items, then compile it
                 evalstring = " ".join(_RE_OK.findall(evalstring))
-                eval(evalstring % tuple(True for func in funclist), {}, {})
-            except Exception:
+                lockcheck = _compile_lock(evalstring, lock_funcs)
+            except ValueError:
                 elist.append(_("Lock: definition '%s' has syntax errors.") % raw_lockstring)
                 continue
             if access_type in locks:
                 duplicates += 1
                 wlist.append(_("Lock: access type '%(access_type)s' changed from '%(source)s' to '%(goal)s' " % \
                                  {"access_type":access_type, "source":locks[access_type][2], "goal":raw_lockstring}))
-            locks[access_type] = (evalstring, tuple(lock_funcs), raw_lockstring)
+            locks[access_type] = (lockcheck, tuple(lock_funcs), raw_lockstring)
         if wlist:
             # a warning text was set, it's not an error, so only report
             logger.log_warn("\n".join(wlist))
@@ -348,12 +446,11 @@ class LockHandler(object):
 
         Parsing the lockstring, we (during cache) extract the valid
         lock functions and store their function objects in the right
-        order along with their args/kwargs. These are now executed in
-        sequence, creating a list of True/False values. This is put
-        into the evalstring, which is a string of AND/OR/NOT entries
-        separated by placeholders where each function result should
-        go. We just put those results in and evaluate the string to
-        get a final, combined True/False value for the lockstring.
+        order along with their args/kwargs. The AND/OR/NOT structure
+        of the lock is then compiled into a single callable combining
+        these function calls. Checking the lock just calls this, which
+        evaluates the lock functions in order, stopping as soon as
+        the result is known.
 
         The important bit with this solution is that the full
         lockstring is never blindly evaluated, and thus there (should
@@ -375,12 +472,7 @@ class LockHandler(object):
         # no superuser or bypass -> normal lock operation
         if access_type in self.locks:
             # we have a lock, test it.
-            evalstring, func_tup, raw_string = self.locks[access_type]
-            # execute all lock funcs in the correct order, producing a tuple of True/False results.
-            true_false = tuple(bool(tup[0](accessing_obj, self.obj, *tup[1], **tup[2])) for tup in func_tup)
-            # the True/False tuple goes into evalstring, which combines them
-            # with AND/OR/NOT in order to get the final result.
-            return eval(evalstring % true_false)
+            return self.locks[access_type][0](accessing_obj, self.obj)
         else:
             return default
 
@@ -402,10 +494,7 @@ class LockHandler(object):
 
         locks = self._parse_lockstring(lockstring)
         for access_type in locks:
-            evalstring, func_tup, raw_string = locks[access_type]
-            true_false = tuple(tup[0](accessing_obj, self.obj, *tup[1],**tup[2])
-                                      for tup in func_tup)
-            return eval(evalstring % true_false)
+            return locks[access_type][0](accessing_obj, self.obj)
 
 
 def _test():
@@ -9,9 +9,11 @@ from src.typeclasses.managers import TypedObjectManager
 from src.typeclasses.managers import returns_typeclass, returns_typeclass_list
 from src.utils import utils
 from src.utils.utils import to_unicode, is_iter, make_iter, string_partial_matching
+from src.objects.searchindex import SEARCH_INDEX as _SEARCH_INDEX
 
 __all__ = ("ObjectManager",)
 _GA = object.__getattribute__
+_TYPECLASS_AGGRESSIVE_CACHE = settings.TYPECLASS_AGGRESSIVE_CACHE
 
 # delayed import
 _ATTR = None
@@ -200,6 +202,14 @@ class ObjectManager(TypedObjectManager):
             # Exit early.
             return []
 
+        if candidates is not None and _TYPECLASS_AGGRESSIVE_CACHE:
+            # search the in-memory index
+            candidates = [_GA(obj, "dbobj") for obj in make_iter(candidates) if obj]
+            if typeclasses:
+                typeclasses = make_iter(typeclasses)
+                candidates = [obj for obj in candidates if _GA(obj, "db_typeclass_path") in typeclasses]
+            return _SEARCH_INDEX.search(ostring, candidates, exact=exact)
+
         # build query objects
         candidates_id = [_GA(obj, "id") for obj in make_iter(candidates) if obj]
         cand_restriction = candidates != None and Q(pk__in=make_iter(candidates_id)) or Q()
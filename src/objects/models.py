@@ -22,6 +22,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from src.typeclasses.models import (TypedObject, TagHandler, NickHandler,
                                     AliasHandler, AttributeHandler)
 from src.objects.manager import ObjectManager
+from src.objects.searchindex import SEARCH_INDEX as _SEARCH_INDEX
 from src.players.models import PlayerDB
 from src.commands.cmdsethandler import CmdSetHandler
 from src.commands import cmdhandler
@@ -37,12 +38,99 @@ from django.utils.translation import ugettext as _
 _ScriptDB = None
 _AT_SEARCH_RESULT = variable_from_module(*settings.SEARCH_AT_RESULT.rsplit('.', 1))
 _SESSIONS = None
+_DEFAULT_MSG = None
 
 _GA = object.__getattribute__
 _SA = object.__setattr__
 _DA = object.__delattr__
 
 
+#------------------------------------------------------------
+#
+# ContentsHandler
+#
+#------------------------------------------------------------
+
+class ContentsHandler(object):
+    """
+    Handles and caches the contents of an object, to avoid a
+    database lookup every time they are needed (this happens very
+    often, such as when the cmdhandler gathers object cmdsets). It
+    is stored on the 'contents_cache' property of the ObjectDB.
+
+    Only the primary keys of the contents are stored; the actual
+    objects are retrieved from the idmapper cache. The cache is
+    loaded from the database the first time it is used and then
+    kept up to date by ObjectDB.save() and ObjectDB.delete().
+    """
+    def __init__(self, obj):
+        """
+        Sets up the handler. No database lookup is made until the
+        contents are actually asked for.
+        """
+        self.obj = obj
+        self._pkcache = None
+        self._ordered = None
+
+    def init(self):
+        """
+        Re-initialize the contents cache from the database. Returns
+        the loaded objects.
+        """
+        objs = list(ObjectDB.objects.filter(db_location=self.obj))
+        self._pkcache = dict((_GA(obj, "id"), self._sortkey(obj)) for obj in objs)
+        self._ordered = None
+        return objs
+
+    def _sortkey(self, obj):
+        "Sort key matching the default TypedObject ordering."
+        return (_GA(obj, "db_date_created"), -_GA(obj, "id"))
+
+    def get(self, exclude=None):
+        """
+        Return the contents of the object, as typeclasses.
+
+        exclude - one or more objects to not return
+        """
+        if self._pkcache is None:
+            self.init()
+        if self._ordered is None:
+            self._ordered = [pk for pk, key in sorted(self._pkcache.items(),
+                                                      key=lambda tup: tup[1],
+                                                      reverse=True)]
+        pks = self._ordered
+        if exclude:
+            expks = set(obj.id for obj in make_iter(exclude))
+            pks = [pk for pk in pks if pk not in expks]
+        get_instance = ObjectDB.get_cached_instance
+        objs = [get_instance(pk) for pk in pks]
+        if None in objs:
+            # an object was flushed from the idmapper or removed behind
+            # our back; rebuild the cache from the database.
+            objs = self.init()
+            if exclude:
+                objs = [obj for obj in objs if _GA(obj, "id") not in expks]
+            objs = sorted(objs, key=self._sortkey, reverse=True)
+        return [(hasattr(obj, "typeclass") and obj.typeclass) or obj for obj in objs]
+
+    def add(self, obj):
+        "Add a new object to the contents cache"
+        if self._pkcache is not None:
+            self._pkcache[_GA(obj, "id")] = self._sortkey(obj)
+            self._ordered = None
+
+    def remove(self, obj):
+        "Remove an object from the contents cache"
+        if self._pkcache is not None:
+            self._pkcache.pop(_GA(obj, "id"), None)
+            self._ordered = None
+
+    def clear(self):
+        "Clear the cache; it will be reloaded from the database when next needed"
+        self._pkcache = None
+        self._ordered = None
+
+
 #------------------------------------------------------------
 #
 # ObjectDB
@@ -142,8 +230,34 @@ class ObjectDB(TypedObject):
         _SA(self, "nicks", NickHandler(self))
         _SA(self, "tags", TagHandler(self))
         _SA(self, "aliases", AliasHandler(self))
-        # make sure to sync the contents cache when initializing
-        #_GA(self, "contents_update")()
+        _SA(self, "contents_cache", ContentsHandler(self))
+        # the location whose contents cache we are listed in. Unsaved
+        # objects are not in any contents cache yet.
+        _SA(self, "_cached_location_id", _GA(self, "db_location_id") if _GA(self, "id") else None)
+
+    def save(self, *args, **kwargs):
+        """
+        Save the object. Also keeps the contents caches of the old
+        and new location in sync if the location changed.
+        """
+        super(ObjectDB, self).save(*args, **kwargs)
+        old_location_id = _GA(self, "_cached_location_id")
+        new_location_id = _GA(self, "db_location_id")
+        if old_location_id != new_location_id:
+            if old_location_id:
+                old_location = ObjectDB.get_cached_instance(old_location_id)
+                if old_location:
+                    _GA(old_location, "contents_cache").remove(self)
+            if new_location_id:
+                new_location = ObjectDB.get_cached_instance(new_location_id)
+                if new_location:
+                    _GA(new_location, "contents_cache").add(self)
+            _SA(self, "_cached_location_id", new_location_id)
+        _SEARCH_INDEX.update(self)
+
+    def _at_aliases_change(self):
+        "Called by the AliasHandler when aliases were added or removed"
+        _SEARCH_INDEX.update(self, aliases_changed=True)
 
     def _at_db_player_presave(self):
         """
@@ -224,7 +338,7 @@ class ObjectDB(TypedObject):
     def __location_del(self):
         "Cleably delete the location reference"
         _SA(_GA(self, "dbobj"), "db_location", None)
-        _GA(_GA(self, "dbobj"), "save")(upate_fields=["db_location"])
+        _GA(_GA(self, "dbobj"), "save")(update_fields=["db_location"])
     location = property(__location_get, __location_set, __location_del)
 
 
@@ -275,9 +389,7 @@ class ObjectDB(TypedObject):
 
         exclude is one or more objects to not return
         """
-        if exclude:
-            return ObjectDB.objects.get_contents(self, excludeobj=exclude)
-        return ObjectDB.objects.get_contents(self)
+        return _GA(self, "contents_cache").get(exclude=exclude)
     contents = property(contents_get)
 
     #@property
@@ -477,10 +589,6 @@ class ObjectDB(TypedObject):
         When this message is called, from_obj.at_msg_send and self.at_msg_receive are called.
 
         """
-        global _SESSIONS
-        if not _SESSIONS:
-            from src.server.sessionhandler import SESSIONS as _SESSIONS
-
         text = to_str(text, force_string=True) if text else ""
 
         if "data" in kwargs:
@@ -490,6 +598,19 @@ class ObjectDB(TypedObject):
             if isinstance(data, dict):
                 kwargs.update(data)
 
+        session = _GA(self, "_msg_session")(text, from_obj, sessid, kwargs)
+        if session:
+            session.msg(text=text, **kwargs)
+
+    def _msg_session(self, text, from_obj, sessid, kwargs):
+        """
+        Helper for msg(). Calls the message hooks and returns the
+        session the message should be sent to, or None.
+        """
+        global _SESSIONS
+        if not _SESSIONS:
+            from src.server.sessionhandler import SESSIONS as _SESSIONS
+
         if from_obj:
             # call hook
             try:
@@ -499,13 +620,11 @@ class ObjectDB(TypedObject):
         try:
             if not _GA(_GA(self, "typeclass"), "at_msg_receive")(text=text, **kwargs):
                 # if at_msg_receive returns false, we abort message to this object
-                return
+                return None
         except Exception:
             logger.log_trace()
 
-        session = _SESSIONS.session_from_sessid(sessid if sessid else _GA(self, "sessid"))
-        if session:
-            session.msg(text=text, **kwargs)
+        return _SESSIONS.session_from_sessid(sessid if sessid else _GA(self, "sessid"))
 
     def msg_contents(self, message, exclude=None, from_obj=None, **kwargs):
         """
@@ -513,13 +632,39 @@ class ObjectDB(TypedObject):
 
         exclude is a list of objects not to send to. See self.msg() for
                 more info.
+
+        Objects using the default msg() method only have their hooks
+        called here; the message is then sent to all their sessions
+        in one go. Objects with a custom msg() have it called as usual.
         """
+        global _SESSIONS, _DEFAULT_MSG
+        if not _SESSIONS:
+            from src.server.sessionhandler import SESSIONS as _SESSIONS
+        if not _DEFAULT_MSG:
+            from src.objects.objects import Object
+            _DEFAULT_MSG = Object.msg.im_func
+
         contents = _GA(self, "contents")
         if exclude:
             exclude = make_iter(exclude)
             contents = [obj for obj in contents if obj not in exclude]
+
+        text = to_str(message, force_string=True) if message else ""
+        if "data" in kwargs:
+            # deprecation warning
+            logger.log_depmsg("ObjectDB.msg_contents(): 'data'-dict keyword is deprecated. Use **kwargs instead.")
+            data = kwargs.pop("data")
+            if isinstance(data, dict):
+                kwargs.update(data)
+
+        sessions = []
         for obj in contents:
-            obj.msg(message, from_obj=from_obj, **kwargs)
+            if getattr(type(obj).msg, "im_func", None) is _DEFAULT_MSG:
+                # the default Object.msg() does not relay from_obj
+                sessions.append(_GA(obj.dbobj, "_msg_session")(text, None, 0, kwargs))
+            else:
+                obj.msg(message, from_obj=from_obj, **kwargs)
+        _SESSIONS.data_out_multi(sessions, text=text, **kwargs)
 
     def move_to(self, destination, quiet=False,
                 emit_to_obj=None, use_destination=True, to_none=False):
@@ -793,6 +938,15 @@ class ObjectDB(TypedObject):
         _GA(self, "nicks").clear()
         _GA(self, "aliases").clear()
 
+        # remove us from our location's contents cache
+        location_id = _GA(self, "_cached_location_id")
+        if location_id:
+            location = ObjectDB.get_cached_instance(location_id)
+            if location:
+                _GA(location, "contents_cache").remove(self)
+
+        _SEARCH_INDEX.remove(self)
+
         # Perform the deletion of the object
         super(ObjectDB, self).delete()
         return True
@@ -829,8 +829,11 @@ class Object(TypeClass):
         if not pobject:
             return
         # get and identify all objects
-        visible = (con for con in self.contents if con != pobject and
-                                                    con.access(pobject, "view"))
+        contents = self.contents
+        # load the Attributes of everything in here in one go
+        self.dbobj.__class__.objects.prefetch_attributes(contents)
+        visible = (con for con in contents if con != pobject and
+                                               con.access(pobject, "view"))
         exits, users, things = [], [], []
         for con in visible:
             key = con.key
@@ -0,0 +1,162 @@
+"""
+Object search index
+
+This keeps an in-memory inverted index of the keys and aliases of
+Objects, so that searching among a list of candidates (such as the
+contents of a room, which is what most in-game searches do) does not
+need a database query.
+
+For every indexed object the lowercased key and aliases are mapped to
+its id, as are all prefixes of the words in them (used for partial
+matching). Each index is split up in scopes: objects are indexed in
+the scope of their location, and objects without a location (like
+rooms) in the global scope (None). A search only needs to look in
+the scopes of the candidates given.
+
+Objects are indexed lazily, the first time they are among the search
+candidates. After that the index is kept up to date by ObjectDB as
+its key, location or aliases change. The index relies on the
+idmapper cache being the authority on the object data and is only
+used with settings.TYPECLASS_AGGRESSIVE_CACHE.
+"""
+
+from collections import defaultdict
+from src.utils.utils import string_partial_matching
+
+__all__ = ("SEARCH_INDEX", "ObjectSearchIndex")
+
+_GA = object.__getattribute__
+
+
+def _sortkey(obj):
+    "Sort key matching the default TypedObject ordering (used reversed)"
+    return (_GA(obj, "db_date_created"), -_GA(obj, "id"))
+
+
+class ObjectSearchIndex(object):
+    """
+    Inverted index of object keys, aliases and their word prefixes.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        "Empty the index"
+        # id -> (scope, key, (alias, alias, ...))
+        self.entries = {}
+        # scope -> name -> set of ids
+        self.names = defaultdict(lambda: defaultdict(set))
+        # scope -> word prefix -> set of ids
+        self.prefixes = defaultdict(lambda: defaultdict(set))
+
+    def _index(self, obj):
+        "Add a (not indexed) object to the index"
+        objid = _GA(obj, "id")
+        scope = _GA(obj, "db_location_id")
+        key = (_GA(obj, "db_key") or "").lower()
+        aliases = tuple(alias.lower() for alias in _GA(obj, "aliases").all())
+        self.entries[objid] = (scope, key, aliases)
+        names = self.names[scope]
+        prefixes = self.prefixes[scope]
+        for name in (key,) + aliases:
+            names[name].add(objid)
+            for word in name.split():
+                for iend in range(1, len(word) + 1):
+                    prefixes[word[:iend]].add(objid)
+
+    def _unindex(self, objid):
+        "Remove an object from the index by id"
+        entry = self.entries.pop(objid, None)
+        if not entry:
+            return
+        scope, key, aliases = entry
+        names = self.names[scope]
+        prefixes = self.prefixes[scope]
+        for name in (key,) + aliases:
+            ids = names.get(name)
+            if ids:
+                ids.discard(objid)
+                if not ids:
+                    del names[name]
+            for word in name.split():
+                for iend in range(1, len(word) + 1):
+                    ids = prefixes.get(word[:iend])
+                    if ids:
+                        ids.discard(objid)
+                        if not ids:
+                            del prefixes[word[:iend]]
+        if not names:
+            del self.names[scope]
+            del self.prefixes[scope]
+
+    def update(self, obj, aliases_changed=False):
+        """
+        Re-index obj if it is indexed and its key or location (or
+        aliases, if aliases_changed is set) changed.
+        """
+        objid = _GA(obj, "id")
+        entry = self.entries.get(objid)
+        if entry and (aliases_changed or entry[0] != _GA(obj, "db_location_id")
+                      or entry[1] != (_GA(obj, "db_key") or "").lower()):
+            self._unindex(objid)
+            self._index(obj)
+
+    def remove(self, obj):
+        "Remove obj from the index"
+        self._unindex(_GA(obj, "id"))
+
+    def search(self, ostring, candidates, exact=True):
+        """
+        Search for objects among candidates by key or alias.
+
+        ostring - the search string
+        candidates - list of ObjectDB instances to search among
+        exact - match whole names, ignoring case. Otherwise match
+                like utils.string_partial_matching, where all words
+                of ostring must match the start of words in the names
+                (in order). Matches on keys are preferred over matches
+                on aliases in that case.
+
+        Returns a list of matching candidates, in the default
+        TypedObject ordering.
+        """
+        entries = self.entries
+        cands = {}
+        for cand in candidates:
+            objid = _GA(cand, "id")
+            entry = entries.get(objid)
+            if not entry or entry[0] != _GA(cand, "db_location_id"):
+                self._unindex(objid)
+                self._index(cand)
+            cands[objid] = cand
+        scopes = set(entries[objid][0] for objid in cands)
+        ostring = ostring.lower()
+
+        if exact:
+            matches = [cands[objid] for scope in scopes
+                       for objid in self.names[scope].get(ostring, ()) if objid in cands]
+        else:
+            words = ostring.split()
+            if not words:
+                return []
+            # ids having all the words as prefixes of some word in their names
+            found = []
+            for scope in scopes:
+                prefixes = self.prefixes[scope]
+                ids = set(cands)
+                for word in words:
+                    ids.intersection_update(prefixes.get(word, ()))
+                    if not ids:
+                        break
+                found.extend(ids)
+            # check the word order, keys first
+            found = [(objid, entries[objid]) for objid in found]
+            matches = [cands[objid] for objid, entry in found
+                       if string_partial_matching([entry[1]], ostring)]
+            if not matches:
+                matches = [cands[objid] for objid, entry in found
+                           if string_partial_matching(entry[2], ostring)]
+        return sorted(set(matches), key=_sortkey, reverse=True)
+
+
+SEARCH_INDEX = ObjectSearchIndex()
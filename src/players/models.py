@@ -240,6 +240,14 @@ class PlayerDB(TypedObject, AbstractUser):
                 kwargs.update(data)
 
         text = to_str(text, force_string=True) if text else ""
+        for sess in _GA(self, "_msg_sessions")(text, from_obj, sessid, kwargs):
+            sess.msg(text=text, **kwargs)
+
+    def _msg_sessions(self, text, from_obj, sessid, kwargs):
+        """
+        Helper for msg(). Calls the message hooks and returns a list
+        of the sessions the message should be sent to.
+        """
         if from_obj:
             # call hook
             try:
@@ -251,12 +259,11 @@ class PlayerDB(TypedObject, AbstractUser):
             obj = session.puppet
             if obj and not obj.at_msg_receive(text=text, **kwargs):
                 # if hook returns false, cancel send
-                return
-            session.msg(text=text, **kwargs)
+                return []
+            return [session]
         else:
             # if no session was specified, send to them all
-            for sess in _GA(self, 'get_all_sessions')():
-                sess.msg(text=text, **kwargs)
+            return _GA(self, 'get_all_sessions')()
 
     # session-related methods
 
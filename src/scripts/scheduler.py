@@ -0,0 +1,199 @@
+"""
+Scheduler
+
+This is a single timer queue shared by all timed Scripts and Tickers.
+Instead of each of them keeping its own delayed call in the Twisted
+reactor (which means tens of thousands of reactor calls with many
+timed NPC scripts), they register their calls with the SCHEDULER
+instance of this module. The scheduler keeps the calls in a heap and
+only has one reactor call of its own, for when the earliest of them
+is due. When it fires, all calls due within self.resolution seconds
+of each other are run together.
+
+Adding, rescheduling and cancelling a call is O(log n). Cancelled and
+rescheduled calls are only marked as such in the heap and are thrown
+away when they reach the top.
+
+The scheduler implements the parts of Twisted's IReactorTime
+interface used by LoopingCall (seconds and callLater), so it can be
+used as the clock of a LoopingCall. ExtendedLoopingCall does so by
+default.
+"""
+
+from heapq import heappush, heappop, heapify
+from twisted.internet import reactor
+from src.utils import logger
+
+__all__ = ("SCHEDULER", "Scheduler")
+
+
+class ScheduledCall(object):
+    """
+    A call registered with the Scheduler. This offers the same
+    interface as Twisted's DelayedCall.
+    """
+    def __init__(self, scheduler, time, func, args, kwargs):
+        self.scheduler = scheduler
+        self.time = time
+        self.func = func
+        self.args = args
+        self.kw = kwargs
+        self.cancelled = False
+        self.called = False
+        # the current heap entry of this call
+        self._entry = None
+
+    def getTime(self):
+        "Return the time (in reactor seconds) this call is due"
+        return self.time
+
+    def active(self):
+        "Return if this call is still waiting to be run"
+        return not (self.cancelled or self.called)
+
+    def cancel(self):
+        "Unschedule this call"
+        if self.active():
+            self.cancelled = True
+            self.scheduler._discard(self)
+            self.scheduler._arm()
+
+    def reset(self, secondsFromNow):
+        "Reschedule this call to secondsFromNow seconds from now"
+        if self.active():
+            self.scheduler._discard(self)
+            self.time = self.scheduler.seconds() + secondsFromNow
+            self.scheduler._push(self)
+
+    def delay(self, secondsLater):
+        "Reschedule this call to secondsLater seconds later than planned"
+        if self.active():
+            self.scheduler._discard(self)
+            self.time += secondsLater
+            self.scheduler._push(self)
+
+    def __repr__(self):
+        return "<ScheduledCall %s at %s>" % (getattr(self.func, "__name__", self.func), self.time)
+
+
+class Scheduler(object):
+    """
+    A heap of calls, run by a single reactor call.
+    """
+    # calls due within this many seconds of each other are run together
+    resolution = 0.01
+
+    def __init__(self, clock=reactor):
+        """
+        clock - the IReactorTime provider actually driving the
+                scheduler (the reactor, or a task.Clock for testing)
+        """
+        self.clock = clock
+        # heap of [time, sequence, call] entries; call is None when discarded
+        self.heap = []
+        self.sequence = 0
+        self.ndiscarded = 0
+        self._call = None
+
+    def seconds(self):
+        "Get the current time"
+        return self.clock.seconds()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        """
+        Schedule func(*args, **kwargs) to be called in delay seconds.
+        Returns a ScheduledCall.
+        """
+        call = ScheduledCall(self, self.clock.seconds() + max(0, delay), func, args, kwargs)
+        self._push(call)
+        return call
+
+    def getDelayedCalls(self):
+        "Get all active calls"
+        return [entry[2] for entry in self.heap if entry[2]]
+
+    def __len__(self):
+        return len(self.heap) - self.ndiscarded
+
+    def _push(self, call):
+        "Add call to the heap"
+        self.sequence += 1
+        entry = [call.time, self.sequence, call]
+        call._entry = entry
+        heappush(self.heap, entry)
+        self._arm()
+
+    def _discard(self, call):
+        "Remove call from the heap (lazily)"
+        entry = call._entry
+        if entry:
+            entry[2] = None
+            call._entry = None
+            self.ndiscarded += 1
+            if self.ndiscarded > 100 and self.ndiscarded > len(self.heap) / 2:
+                # don't let discarded entries pile up
+                self.heap = [entry for entry in self.heap if entry[2]]
+                heapify(self.heap)
+                self.ndiscarded = 0
+
+    def _arm(self):
+        "Make sure our reactor call is due when the earliest call is"
+        heap = self.heap
+        while heap and not heap[0][2]:
+            heappop(heap)
+            self.ndiscarded -= 1
+        if not heap:
+            if self._call and self._call.active():
+                self._call.cancel()
+            self._call = None
+            return
+        due = heap[0][0]
+        if self._call and self._call.active():
+            if self._call.getTime() <= due:
+                # an earlier reactor call will re-arm when it fires
+                return
+            self._call.reset(max(0, due - self.clock.seconds()))
+        else:
+            self._call = self.clock.callLater(max(0, due - self.clock.seconds()), self._run)
+
+    def _run(self):
+        """
+        Run all calls that are due, one at a time, so a call cancelled
+        or rescheduled by an earlier one in the same slot is skipped.
+        Calls added while running are left for the next run.
+        """
+        self._call = None
+        slot = self.clock.seconds() + self.resolution
+        last = self.sequence
+        added = []
+        # the heap may be replaced (compacted) by the calls, so always
+        # use self.heap
+        while self.heap and self.heap[0][0] <= slot:
+            entry = heappop(self.heap)
+            call = entry[2]
+            if not call:
+                self.ndiscarded -= 1
+            elif entry[1] > last:
+                added.append(entry)
+            else:
+                call._entry = None
+                call.called = True
+                try:
+                    call.func(*call.args, **call.kw)
+                except Exception:
+                    logger.log_trace()
+        for entry in added:
+            heappush(self.heap, entry)
+        self._arm()
+
+    def clear(self):
+        "Cancel all calls"
+        for entry in self.heap:
+            if entry[2]:
+                entry[2].cancelled = True
+        self.heap = []
+        self.ndiscarded = 0
+        self._arm()
+
+
+SCHEDULER = Scheduler()
@@ -11,6 +11,7 @@ from django.conf import settings
 from django.utils.translation import ugettext as _
 from src.typeclasses.typeclass import TypeClass
 from src.scripts.models import ScriptDB
+from src.scripts.scheduler import SCHEDULER
 from src.comms import channelhandler
 from src.utils import logger
 
@@ -25,11 +26,16 @@ _ATTRIBUTE_CACHE_MAXSIZE = settings.ATTRIBUTE_CACHE_MAXSIZE
 class ExtendedLoopingCall(LoopingCall):
     """
     LoopingCall that can start at a delay different
-    than self.interval.
+    than self.interval. It is run by the shared SCHEDULER
+    rather than having a call of its own in the reactor.
     """
     start_delay = None
     callcount = 0
 
+    def __init__(self, f, *args, **kwargs):
+        super(ExtendedLoopingCall, self).__init__(f, *args, **kwargs)
+        self.clock = SCHEDULER
+
     def start(self, interval, now=True, start_delay=None, count_start=0):
         """
         Start running function every interval seconds.
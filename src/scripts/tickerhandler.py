@@ -48,10 +48,14 @@ a  custom handler one can make a custom AT_STARTSTOP_MODULE entry to
 call the handler's save() and restore() methods when the server reboots.
 
 """
+from time import time
+from django.conf import settings
+from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import deferLater
 from src.scripts.scripts import ExtendedLoopingCall
 from src.server.models import ServerConfig
-from src.utils.logger import log_trace
+from src.utils.logger import log_trace, log_warnmsg
 from src.utils.dbserialize import dbserialize, dbunserialize, pack_dbobj, unpack_dbobj
 
 _GA = object.__getattribute__
@@ -63,14 +67,22 @@ class Ticker(object):
     Represents a repeatedly running task that calls
     hooks repeatedly. Overload _callback to change the
     way it operates.
+
+    The interval is split into settings.TICKER_PHASES steps with
+    every subscriber ticked at one of them, and ticks running
+    longer than settings.TICKER_TIME_BUDGET seconds are split into
+    chunks (see the settings file). The time spent in the ticks is
+    recorded in self.stats.
     """
+    phases = settings.TICKER_PHASES
+    time_budget = settings.TICKER_TIME_BUDGET
 
     @inlineCallbacks
     def _callback(self):
         """
-        This will be called repeatedly every self.interval seconds.
-        self.subscriptions contain tuples of (obj, args, kwargs) for
-        each subscribing object.
+        This will be called repeatedly every self.interval seconds
+        (divided by the number of phases). self.subscriptions contain
+        tuples of (obj, args, kwargs) for each subscribing object.
 
         If overloading, this callback is expected to handle all
         subscriptions when it is triggered. It should not return
@@ -78,12 +90,56 @@ class Ticker(object):
         The callback should ideally work under @inlineCallbacks so it can yield
         appropriately.
         """
-        for key, (obj, args, kwargs) in self.subscriptions.items():
-            hook_key = yield kwargs.get("hook_key", "at_tick")
+        subscriptions = self.subscriptions
+        store_keys = self._tick_keys()
+        budget = self.time_budget
+        duration = 0.0
+        chunkstart = time()
+        for store_key in store_keys:
+            subscription = subscriptions.get(store_key)
+            if not subscription:
+                # unsubscribed during an earlier chunk
+                continue
+            obj, args, kwargs = subscription
+            hook_key = kwargs.get("hook_key", "at_tick")
             try:
-                yield _GA(obj, hook_key)(*args, **kwargs)
+                _GA(obj, hook_key)(*args, **kwargs)
             except Exception:
                 log_trace()
+            if budget and time() - chunkstart > budget:
+                # let the reactor handle other things before continuing
+                duration += time() - chunkstart
+                self.stats["chunks"] += 1
+                yield self._pause()
+                chunkstart = time()
+                subscriptions = self.subscriptions
+        duration += time() - chunkstart
+        self._record(duration)
+
+    def _tick_keys(self):
+        "Get the store_keys of the subscribers to tick this time"
+        if self.nphases > 1:
+            store_keys = list(self._phases[self._phase])
+            self._phase = (self._phase + 1) % self.nphases
+            return store_keys
+        return self.subscriptions.keys()
+
+    def _pause(self):
+        "Returns a deferred firing when the reactor had a chance to run other things"
+        return deferLater(reactor, 0, lambda: None)
+
+    def _record(self, duration):
+        "Record the time (in seconds) spent in a tick"
+        stats = self.stats
+        stats["ticks"] += 1
+        stats["last"] = duration
+        stats["total"] += duration
+        stats["max"] = max(stats["max"], duration)
+        step = float(self.interval) / self.nphases
+        if duration > step:
+            stats["overruns"] += 1
+            log_warnmsg("Ticker(%s): a tick took %.2fs, longer than its interval of %.2fs." % (
+                        self.interval, duration, step))
 
     def __init__(self, interval):
         """
@@ -91,6 +147,11 @@ class Ticker(object):
         """
         self.interval = interval
         self.subscriptions = {}
+        # the store_keys of the subscribers in each phase
+        self.nphases = max(1, int(self.phases))
+        self._phases = [set() for _ in range(self.nphases)]
+        self._phase = 0
+        self.stats = {"ticks": 0, "last": 0.0, "total": 0.0, "max": 0.0, "overruns": 0, "chunks": 0}
         # set up a twisted asynchronous repeat call
         self.task = ExtendedLoopingCall(self._callback)
 
@@ -108,8 +169,7 @@ class Ticker(object):
             if not subs:
                 self.task.stop()
         elif subs:
-            print "starting with start_delay=", start_delay
-            self.task.start(self.interval, now=False, start_delay=start_delay)
+            self.task.start(float(self.interval) / self.nphases, now=False, start_delay=start_delay)
 
     def add(self, store_key, obj, *args, **kwargs):
         """
@@ -119,6 +179,7 @@ class Ticker(object):
         """
         start_delay = kwargs.pop("_start_delay", None)
         self.subscriptions[store_key] = (obj, args, kwargs)
+        self._phases[hash(store_key) % self.nphases].add(store_key)
         self.validate(start_delay=start_delay)
 
     def remove(self, store_key):
@@ -126,6 +187,7 @@ class Ticker(object):
         Unsubscribe object from this ticker
         """
         self.subscriptions.pop(store_key, False)
+        self._phases[hash(store_key) % self.nphases].discard(store_key)
         self.validate()
 
     def stop(self):
@@ -133,6 +195,7 @@ class Ticker(object):
         Kill the Task, regardless of subscriptions
         """
         self.subscriptions = {}
+        self._phases = [set() for _ in range(self.nphases)]
         self.validate()
 
 
@@ -24,7 +24,7 @@ try:
 except ImportError:
     import pickle
 from twisted.protocols import amp
-from twisted.internet import protocol
+from twisted.internet import protocol, reactor
 from twisted.internet.defer import Deferred
 from src.utils.utils import to_str, variable_from_module
 
@@ -161,6 +161,22 @@ class MsgServer2Portal(amp.Command):
     response = []
 
 
+class MsgServer2PortalBatch(amp.Command):
+    """
+    Message server -> portal, batched
+
+    The data is a pickled list of (sessids, msg, data) entries, each
+    of which is to be delivered to all sessions in sessids.
+    """
+    key = "MsgServer2PortalBatch"
+    arguments = [('sessid', amp.Integer()),
+                 ('ipart', amp.Integer()),
+                 ('nparts', amp.Integer()),
+                 ('data', amp.String())]
+    errors = [(Exception, 'EXCEPTION')]
+    response = []
+
+
 class ServerAdmin(amp.Command):
     """
     Portal -> Server
@@ -235,6 +251,13 @@ class AMPProtocol(amp.AMP):
     subclasses that specify the datatypes of the input/output of these methods.
     """
 
+    def __init__(self, *args, **kwargs):
+        amp.AMP.__init__(self, *args, **kwargs)
+        # outgoing server->portal messages waiting to be sent as a batch
+        self._msgbatch = []
+        self._msgbatch_size = 0
+        self._msgbatch_call = None
+
     # helper methods
 
     def connectionMade(self):
@@ -385,11 +408,69 @@ class AMPProtocol(amp.AMP):
     def call_remote_MsgServer2Portal(self, sessid, msg, data=""):
         """
         Access method called by the Server and executed on the Server.
+
+        The message is not sent right away but is added to a batch
+        sent at the end of the current reactor tick (see
+        send_msgbatch).
         """
         #print "msg server->portal (server side):", sessid, msg, data
-        return self.safe_send(MsgServer2Portal, sessid,
-                              msg=to_str(msg) if msg is not None else "",
-                              data=dumps(data))
+        self.call_remote_MsgServer2PortalMulti((sessid,), msg, data=data)
+
+    def call_remote_MsgServer2PortalMulti(self, sessids, msg, data=""):
+        """
+        Access method called by the Server and executed on the Server.
+
+        Multicast the same message to all sessions with the given
+        sessids. The message is added to the current batch. If the
+        last message in the batch is identical, the sessids are just
+        added to it, so sending the same text to many sessions in a
+        row only transfers it once.
+        """
+        msg = to_str(msg) if msg is not None else ""
+        data = data or {}
+        batch = self._msgbatch
+        if batch and batch[-1][1] == msg and batch[-1][2] == data:
+            batch[-1][0].extend(sessids)
+        else:
+            batch.append((list(sessids), msg, data))
+            self._msgbatch_size += len(msg)
+        if self._msgbatch_size >= MAXLEN:
+            # don't let a batch grow much beyond one AMP frame
+            self.send_msgbatch()
+        elif not self._msgbatch_call:
+            self._msgbatch_call = reactor.callLater(0, self.send_msgbatch)
+
+    def send_msgbatch(self):
+        """
+        Send all batched server->portal messages as one AMP command.
+        This is called at the end of the reactor tick in which the
+        messages were added, or before any other command is sent to
+        the portal so as to retain the order of operations.
+        """
+        if self._msgbatch_call:
+            if self._msgbatch_call.active():
+                self._msgbatch_call.cancel()
+            self._msgbatch_call = None
+        if not self._msgbatch:
+            return
+        batch = [(tuple(sessids), msg, data) for sessids, msg, data in self._msgbatch]
+        self._msgbatch = []
+        self._msgbatch_size = 0
+        return self.safe_send(MsgServer2PortalBatch, 0, data=dumps(batch))
+
+    def amp_msg_server2portal_batch(self, sessid, ipart, nparts, data):
+        """
+        Relays a batch of messages to the Portal. This method is
+        executed on the Portal.
+        """
+        ret = self.safe_recv(MsgServer2PortalBatch, sessid,
+                             ipart, nparts, data=data)
+        if ret is not None:
+            portal_sessionhandler = self.factory.portal.sessions
+            for sessids, msg, data in loads(ret["data"]):
+                portal_sessionhandler.data_out(sessids, text=msg, **data)
+        return {}
+    MsgServer2PortalBatch.responder(amp_msg_server2portal_batch)
 
     # Server administration from the Portal side
     def amp_server_admin(self, sessid, ipart, nparts, operation, data):
@@ -485,6 +566,8 @@ class AMPProtocol(amp.AMP):
         """
         Access method called by the server side.
         """
+        # make sure queued messages arrive before e.g. a disconnect
+        self.send_msgbatch()
         self.safe_send(PortalAdmin, sessid, operation=operation, data=dumps(data))
 
     # Extra functions
@@ -524,6 +607,7 @@ class AMPProtocol(amp.AMP):
             A deferred that fires with the return value of the remote
             function call
         """
+        self.send_msgbatch()
         return self.callRemote(FunctionCall,
                                module=modulepath,
                                function=functionname,
@@ -12,20 +12,35 @@ effect of MCCP unless you have extremely heavy traffic or sits on a
 terribly slow connection.
 
 This protocol is implemented by the telnet protocol importing
-mccp_compress and calling it from its write methods.
+mccp_write and calling it from its write methods. While compression
+is active, all data written during one reactor iteration is gathered
+and compressed and flushed together, which is both cheaper and
+compresses better than flushing the zlib stream for every line. The
+zlib compression level is set by settings.MCCP_COMPRESSION_LEVEL.
+Each handler counts the bytes it compressed and the compressed bytes
+actually sent; see Mccp.stats() (the handler of a telnet session is
+its mccp attribute).
 """
 import zlib
+from twisted.internet import reactor
+from django.conf import settings
 
 # negotiations for v1 and v2 of the protocol
 MCCP = chr(86)
 FLUSH = zlib.Z_SYNC_FLUSH
+COMPRESSION_LEVEL = settings.MCCP_COMPRESSION_LEVEL
 
 
-def mccp_compress(protocol, data):
-    "Handles zlib compression, if applicable"
-    if hasattr(protocol, 'zlib'):
-        return protocol.zlib.compress(data) + protocol.zlib.flush(FLUSH)
-    return data
+def mccp_write(protocol, data):
+    """
+    Write data to the transport of protocol, through its Mccp
+    handler if it has one.
+    """
+    mccp = getattr(protocol, 'mccp', None)
+    if mccp:
+        mccp.write(data)
+    else:
+        protocol.transport.write(data)
 
 
 class Mccp(object):
@@ -44,6 +59,12 @@ class Mccp(object):
 
         self.protocol = protocol
         self.protocol.protocol_flags['MCCP'] = False
+        # data waiting to be compressed
+        self.buffer = []
+        self.flushcall = None
+        # bytes compressed and the compressed bytes sent for them
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
         # ask if client will mccp, connect callbacks to handle answer
         self.protocol.will(MCCP).addCallbacks(self.do_mccp, self.no_mccp)
 
@@ -52,6 +73,8 @@ class Mccp(object):
         Called if client doesn't support mccp or chooses to turn it off
         """
         if hasattr(self.protocol, 'zlib'):
+            # send what was written while compressing
+            self.flush()
             del self.protocol.zlib
         self.protocol.protocol_flags['MCCP'] = False
 
@@ -62,4 +85,42 @@ class Mccp(object):
         """
         self.protocol.protocol_flags['MCCP'] = True
         self.protocol.requestNegotiation(MCCP, '')
-        self.protocol.zlib = zlib.compressobj(9)
+        self.protocol.zlib = zlib.compressobj(COMPRESSION_LEVEL)
+
+    def write(self, data):
+        """
+        Write data to the transport. If compressing, the data is
+        buffered until the end of the current reactor iteration.
+        """
+        if hasattr(self.protocol, 'zlib'):
+            self.buffer.append(data)
+            if not self.flushcall:
+                self.flushcall = reactor.callLater(0, self.flush)
+        else:
+            self.protocol.transport.write(data)
+
+    def flush(self):
+        """
+        Compress and send all buffered data.
+        """
+        if self.flushcall and self.flushcall.active():
+            self.flushcall.cancel()
+        self.flushcall = None
+        if self.buffer:
+            data = "".join(self.buffer)
+            self.buffer = []
+            compressor = getattr(self.protocol, 'zlib', None)
+            if compressor:
+                self.raw_bytes += len(data)
+                data = compressor.compress(data) + compressor.flush(FLUSH)
+                self.compressed_bytes += len(data)
+            self.protocol.transport.write(data)
+
+    def stats(self):
+        """
+        Returns a dict with the number of bytes compressed, the
+        compressed bytes sent for them and the resulting ratio.
+        """
+        return {"raw_bytes": self.raw_bytes,
+                "compressed_bytes": self.compressed_bytes,
+                "ratio": float(self.compressed_bytes) / self.raw_bytes if self.raw_bytes else 1.0}
@@ -0,0 +1,88 @@
+"""
+Portal output pipeline
+
+The Portal protocols each turn the text they get from the Server into
+what goes over the wire in their own way - ANSI sequences for telnet
+and ssh, html for the webclient and websockets - depending on the
+raw, nomarkup and xterm256 flags. A message sent to many sessions at
+once (like a room broadcast, see the Server's
+SESSIONS.data_out_multi) would so be rendered again for every
+receiving session.
+
+Instead the protocols get their output from the OUTPUT_PIPELINE
+instance of this module. Given the text (already converted to the
+session's encoding), the protocol flavor and the flags, it returns
+the rendered string, rendering it only once per flavor and flag
+combination and caching the result. The protocols then write it as
+usual (the telnet protocol adding line endings and escaping through
+its sendLine). The markup is parsed without going through the parse
+cache of src.utils.ansi, so the same output is not cached twice.
+"""
+
+import re
+from src.utils.ansi import ANSI_PARSER, ParseCache
+from src.utils.text2html import HTML_PARSER
+
+__all__ = ("OUTPUT_PIPELINE", "OutputPipeline")
+
+_RE_N = re.compile(r"\{n$")
+
+# max total length (in bytes) of the rendered texts kept in the cache
+_CACHE_MAXSIZE = 4 * 1024 * 1024
+
+
+class OutputPipeline(object):
+    """
+    Renders and caches the output of the Portal protocols.
+    """
+    def __init__(self, maxsize=_CACHE_MAXSIZE):
+        self.cache = ParseCache(maxsize)
+
+    def render(self, text, flavor, raw=False, nomarkup=False, xterm256=False):
+        """
+        Get text rendered for sending.
+
+        text - the text to send, a str in the session's encoding
+        flavor - the name of one of the render_<flavor> methods
+                 (telnet, ssh, html)
+        raw - send text as it is, without parsing its markup
+        nomarkup - strip all markup instead of converting it
+        xterm256 - use xterm256 colours (where supported)
+
+        Returns the rendered string.
+        """
+        raw, nomarkup, xterm256 = bool(raw), bool(nomarkup), bool(xterm256)
+        cachekey = (text, flavor, raw, nomarkup, xterm256)
+        rendered = self.cache.get(cachekey)
+        if rendered is None:
+            rendered = getattr(self, "render_%s" % flavor)(text, raw, nomarkup, xterm256)
+            self.cache.set(cachekey, rendered, len(text) + len(rendered))
+        return rendered
+
+    def _render_ansi(self, text, nomarkup, xterm256):
+        "Convert (or strip) markup to ANSI sequences, bypassing the parse cache"
+        target = "strip" if nomarkup else ("xterm256" if xterm256 else "ansi")
+        return getattr(ANSI_PARSER, "render_%s" % target)(ANSI_PARSER.tokenize(text))
+
+    def render_telnet(self, text, raw, nomarkup, xterm256):
+        "Render a line for the telnet protocol"
+        if raw:
+            return text
+        # we need to make sure to kill the color at the end in order
+        # to match the webclient output.
+        return self._render_ansi(_RE_N.sub("", text) + "{n", nomarkup, xterm256)
+
+    def render_ssh(self, text, raw, nomarkup, xterm256):
+        "Render text for the ssh protocol"
+        if raw:
+            return text
+        return self._render_ansi(text.strip("{r") + "{r", nomarkup, False)
+
+    def render_html(self, text, raw, nomarkup, xterm256):
+        "Render text for the webclient and websockets"
+        if raw or not text:
+            return text
+        return HTML_PARSER.render_tokens(ANSI_PARSER.tokenize(text), strip_ansi=nomarkup)
+
+
+OUTPUT_PIPELINE = OutputPipeline()
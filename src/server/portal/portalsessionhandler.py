@@ -177,8 +177,17 @@ class PortalSessionHandler(SessionHandler):
     def data_out(self, sessid, text=None, **kwargs):
         """
         Called by server for having the portal relay messages and data
-        to the correct session protocol.
-        """
+        to the correct session protocol. sessid may also be a list or
+        tuple of sessids, for sending the same data to all of them
+        (the protocols get their rendered output from the cache of
+        portal/output.py, so it is rendered only once per protocol
+        flavor and flags).
+        """
+        if isinstance(sessid, (list, tuple)):
+            for sess in (self.sessions.get(sid) for sid in sessid):
+                if sess:
+                    sess.data_out(text=text, **kwargs)
+            return
         session = self.sessions.get(sessid, None)
         if session:
             session.data_out(text=text, **kwargs)
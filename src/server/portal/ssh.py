@@ -25,8 +25,9 @@ from twisted.conch import interfaces as iconch
 from twisted.python import components
 from django.conf import settings
 from src.server import session
+from src.server.portal.output import OUTPUT_PIPELINE
 from src.players.models import PlayerDB
-from src.utils import ansi, utils
+from src.utils import utils
 
 ENCODINGS = settings.ENCODINGS
 
@@ -186,10 +187,7 @@ class SshProtocol(Manhole, session.Session):
             return
         raw = kwargs.get("raw", False)
         nomarkup = kwargs.get("nomarkup", False)
-        if raw:
-            self.lineSend(text)
-        else:
-            self.lineSend(ansi.parse_ansi(text.strip("{r") + "{r", strip_ansi=nomarkup))
+        self.lineSend(OUTPUT_PIPELINE.render(text, "ssh", raw=raw, nomarkup=nomarkup))
 
 
 class ExtraInfoAuthServer(SSHUserAuthServer):
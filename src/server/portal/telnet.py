@@ -7,14 +7,12 @@ sessions etc.
 
 """
 
-import re
 from twisted.conch.telnet import Telnet, StatefulTelnetProtocol, IAC, LINEMODE
 from src.server.session import Session
 from src.server.portal import ttype, mssp, msdp
-from src.server.portal.mccp import Mccp, mccp_compress, MCCP
-from src.utils import utils, ansi, logger
-
-_RE_N = re.compile(r"\{n$")
+from src.server.portal.mccp import Mccp, mccp_write, MCCP
+from src.server.portal.output import OUTPUT_PIPELINE
+from src.utils import utils, logger
 
 
 class TelnetProtocol(Telnet, StatefulTelnetProtocol, Session):
@@ -32,7 +30,7 @@ class TelnetProtocol(Telnet, StatefulTelnetProtocol, Session):
         self.iaw_mode = False
         client_address = self.transport.client
         self.init_session("telnet", client_address, self.factory.sessionhandler)
-        # negotiate mccp (data compression)
+        # negotiate mccp (data compression); also keeps the byte counts
         self.mccp = Mccp(self)
         # negotiate ttype (client info)
         self.ttype = ttype.Ttype(self)
@@ -89,6 +87,9 @@ class TelnetProtocol(Telnet, StatefulTelnetProtocol, Session):
         the disconnect method
         """
         self.sessionhandler.disconnect(self)
+        if hasattr(self, 'mccp'):
+            # send any compressed data still waiting
+            self.mccp.flush()
         self.transport.loseConnection()
 
     def dataReceived(self, data):
@@ -134,7 +135,7 @@ class TelnetProtocol(Telnet, StatefulTelnetProtocol, Session):
         # print "_write (%s): %s" % (self.state,  " ".join(str(ord(c)) for c in data))
         data = data.replace('\n', '\r\n').replace('\r\r\n', '\r\n')
         #data = data.replace('\n', '\r\n')
-        super(TelnetProtocol, self)._write(mccp_compress(self, data))
+        mccp_write(self, data)
 
     def sendLine(self, line):
         "hook overloading the one used by linereceiver"
@@ -142,7 +143,7 @@ class TelnetProtocol(Telnet, StatefulTelnetProtocol, Session):
         #escape IAC in line mode, and correctly add \r\n
         line += self.delimiter
         line = line.replace(IAC, IAC + IAC).replace('\n', '\r\n')
-        return self.transport.write(mccp_compress(self, line))
+        return mccp_write(self, line)
 
     def lineReceived(self, string):
         """
@@ -214,11 +215,6 @@ class TelnetProtocol(Telnet, StatefulTelnetProtocol, Session):
 
         #print "telnet kwargs=%s, message=%s" % (kwargs, text)
         #print "xterm256=%s, useansi=%s, raw=%s, nomarkup=%s, init_done=%s" % (xterm256, useansi, raw, nomarkup, ttype.get("init_done"))
-        if raw:
-            # no processing whatsoever
-            self.sendLine(text)
-        else:
-            # we need to make sure to kill the color at the end in order
-            # to match the webclient output.
-            # print "telnet data out:", self.protocol_flags, id(self.protocol_flags), id(self)
-            self.sendLine(ansi.parse_ansi(_RE_N.sub("", text) + "{n", strip_ansi=nomarkup, xterm256=xterm256))
+        # the rendered line is cached, for sending it to many sessions
+        self.sendLine(OUTPUT_PIPELINE.render(text, "telnet", raw=raw,
+                                             nomarkup=nomarkup, xterm256=xterm256))
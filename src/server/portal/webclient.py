@@ -18,19 +18,24 @@ found on http://localhost:8000/webclient.)
 """
 import time
 import json
+import zlib
 from hashlib import md5
 
+from twisted.internet import reactor
 from twisted.web import server, resource
 
 from django.utils.functional import Promise
 from django.utils.encoding import force_unicode
 from django.conf import settings
 from src.utils import utils, logger
-from src.utils.text2html import parse_html
+from src.server.portal.output import OUTPUT_PIPELINE
 from src.server import session
 
 SERVERNAME = settings.SERVERNAME
 ENCODINGS = settings.ENCODINGS
+BUFFER_SIZE = settings.WEBCLIENT_BUFFER_SIZE
+BUFFER_POLICY = settings.WEBCLIENT_BUFFER_POLICY
+GZIP_MINSIZE = settings.WEBCLIENT_GZIP_MINSIZE
 
 
 # defining a simple json encoder for returning
@@ -61,9 +66,18 @@ class WebClient(resource.Resource):
     isLeaf = True
     allowedMethods = ('POST',)
 
-    def __init__(self):
+    def __init__(self, clock=reactor):
+        """
+        clock - the IReactorTime provider used to schedule sending
+        """
+        self.clock = clock
         self.requests = {}
+        # suid -> list of {'msg':..., 'data':...} waiting to be sent
         self.databuffer = {}
+        # suid -> total length of the buffered messages
+        self.buffersize = {}
+        # suids with a send scheduled
+        self.sending = set()
 
     #def getChild(self, path, request):
     #    """
@@ -78,32 +92,84 @@ class WebClient(resource.Resource):
         except KeyError:
             pass
 
-    def lineSend(self, suid, string, data=None):
+    def _pop_buffer(self, suid):
+        "Get and empty the buffer of a client"
+        self.buffersize[suid] = 0
+        return self.databuffer.pop(suid, None) or []
+
+    def _encode(self, request, dataentries):
+        """
+        Encode a list of buffered entries as a JSON array, as the
+        response to request. Large responses are gzip-compressed if
+        the client accepts it.
         """
-        This adds the data to the buffer and/or sends it to
-        the client as soon as possible.
+        response = jsonify(dataentries)
+        if (GZIP_MINSIZE and len(response) >= GZIP_MINSIZE
+                and "gzip" in (request.getHeader("accept-encoding") or "")):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            response = compressor.compress(response) + compressor.flush()
+            request.setHeader("content-encoding", "gzip")
+        return response
+
+    def _send(self, suid):
         """
+        Send all buffered data to the waiting request of a client.
+        """
+        self.sending.discard(suid)
         request = self.requests.get(suid)
-        if request:
-            # we have a request waiting. Return immediately.
-            request.write(jsonify({'msg': string, 'data': data}))
-            request.finish()
+        if request and self.databuffer.get(suid):
             del self.requests[suid]
+            request.write(self._encode(request, self._pop_buffer(suid)))
+            request.finish()
+
+    def _overflow(self, suid):
+        """
+        Called when the buffer of a client that is not fetching its
+        data is full.
+        """
+        if BUFFER_POLICY == "disconnect":
+            logger.log_infomsg("Webclient %s: output buffer full, disconnecting." % suid)
+            sess = self.sessionhandler.session_from_suid(suid)
+            self.client_disconnect(suid)
+            if sess:
+                sess[0].sessionhandler.disconnect(sess[0])
         else:
-            # no waiting request. Store data in buffer
-            dataentries = self.databuffer.get(suid, [])
-            dataentries.append(jsonify({'msg': string, 'data': data}))
-            self.databuffer[suid] = dataentries
+            # drop the oldest messages (but always keep the newest)
+            dataentries = self.databuffer[suid]
+            size = self.buffersize[suid]
+            while size > BUFFER_SIZE and len(dataentries) > 1:
+                size -= len(dataentries.pop(0)['msg'])
+            self.buffersize[suid] = size
+
+    def lineSend(self, suid, string, data=None):
+        """
+        This adds the data to the buffer of the client. If the client
+        has a request waiting, the buffer is sent to it at the end of
+        the current reactor iteration, so all lines sent together
+        arrive in the same response.
+        """
+        self.databuffer.setdefault(suid, []).append({'msg': string, 'data': data})
+        size = self.buffersize.get(suid, 0) + len(string)
+        self.buffersize[suid] = size
+        if suid in self.requests:
+            if suid not in self.sending:
+                self.sending.add(suid)
+                self.clock.callLater(0, self._send, suid)
+        elif BUFFER_SIZE and size > BUFFER_SIZE:
+            self._overflow(suid)
 
     def client_disconnect(self, suid):
         """
         Disconnect session with given suid.
         """
         if suid in self.requests:
-            self.requests[suid].finish()
-            del self.requests[suid]
-        if suid in self.databuffer:
-            del self.databuffer[suid]
+            # a waiting request gets any last data (like the reason)
+            request = self.requests.pop(suid)
+            if self.databuffer.get(suid):
+                request.write(self._encode(request, self._pop_buffer(suid)))
+            request.finish()
+        self.databuffer.pop(suid, None)
+        self.buffersize.pop(suid, None)
 
     def mode_init(self, request):
         """
@@ -120,7 +186,6 @@ class WebClient(resource.Resource):
         if suid == '0':
             # creating a unique id hash string
             suid = md5(str(time.time())).hexdigest()
-            self.databuffer[suid] = []
 
             sess = WebClientSession()
             sess.client = self
@@ -151,15 +216,15 @@ class WebClient(resource.Resource):
         that it is ready to receive data as soon as it is
         available. This is the basis of a long-polling (comet)
         mechanism: the server will wait to reply until data is
-        available.
+        available. The reply is a JSON array of all data buffered
+        for the client, as {'msg':..., 'data':...} objects.
         """
         suid = request.args.get('suid', ['0'])[0]
         if suid == '0':
             return ''
 
-        dataentries = self.databuffer.get(suid, [])
-        if dataentries:
-            return dataentries.pop(0)
+        if self.databuffer.get(suid):
+            return self._encode(request, self._pop_buffer(suid))
         request.notifyFinish().addErrback(self._responseFailed, suid, request)
         if suid in self.requests:
             self.requests[suid].finish()  # Clear any stale request.
@@ -242,11 +307,8 @@ class WebClientSession(session.Session):
             text = utils.to_str(text if text else "", encoding=self.encoding)
             raw = kwargs.get("raw", False)
             nomarkup = kwargs.get("nomarkup", False)
-            if raw:
-                self.client.lineSend(self.suid, text)
-            else:
-                self.client.lineSend(self.suid,
-                                     parse_html(text, strip_ansi=nomarkup))
+            self.client.lineSend(self.suid, OUTPUT_PIPELINE.render(text, "html", raw=raw,
+                                                                   nomarkup=nomarkup))
             return
         except Exception:
             logger.log_trace()
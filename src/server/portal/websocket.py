@@ -31,7 +31,7 @@ from twisted.internet.protocol import Protocol
 from src.server.session import Session
 from src.utils.logger import log_trace
 from src.utils.utils import to_str
-from src.utils.text2html import parse_html
+from src.server.portal.output import OUTPUT_PIPELINE
 
 class WebSocketProtocol(Protocol, Session):
     """
@@ -121,8 +121,5 @@ class WebSocketProtocol(Protocol, Session):
             self.sendLine("OOB" + json.dumps(oobstruct))
         raw = kwargs.get("raw", False)
         nomarkup = kwargs.get("nomarkup", False)
-        if raw:
-            self.sendLine(text)
-        else:
-            self.sendLine(parse_html(text, strip_ansi=nomarkup))
+        self.sendLine(OUTPUT_PIPELINE.render(text, "html", raw=raw, nomarkup=nomarkup))
 
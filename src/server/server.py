@@ -16,7 +16,7 @@ if os.name == 'nt':
                 os.path.dirname(os.path.abspath(__file__)))))
 from twisted.web import server, static
 from twisted.application import internet, service
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, task
 import django
 from django.db import connection
 from django.conf import settings
@@ -27,15 +27,19 @@ from src.server.models import ServerConfig
 from src.server import initial_setup
 
 from src.utils.utils import get_evennia_version, mod_import, make_iter
+from src.utils import logger
 from src.comms import channelhandler
 from src.server.sessionhandler import SESSIONS
 
 # setting up server-side field cache
 
 from django.db.models.signals import post_save
-from src.server.caches import field_pre_save
+from src.server.caches import field_pre_save, field_post_save
+from src.typeclasses.models import Attribute
 #pre_save.connect(field_pre_save, dispatch_uid="fieldcache")
 post_save.connect(field_pre_save, dispatch_uid="fieldcache")
+# only Attributes have _at_<field>_postsave hooks
+post_save.connect(field_post_save, sender=Attribute, dispatch_uid="fieldcache_post")
 
 #from src.server.caches import post_attr_update
 #from django.db.models.signals import m2m_changed
@@ -43,6 +47,7 @@ post_save.connect(field_pre_save, dispatch_uid="fieldcache")
 # connect to attribute cache signal
 #m2m_changed.connect(post_attr_update, sender=TypedObject.db_attributes.through)
 
+_GA = object.__getattribute__
 _SA = object.__setattr__
 
 if os.name == 'nt':
@@ -228,8 +233,15 @@ class Evennia(object):
         self.update_defaults()
 
         #print "run_init_hooks:", ObjectDB.get_all_cached_instances()
-        [(o.typeclass, o.at_init()) for o in ObjectDB.get_all_cached_instances()]
-        [(p.typeclass, p.at_init()) for p in PlayerDB.get_all_cached_instances()]
+        init_mode = settings.TYPECLASS_INIT_MODE
+        if init_mode == "batched":
+            # initialize in the background; Twisted's cooperator
+            # interleaves the iterations with other reactor work.
+            task.cooperate(self._init_hooks_iter(ObjectDB.get_all_cached_instances()
+                                                 + PlayerDB.get_all_cached_instances()))
+        elif init_mode != "lazy":
+            [(o.typeclass, o.at_init()) for o in ObjectDB.get_all_cached_instances()]
+            [(p.typeclass, p.at_init()) for p in PlayerDB.get_all_cached_instances()]
 
         with open(SERVER_RESTART, 'r') as f:
             mode = f.read()
@@ -252,6 +264,18 @@ class Evennia(object):
             # always call this regardless of start type
             SERVER_STARTSTOP_MODULE.at_server_start()
 
+    def _init_hooks_iter(self, entities):
+        """
+        Generator loading the typeclasses of entities (which calls
+        their at_init hook) one by one, skipping those already loaded.
+        """
+        for entity in entities:
+            try:
+                _GA(entity, "_cached_typeclass") or entity.typeclass
+            except Exception:
+                logger.log_trace()
+            yield
+
     def set_restart_mode(self, mode=None):
         """
         This manages the flag file that tells the runner if the server is
@@ -346,6 +370,10 @@ class Evennia(object):
         from src.utils import gametime
         gametime.save()
 
+        # write all pending changes (when using write-behind mode)
+        from src.server.writebehind import WRITEBEHIND
+        WRITEBEHIND.flush()
+
         if SERVER_STARTSTOP_MODULE:
             SERVER_STARTSTOP_MODULE.at_server_stop()
         # if _reactor_stopping is true, reactor does not need to
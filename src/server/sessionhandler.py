@@ -15,6 +15,7 @@ There are two similar but separate stores of sessions:
 import time
 from django.conf import settings
 from src.commands.cmdhandler import CMD_LOGINSTART
+from src.comms.channelhandler import ONLINE_SUBSCRIBERS
 from src.utils.utils import variable_from_module
 try:
     import cPickle as pickle
@@ -23,6 +24,7 @@ except ImportError:
 
 # delayed imports
 _PlayerDB = None
+_ObjectDB = None
 _ServerSession = None
 _ServerConfig = None
 _ScriptDB = None
@@ -49,19 +51,21 @@ IDLE_TIMEOUT = settings.IDLE_TIMEOUT
 
 def delayed_import():
     "Helper method for delayed import of all needed entities"
-    global _ServerSession, _PlayerDB, _ServerConfig, _ScriptDB
+    global _ServerSession, _PlayerDB, _ObjectDB, _ServerConfig, _ScriptDB
     if not _ServerSession:
         # we allow optional arbitrary serversession class for overloading
         modulename, classname = settings.SERVER_SESSION_CLASS.rsplit(".", 1)
         _ServerSession = variable_from_module(modulename, classname)
     if not _PlayerDB:
         from src.players.models import PlayerDB as _PlayerDB
+    if not _ObjectDB:
+        from src.objects.models import ObjectDB as _ObjectDB
     if not _ServerConfig:
         from src.server.models import ServerConfig as _ServerConfig
     if not _ScriptDB:
         from src.scripts.models import ScriptDB as _ScriptDB
     # including once to avoid warnings in Python syntax checkers
-    _ServerSession, _PlayerDB, _ServerConfig, _ScriptDB
+    _ServerSession, _PlayerDB, _ObjectDB, _ServerConfig, _ScriptDB
 
 
 #-----------------------------------------------------------
@@ -204,6 +208,8 @@ class ServerSessionHandler(SessionHandler):
         # validate all scripts
         _ScriptDB.objects.validate()
         self.sessions[sess.sessid] = sess
+        if sess.logged_in and sess.player:
+            ONLINE_SUBSCRIBERS.player_online(sess.player)
         sess.data_in(CMD_LOGINSTART)
 
     def portal_disconnect(self, sessid):
@@ -222,6 +228,8 @@ class ServerSessionHandler(SessionHandler):
         session.at_disconnect()
         session.disconnect()
         del self.sessions[session.sessid]
+        if player and not self.sessions_from_player(player):
+            ONLINE_SUBSCRIBERS.player_offline(player)
 
     def portal_session_sync(self, portalsessions):
         """
@@ -233,7 +241,7 @@ class ServerSessionHandler(SessionHandler):
                       be synced.
         """
         delayed_import()
-        global _ServerSession, _PlayerDB, _ServerConfig, _ScriptDB
+        global _ServerSession, _PlayerDB, _ObjectDB, _ServerConfig, _ScriptDB
 
         for sess in self.sessions.values():
             # we delete the old session to make sure to catch eventual
@@ -247,7 +255,16 @@ class ServerSessionHandler(SessionHandler):
             if sess.uid:
                 sess.player = _PlayerDB.objects.get_player_from_uid(sess.uid)
             self.sessions[sessid] = sess
+        # load the Attributes of all online players and their puppets
+        # in bulk rather than one by one as they are reconnected
+        _PlayerDB.objects.prefetch_attributes(sess.player for sess in self.sessions.values() if sess.player)
+        puids = [sess.puid for sess in self.sessions.values() if sess.puid]
+        if puids:
+            _ObjectDB.objects.prefetch_attributes(_ObjectDB.objects.filter(id__in=puids))
+        for sess in self.sessions.values():
             sess.at_sync()
+        # the online channel subscribers will be re-read from the new sessions
+        ONLINE_SUBSCRIBERS.clear()
 
         # after sync is complete we force-validate all scripts
         # (this also starts them)
@@ -322,6 +339,7 @@ class ServerSessionHandler(SessionHandler):
         session.log(_('Logged in: %s %s (%s)' % (player, session.address, totalstring)))
 
         session.logged_in = True
+        ONLINE_SUBSCRIBERS.player_online(player)
         # sync the portal to the session
         sessdata = session.get_sync_data()
         if not testmode:
@@ -345,9 +363,12 @@ class ServerSessionHandler(SessionHandler):
             remaintext = nsess and "%i session%s remaining" % (nsess, nsess > 1 and "s" or "") or "no more sessions"
             session.log(_('Logged out: %s %s (%s)' % (session.player, session.address, remaintext)))
 
+        player = session.logged_in and session.player
         session.at_disconnect()
         sessid = session.sessid
         del self.sessions[sessid]
+        if player and not self.sessions_from_player(player):
+            ONLINE_SUBSCRIBERS.player_offline(player)
         # inform portal that session should be closed.
         self.server.amp_protocol.call_remote_PortalAdmin(sessid,
                                                          operation=SDISCONN,
@@ -441,8 +462,7 @@ class ServerSessionHandler(SessionHandler):
         """
         Send message to all connected sessions
         """
-        for sess in self.sessions.values():
-            self.data_out(sess, message)
+        self.data_out_multi(self.sessions.values(), message)
 
     def data_out(self, session, text="", **kwargs):
         """
@@ -452,6 +472,25 @@ class ServerSessionHandler(SessionHandler):
                                                               msg=text,
                                                               data=kwargs)
 
+    def data_out_multi(self, sessions, text="", **kwargs):
+        """
+        Sending the same data Server -> Portal for many sessions.
+
+        The message is sent to the Portal only once, together with
+        the sessids to relay it to. The Portal then renders it for
+        each distinct protocol/flag variant among the receiving
+        sessions. None-sessions and duplicates are ignored.
+        """
+        sessids, seen = [], set()
+        for session in sessions:
+            if session and session.sessid not in seen:
+                seen.add(session.sessid)
+                sessids.append(session.sessid)
+        if sessids:
+            self.server.amp_protocol.call_remote_MsgServer2PortalMulti(sessids,
+                                                                       msg=text,
+                                                                       data=kwargs)
+
     def data_in(self, sessid, text="", **kwargs):
         """
         Data Portal -> Server
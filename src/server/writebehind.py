@@ -0,0 +1,187 @@
+"""
+Write-behind persistence
+
+Normally every change to a database entity - assigning an Attribute
+value, updating a mutable Attribute in-place or setting one of the
+wrapped db_* fields - is written to the database right away, one SQL
+UPDATE per change. With settings.WRITE_BEHIND active, saves of
+entities that already exist in the database are instead only noted
+here. Repeated saves of the same entity are coalesced and all pending
+changes are written together, in one transaction, after
+settings.WRITE_BEHIND_INTERVAL seconds (0 means at the next reactor
+tick). They are also written whenever more than
+settings.WRITE_BEHIND_MAX_PENDING entities are waiting, when an
+entity is flushed from the idmapper cache and when the server shuts
+down or reloads.
+
+The changes are written with the normal save() method, so the save
+signals (and the hooks relying on them) are sent when the change is
+actually written, not when save() was first called. New entities
+(which need their database id) and saves from other threads or
+processes are always written directly.
+
+If writing the batch fails, the entities are saved one by one so a
+single bad row cannot hold up the others. Entities that still fail
+(such as when the database connection was lost) are put back among
+the pending changes and retried every WriteBehind.retry_interval
+seconds; they are never silently dropped. Only changes to entities
+deleted in the meantime are discarded.
+
+Note the trade-offs of this mode:
+
+- Changes not yet written when the server crashes or is killed are
+  lost. This is at most WRITE_BEHIND_INTERVAL seconds worth, or more
+  while writes are failing and being retried.
+- Database queries (such as searches) don't see the pending changes
+  until they are written. Call WRITEBEHIND.flush() before a query if
+  it must see them.
+
+This mode needs Django 1.6 or later (for transaction.atomic).
+"""
+
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
+from django.db.models.signals import pre_delete
+from twisted.internet import reactor
+from src.utils import logger
+
+__all__ = ("WRITEBEHIND", "WriteBehind")
+
+_GA = object.__getattribute__
+
+
+class WriteBehind(object):
+    """
+    Collects pending saves and writes them in batches.
+    """
+    # seconds to wait before retrying writes that failed
+    retry_interval = 5
+
+    def __init__(self):
+        if settings.WRITE_BEHIND and django.VERSION < (1, 6):
+            raise ImproperlyConfigured("settings.WRITE_BEHIND requires Django 1.6 or later.")
+        self.active = settings.WRITE_BEHIND
+        self.interval = settings.WRITE_BEHIND_INTERVAL
+        self.max_pending = settings.WRITE_BEHIND_MAX_PENDING
+        # (model class, pk) -> (instance, set of fieldnames or None for all)
+        self.pending = {}
+        self._call = None
+        # set while writing, so the saves are not deferred again
+        self.writing = False
+
+    def defer(self, instance, update_fields=None):
+        """
+        Handle a save of instance (with the given update_fields) by
+        noting it as pending. Returns False if the save cannot be
+        deferred and should be done directly.
+        """
+        if self.writing:
+            return False
+        pk = _GA(instance, "_get_pk_val")()
+        if pk is None or _GA(instance, "_state").adding:
+            # this must be created in the database right away
+            return False
+        if update_fields is not None:
+            update_fields = frozenset(update_fields)
+            if not update_fields:
+                return True
+        self._add(instance, update_fields)
+        if len(self.pending) > self.max_pending:
+            self.flush()
+        elif not self._call:
+            self._call = reactor.callLater(self.interval, self.flush)
+        return True
+
+    def _add(self, instance, fields):
+        "Note fields (None for all) of instance as changed"
+        key = (instance.__class__, _GA(instance, "_get_pk_val")())
+        if key in self.pending:
+            oldfields = self.pending[key][1]
+            if oldfields is None or fields is None:
+                fields = None
+            else:
+                fields = oldfields.union(fields)
+        elif fields is not None:
+            fields = set(fields)
+        self.pending[key] = (instance, fields)
+
+    def discard(self, instance):
+        "Forget pending changes of instance (used when it is deleted)"
+        self.pending.pop((instance.__class__, _GA(instance, "_get_pk_val")()), None)
+
+    def flush_instance(self, instance):
+        "Write the pending changes of a single instance, if any"
+        entry = self.pending.pop((instance.__class__, _GA(instance, "_get_pk_val")()), None)
+        if entry:
+            self._write([entry])
+
+    def flush(self):
+        """
+        Write all pending changes in one transaction.
+        """
+        if self._call:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+        if self.pending:
+            entries, self.pending = self.pending.values(), {}
+            self._write(entries)
+
+    def _save(self, instance, fields):
+        "Write the fields (None for all) of an instance"
+        instance.save(update_fields=fields, force_update=True,
+                      using=router.db_for_write(instance.__class__, instance=instance))
+
+    def _write(self, entries):
+        """
+        Write (instance, fields) entries to the database. Entries
+        failing to be written are put back as pending, to be retried.
+        """
+        self.writing = True
+        try:
+            try:
+                with transaction.atomic():
+                    for instance, fields in entries:
+                        self._save(instance, fields)
+                return
+            except Exception, err:
+                if len(entries) == 1:
+                    failed = [(entries[0][0], entries[0][1], err)]
+                else:
+                    # find the culprit(s) by saving the entities one by one
+                    failed = []
+                    for instance, fields in entries:
+                        try:
+                            with transaction.atomic():
+                                self._save(instance, fields)
+                        except Exception, err:
+                            failed.append((instance, fields, err))
+            for instance, fields, err in failed:
+                name = "%s(#%s)" % (instance.__class__.__name__, instance.pk)
+                try:
+                    deleted = not instance.__class__.objects.filter(pk=instance.pk).exists()
+                except Exception:
+                    deleted = False
+                if deleted:
+                    logger.log_errmsg("WriteBehind: %s could not be saved; it was deleted." % name)
+                    continue
+                logger.log_errmsg("WriteBehind: failed to save %s (%s: %s); retrying in %s seconds."
+                                  % (name, err.__class__.__name__, err, self.retry_interval))
+                # don't overwrite changes made since
+                self._add(instance, fields)
+        finally:
+            self.writing = False
+        if self.pending and not self._call:
+            self._call = reactor.callLater(self.retry_interval, self.flush)
+
+
+def _discard_deleted(sender, instance=None, **kwargs):
+    "Called by the pre_delete signal"
+    if WRITEBEHIND.pending:
+        WRITEBEHIND.discard(instance)
+
+
+WRITEBEHIND = WriteBehind()
+pre_delete.connect(_discard_deleted, dispatch_uid="writebehind_discard")
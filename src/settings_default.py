@@ -34,6 +34,10 @@ TELNET_INTERFACES = ['0.0.0.0']
 # server-side (see OOB_FUNC_MODULE). TELNET_ENABLED is required for this
 # to work.
 TELNET_OOB_ENABLED = False
+# The zlib compression level (1-9) used for telnet clients supporting
+# MCCP (data compression). Higher levels cost more CPU in the Portal
+# for only slightly smaller output.
+MCCP_COMPRESSION_LEVEL = 6
 # Start the evennia django+twisted webserver so you can
 # browse the evennia website and the admin interface
 # (Obs - further web configuration can be found below
@@ -61,6 +65,16 @@ WEBSERVER_THREADPOOL_LIMITS = (1, 20)
 # Start the evennia ajax client on /webclient
 # (the webserver must also be running)
 WEBCLIENT_ENABLED = True
+# Max total length (in bytes) of the output buffered for a webclient
+# that is not fetching it (like a stalled browser tab). 0 means no
+# limit.
+WEBCLIENT_BUFFER_SIZE = 512 * 1024
+# What to do when a webclient's buffer is full: "drop" the oldest
+# messages or "disconnect" the session.
+WEBCLIENT_BUFFER_POLICY = "drop"
+# Webclient responses at least this long (in bytes) are gzip-compressed
+# if the browser supports it. 0 turns compression off.
+WEBCLIENT_GZIP_MINSIZE = 1024
 # Activate SSH protocol (SecureShell)
 SSH_ENABLED = False
 # Ports to use for SSH
@@ -137,6 +151,21 @@ GAME_CACHE_TYPE = "local"
 # cache and resets it if it's too big. This variable sets the maximum
 # size (in MB).
 ATTRIBUTE_CACHE_MAXSIZE = 100
+# The cmdhandler caches the result of merging the cmdsets available to
+# a caller, so the same merge does not have to be redone for every
+# command. This is the maximum number of merged cmdsets kept in that
+# cache; the least recently used merge is dropped when it is full.
+CMDSET_MERGE_CACHE_SIZE = 1000
+# Command profiling records the time spent in each phase of every command
+# (cmdset merging, parsing, lock checks and the command hooks) along with
+# the number of database queries issued, per command key. It adds some
+# overhead so is off by default; it can also be turned on/off from inside
+# the game with the @cmdprofile command. Statistics are kept for the last
+# COMMAND_PROFILING_WINDOW calls of every command and are written to
+# COMMAND_PROFILING_FILE when dumped.
+COMMAND_PROFILING = False
+COMMAND_PROFILING_WINDOW = 1000
+COMMAND_PROFILING_FILE = os.path.join(LOG_DIR, 'cmdprofile.json')
 
 ######################################################################
 # Evennia Database config
@@ -284,8 +313,39 @@ START_LOCATION = "#2"
 # if you are accessing the database from multiple processes (such as
 # from a website -not- running Evennia's own webserver) data may go
 # out of sync between the processes. Keep on unless you face such
-# issues.
+# issues. Decoded Attribute values made of basic types, dates, database
+# objects and lists/tuples/dicts/sets of them are always cached (and
+# shared by all readers); other values, like class instances, are
+# decoded anew on every access, so in-place changes to them are only
+# kept if the Attribute is assigned again.
 TYPECLASS_AGGRESSIVE_CACHE = True
+# When the server starts or reloads, the at_init() hook is called on
+# all objects and players already loaded into memory ("immediate").
+# Since at_init() is also always called when a typeclass is loaded,
+# this can instead be left to happen when each entity is first used
+# ("lazy"), or be done in small batches in the background while the
+# server is already running ("batched"). With many entities the
+# latter two make a server start or reload a lot faster.
+TYPECLASS_INIT_MODE = "immediate"
+# Write-behind mode. Normally every change to an Attribute or to a
+# database field of an object is written to the database at once.
+# With WRITE_BEHIND on, changes to already existing database entities
+# are instead collected in memory and written together in a single
+# transaction every WRITE_BEHIND_INTERVAL seconds (0 means as soon as
+# the server is idle), or as soon as more than
+# WRITE_BEHIND_MAX_PENDING entities have changes waiting. This saves a
+# lot of database writes in code changing the same data often. The
+# drawbacks: if the server crashes or is killed, any changes not yet
+# written (at most WRITE_BEHIND_INTERVAL seconds worth) are lost, and
+# database searches will not see changes until they are written. A
+# normal shutdown or reload always writes everything first. Changes
+# failing to be written (like if the database connection is lost) are
+# kept and retried every few seconds, so while that goes on, a crash
+# loses more than WRITE_BEHIND_INTERVAL seconds worth. Save signals
+# are sent when the change is written. Requires Django 1.6 or later.
+WRITE_BEHIND = False
+WRITE_BEHIND_INTERVAL = 0
+WRITE_BEHIND_MAX_PENDING = 1000
 
 ######################################################################
 # Batch processors
@@ -314,6 +374,19 @@ TIME_HOUR_PER_DAY = 24
 TIME_DAY_PER_WEEK = 7
 TIME_WEEK_PER_MONTH = 4
 TIME_MONTH_PER_YEAR = 12
+# The TickerHandler normally calls the at_tick() hooks of all objects
+# subscribing to the same interval at the same time, which can stall
+# the server for a noticeable time with many subscribers. With
+# TICKER_PHASES > 1, every interval is split into this many steps and
+# each subscriber is assigned to one of them (based on a hash of the
+# subscriber), spreading the work evenly over the interval. Every
+# subscriber is still ticked once per interval.
+TICKER_PHASES = 1
+# If set, a tick taking more than this many seconds handles the rest
+# of its subscribers in chunks of (at most) this many seconds,
+# letting the server handle other things (like player input) in
+# between. 0 means the ticks are never split up.
+TICKER_TIME_BUDGET = 0
 
 ######################################################################
 # Default Player setup and access
@@ -364,6 +437,13 @@ CHANNEL_MUDINFO = ("MUDinfo", '', 'Informative messages',
 # Channel showing when new people connecting
 CHANNEL_CONNECTINFO = ("MUDconnections", '', 'Connection log',
                     "control:perm(Immortals);listen:perm(Wizards);send:false()")
+# Channel messages are normally only relayed to subscribers who are
+# online, found through an in-memory index. Set this to True to
+# have msg() called also on offline subscribers (unless the message is
+# explicitly sent with online=True). This is only useful if your
+# Players' msg() does something with messages while they are offline,
+# and it means loading every subscriber of a channel for each message.
+CHANNEL_MSG_OFFLINE_PLAYERS = False
 
 ######################################################################
 # External Channel connections
@@ -1,9 +1,56 @@
 import unittest
+from src.commands.command import Command
+from src.commands.cmdset import CmdSet
+from src.commands.cmdparser import cmdparser
+
+class _Caller(object):
+    pass
+
+class _CmdLook(Command):
+    key = "look"
+    aliases = ["l", "ls"]
+
+class _CmdLookAt(Command):
+    key = "look at"
+
+class _CmdLock(Command):
+    key = "lock"
+
+class _CmdSet(CmdSet):
+    def at_cmdset_creation(self):
+        self.add(_CmdLook())
+        self.add(_CmdLookAt())
+        self.add(_CmdLock())
 
 class TestCmdparser(unittest.TestCase):
+    def setUp(self):
+        self.caller = _Caller()
+        self.cmdset = _CmdSet()
+
     def test_cmdparser(self):
-        # self.assertEqual(expected, cmdparser(raw_string, cmdset, caller, match_index))
-        assert True # TODO: implement your test here
+        self.assertEqual(None, cmdparser("", self.cmdset, self.caller))
+        self.assertEqual([], cmdparser("jump", self.cmdset, self.caller))
+        matches = cmdparser("look here", self.cmdset, self.caller)
+        self.assertEqual(1, len(matches))
+        self.assertEqual(("look", " here"), matches[0][:2])
+        matches = cmdparser("look at me", self.cmdset, self.caller)
+        self.assertEqual(1, len(matches))
+        self.assertEqual(("look at", " me"), matches[0][:2])
+        matches = cmdparser("LOCK door", self.cmdset, self.caller)
+        self.assertEqual(("lock", " door"), matches[0][:2])
+        # "ls" beats "l" on match count
+        matches = cmdparser("ls", self.cmdset, self.caller)
+        self.assertEqual(("ls", ""), matches[0][:2])
+
+    def test_cmdname_index(self):
+        index, maxlen = self.cmdset.get_cmdname_index()
+        self.assertEqual(len("look at"), maxlen)
+        self.assertTrue("l" in index and "ls" in index and "lock" in index)
+        self.assertTrue(self.cmdset.get_cmdname_index() is self.cmdset.get_cmdname_index())
+        self.cmdset.remove("lock")
+        self.assertFalse("lock" in self.cmdset.get_cmdname_index()[0])
+        matches = cmdparser("lock door", self.cmdset, self.caller)
+        self.assertEqual(("l", "ock door"), matches[0][:2])
 
 class TestAtSearchResult(unittest.TestCase):
     def test_at_search_result(self):
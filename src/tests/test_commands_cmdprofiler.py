@@ -0,0 +1,50 @@
+import unittest
+from src.commands.cmdprofiler import RollingHistogram, CommandProfiler
+
+class TestRollingHistogram(unittest.TestCase):
+    def test_stats(self):
+        hist = RollingHistogram(size=10)
+        for value in range(20):
+            hist.add(value)
+        stats = hist.stats()
+        # only the last 10 samples are kept
+        self.assertEqual(20, stats["count"])
+        self.assertEqual(10, stats["window"])
+        self.assertEqual(10, stats["min"])
+        self.assertEqual(19, stats["max"])
+        self.assertEqual(14.5, stats["mean"])
+        self.assertEqual(19, stats["p99"])
+
+    def test_histogram(self):
+        hist = RollingHistogram()
+        for value in (0.5, 0.7, 3, 2000):
+            hist.add(value)
+        histogram = dict(hist.histogram(edges=(1, 5)))
+        self.assertEqual({1: 2, 5: 1, None: 1}, histogram)
+
+class TestCommandProfiler(unittest.TestCase):
+    def test_finish(self):
+        profiler = CommandProfiler()
+        self.assertEqual(None, profiler.start())
+        profiler.enable(window=5)
+        timing = profiler.start()
+        timing.mark("cmdsets")
+        # add_phase only adds to the timing set as current
+        self.assertEqual(None, profiler.current)
+        profiler.add_phase("lockcheck", 0.001)
+        profiler.current = timing
+        profiler.add_phase("lockcheck", 0.002)
+        profiler.current = None
+        timing.mark("func")
+        profiler.finish(timing, "look")
+        profiler.disable()
+        stats = profiler.stats("look")
+        self.assertEqual(set(("cmdsets", "lockcheck", "func", "total")), set(stats["phases"]))
+        self.assertEqual(2.0, stats["phases"]["lockcheck"]["max"])
+        self.assertEqual(1, stats["queries"]["count"])
+        self.assertEqual(None, profiler.stats("get"))
+        profiler.reset()
+        self.assertEqual({}, profiler.stats())
+
+if __name__ == '__main__':
+    unittest.main()
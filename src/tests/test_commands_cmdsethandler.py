@@ -1,4 +1,44 @@
 import unittest
+from src.commands.cmdset import CmdSet
+from src.commands.cmdsethandler import CmdSetMergeCache
+
+class TestCmdSetMergeCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = CmdSetMergeCache(maxsize=2)
+        self.set1, self.set2, self.set3 = CmdSet(), CmdSet(), CmdSet()
+
+    def test_get_set(self):
+        key = self.cache.get_key([self.set1, self.set2])
+        self.assertEqual(None, self.cache.get(key))
+        merged = self.set2 + self.set1
+        self.cache.set(key, merged)
+        self.assertTrue(self.cache.get(key) is merged)
+        self.assertEqual(1, self.cache.stats()["hits"])
+        self.assertEqual(1, self.cache.stats()["misses"])
+        # changing a set changes its key
+        self.set1.add(CmdSet())
+        self.assertNotEqual(key, self.cache.get_key([self.set1, self.set2]))
+
+    def test_eviction(self):
+        key1 = self.cache.get_key([self.set1])
+        key2 = self.cache.get_key([self.set2])
+        key3 = self.cache.get_key([self.set3])
+        self.cache.set(key1, self.set1)
+        self.cache.set(key2, self.set2)
+        self.cache.get(key1)
+        self.cache.set(key3, self.set3)
+        # key2 was least recently used
+        self.assertEqual(None, self.cache.get(key2))
+        self.assertTrue(self.cache.get(key1) is self.set1)
+        self.assertEqual(1, self.cache.stats()["evictions"])
+
+    def test_invalidate(self):
+        key = self.cache.get_key([self.set1, self.set2])
+        self.cache.set(key, self.set3)
+        self.cache.invalidate(self.set2)
+        self.assertEqual(None, self.cache.get(key))
+        self.assertEqual(1, self.cache.stats()["invalidations"])
+        self.assertEqual(0, self.cache.stats()["size"])
 
 class TestImportCmdset(unittest.TestCase):
     def test_import_cmdset(self):
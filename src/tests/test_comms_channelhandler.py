@@ -1,4 +1,6 @@
 import unittest
+from src.comms.channelhandler import OnlineSubscribers
+from src.utils import create
 
 class TestChannelCommand(unittest.TestCase):
     def test_func(self):
@@ -41,5 +43,27 @@ class TestChannelHandler(unittest.TestCase):
         # self.assertEqual(expected, channel_handler.update())
         assert True # TODO: implement your test here
 
+class TestOnlineSubscribers(unittest.TestCase):
+    def test_get(self):
+        channel1 = create.create_channel("onlinechan1", locks="listen:all()")
+        channel2 = create.create_channel("onlinechan2", locks="listen:all()")
+        player1 = create.create_player("OnlinePlayer1", "test@test.com", "testpassword")
+        player2 = create.create_player("OnlinePlayer2", "test@test.com", "testpassword")
+        channel1.connect(player1)
+        channel1.connect(player2)
+        index = OnlineSubscribers()
+        index.built = True  # don't read the sessions
+        self.assertEqual([], index.get(channel1))
+        index.player_online(player1)
+        self.assertEqual([player1.dbobj], index.get(channel1))
+        # subscriptions of online players are followed
+        index.subscribe(channel2, player1)
+        index.subscribe(channel2, player2)
+        self.assertEqual([player1.dbobj], index.get(channel2))
+        index.unsubscribe(channel1, player1)
+        self.assertEqual([], index.get(channel1))
+        index.player_offline(player1)
+        self.assertEqual([], index.get(channel2))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from src.locks import lockhandler
 
 class TestLockHandler(unittest.TestCase):
     def test___init__(self):
@@ -21,14 +22,41 @@ class TestLockHandler(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_check(self):
-        # lock_handler = LockHandler(obj)
-        # self.assertEqual(expected, lock_handler.check(accessing_obj, access_type, default, no_superuser_bypass))
-        assert True # TODO: implement your test here
+        calls = []
+        def func(value):
+            def lockfunc(accessing_obj, accessed_obj, *args, **kwargs):
+                calls.append(value)
+                return value
+            return (lockfunc, (), {})
+        def check(evalstring, *values):
+            del calls[:]
+            return lockhandler._compile_lock(evalstring, [func(val) for val in values])(None, None)
+        # same precedence as python: not > and > or
+        for evalstring in ("%s or %s and %s", "not %s and %s or %s",
+                           "%s and not %s or not %s and %s"):
+            for values in ((True, False, True, False), (False, True, True, True),
+                           (False, False, False, False), (True, True, False, True)):
+                values = values[:evalstring.count("%s")]
+                expected = eval(evalstring % values)
+                self.assertEqual(expected, check(evalstring, *values))
+        # results are booleans and evaluation short-circuits
+        self.assertEqual(True, check("%s or %s", 1, 0))
+        self.assertEqual([1], calls)
+        self.assertEqual(False, check("%s and %s", None, 1))
+        self.assertEqual([None], calls)
+        for evalstring in ("", "%s and", "or %s", "%s not %s", "%s %s", "not"):
+            self.assertRaises(ValueError, check, evalstring, True, True)
 
     def test_check_lockstring(self):
-        # lock_handler = LockHandler(obj)
-        # self.assertEqual(expected, lock_handler.check_lockstring(accessing_obj, lockstring, no_superuser_bypass))
-        assert True # TODO: implement your test here
+        if not lockhandler._LOCKFUNCS:
+            lockhandler._cache_lockfuncs()
+        handler = lockhandler.LockHandler.__new__(lockhandler.LockHandler)
+        locks = handler._parse_lockstring("get:not false() and true()")
+        self.assertTrue(locks["get"][0](None, None))
+        # parsed lockstrings are cached, but handlers get their own copy
+        self.assertTrue("get:not false() and true()" in lockhandler._PARSED_LOCKSTRINGS)
+        del locks["get"]
+        self.assertTrue("get" in handler._parse_lockstring("get:not false() and true()"))
 
     def test_clear(self):
         # lock_handler = LockHandler(obj)
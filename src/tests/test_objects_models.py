@@ -1,4 +1,7 @@
 import unittest
+from django.conf import settings
+from src.objects.models import ObjectDB
+from src.utils import create
 
 class TestObjectDB(unittest.TestCase):
     def test___init__(self):
@@ -16,9 +19,22 @@ class TestObjectDB(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_contents_get(self):
-        # object_d_b = ObjectDB(*args, **kwargs)
-        # self.assertEqual(expected, object_d_b.contents_get(exclude))
-        assert True # TODO: implement your test here
+        room1 = create.create_object(settings.BASE_ROOM_TYPECLASS, key="room1", nohome=True)
+        room2 = create.create_object(settings.BASE_ROOM_TYPECLASS, key="room2", nohome=True)
+        obj1 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="obj1", location=room1, home=room1)
+        obj2 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="obj2", location=room1, home=room1)
+        self.assertEqual(set([obj1, obj2]), set(room1.contents))
+        self.assertEqual([obj2], room1.contents_get(exclude=obj1))
+        # the cache follows moves without asking the database
+        obj1.move_to(room2, quiet=True)
+        self.assertEqual([obj2], room1.contents)
+        self.assertEqual([obj1], room2.contents)
+        self.assertEqual(list(ObjectDB.objects.get_contents(room2.dbobj)), room2.contents)
+        obj2.delete()
+        self.assertEqual([], room1.contents)
+        # the cache rebuilds if an object is flushed from the idmapper
+        ObjectDB.flush_cached_instance(obj1.dbobj)
+        self.assertEqual(["obj1"], [obj.key for obj in room2.contents])
 
     def test_copy(self):
         # object_d_b = ObjectDB(*args, **kwargs)
@@ -46,9 +62,29 @@ class TestObjectDB(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_msg_contents(self):
-        # object_d_b = ObjectDB(*args, **kwargs)
-        # self.assertEqual(expected, object_d_b.msg_contents(message, exclude, from_obj, **kwargs))
-        assert True # TODO: implement your test here
+        from src.server.sessionhandler import SESSIONS
+        room = create.create_object(settings.BASE_ROOM_TYPECLASS, key="msgroom", nohome=True)
+        obj1 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="msgobj1", location=room, home=room)
+        obj2 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="msgobj2", location=room, home=room)
+        obj3 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="msgobj3", location=room, home=room)
+        obj1.sessid, obj2.sessid, obj3.sessid = 9001, 9002, 9003
+        sent = []
+        old_data_out_multi = SESSIONS.__dict__.get("data_out_multi")
+        SESSIONS.data_out_multi = lambda sessions, text="", **kwargs: sent.append((list(sessions), text, kwargs))
+        SESSIONS.sessions.update({9001: "sess1", 9002: "sess2", 9003: "sess3"})
+        try:
+            room.msg_contents("Hello", exclude=obj3, ansi=False)
+        finally:
+            for sessid in (9001, 9002, 9003):
+                del SESSIONS.sessions[sessid]
+            if old_data_out_multi:
+                SESSIONS.data_out_multi = old_data_out_multi
+            else:
+                del SESSIONS.data_out_multi
+        # one multicast to the sessions of all non-excluded objects
+        self.assertEqual(1, len(sent))
+        self.assertEqual((set(["sess1", "sess2"]), "Hello", {"ansi": False}),
+                         (set(sent[0][0]), sent[0][1], sent[0][2]))
 
     def test_search(self):
         # object_d_b = ObjectDB(*args, **kwargs)
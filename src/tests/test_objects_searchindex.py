@@ -0,0 +1,59 @@
+import unittest
+from django.conf import settings
+from src.objects.models import ObjectDB
+from src.objects.searchindex import SEARCH_INDEX
+from src.utils import create
+
+class TestObjectSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.room = create.create_object(settings.BASE_ROOM_TYPECLASS, key="IndexRoom", nohome=True)
+        self.room2 = create.create_object(settings.BASE_ROOM_TYPECLASS, key="IndexRoom2", nohome=True)
+        self.sword = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="Big shiny sword",
+                                          location=self.room, home=self.room, aliases=["blade"])
+        self.shield = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="Big shield",
+                                           location=self.room, home=self.room)
+        self.candidates = [self.sword.dbobj, self.shield.dbobj, self.room.dbobj]
+
+    def _search(self, ostring, exact=True):
+        return SEARCH_INDEX.search(ostring, self.candidates, exact=exact)
+
+    def test_search(self):
+        self.assertEqual([self.sword], self._search("big SHINY sword"))
+        self.assertEqual([self.sword], self._search("Blade"))
+        self.assertEqual([], self._search("big"))
+        self.assertEqual([self.room], self._search("indexroom"))
+        # partial matching
+        self.assertEqual([self.sword], self._search("bi sh sw", exact=False))
+        self.assertEqual([self.shield, self.sword], self._search("big", exact=False))
+        self.assertEqual([], self._search("sword big", exact=False))
+        self.assertEqual([self.sword], self._search("bla", exact=False))
+        # only among candidates
+        self.assertEqual([], SEARCH_INDEX.search("big shield", [self.sword.dbobj]))
+
+    def test_update(self):
+        self._search("big shield")
+        self.shield.key = "Small shield"
+        self.assertEqual([], self._search("big shield"))
+        self.assertEqual([self.shield], self._search("small shield"))
+        self.sword.aliases.add("weapon")
+        self.sword.aliases.remove("blade")
+        self.assertEqual([self.sword], self._search("weapon"))
+        self.assertEqual([], self._search("blade"))
+        self.shield.location = self.room2
+        self.assertEqual(self.room2.id, SEARCH_INDEX.entries[self.shield.id][0])
+        self.assertEqual([self.shield], self._search("small shield"))
+        shield_id = self.shield.id
+        self.shield.delete()
+        self.assertFalse(shield_id in SEARCH_INDEX.entries)
+
+    def test_object_search(self):
+        char = create.create_object(settings.BASE_CHARACTER_TYPECLASS, key="Searcher",
+                                    location=self.room, home=self.room)
+        self.assertEqual([self.sword], ObjectDB.objects.object_search("blade", candidates=self.room.contents))
+        self.assertEqual([self.sword], ObjectDB.objects.object_search("shiny", candidates=self.room.contents,
+                                                                      exact=False))
+        self.assertEqual(self.shield, char.search("big shield"))
+        self.assertEqual(self.sword, char.search("2-big"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from twisted.internet.task import Clock
+from src.scripts.scheduler import Scheduler
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = Scheduler(clock=self.clock)
+        self.fired = []
+
+    def _fire(self, name):
+        self.fired.append((name, self.clock.seconds()))
+
+    def test_callLater(self):
+        self.scheduler.callLater(2, self._fire, "b")
+        self.scheduler.callLater(1, self._fire, "a")
+        self.scheduler.callLater(2.005, self._fire, "c")
+        # only one call in the underlying clock
+        self.assertEqual(1, len(self.clock.getDelayedCalls()))
+        self.assertEqual(3, len(self.scheduler))
+        self.clock.advance(1)
+        self.assertEqual([("a", 1)], self.fired)
+        # calls in the same slot are run together
+        self.clock.advance(1)
+        self.assertEqual([("a", 1), ("b", 2), ("c", 2)], self.fired)
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_cancel_and_reset(self):
+        call1 = self.scheduler.callLater(1, self._fire, "a")
+        call2 = self.scheduler.callLater(2, self._fire, "b")
+        call1.cancel()
+        self.assertFalse(call1.active())
+        call2.reset(5)
+        self.assertEqual(5, call2.getTime())
+        self.clock.advance(3)
+        self.assertEqual([], self.fired)
+        call2.delay(1)
+        self.clock.advance(2)
+        self.assertEqual([], self.fired)
+        self.clock.advance(1)
+        self.assertEqual([("b", 6)], self.fired)
+        self.assertFalse(call2.active())
+
+    def test_cancel_in_slot(self):
+        # a call cancelled or rescheduled by another due in the same
+        # slot is not run
+        call_b = self.scheduler.callLater(1, self._fire, "b")
+        call_c = self.scheduler.callLater(1.005, self._fire, "c")
+        def _cancel():
+            self._fire("a")
+            call_b.cancel()
+            call_c.reset(1)
+            self.scheduler.callLater(0, self._fire, "d")
+        self.scheduler.callLater(0.995, _cancel)
+        self.clock.advance(1)
+        # (calls added while running are run by a new clock call,
+        # which task.Clock also runs in this advance)
+        self.assertEqual([("a", 1), ("d", 1)], self.fired)
+        self.assertFalse(call_b.active())
+        self.clock.advance(1)
+        self.assertEqual([("a", 1), ("d", 1), ("c", 2)], self.fired)
+
+    def test_errors(self):
+        def _fail():
+            raise RuntimeError("test")
+        self.scheduler.callLater(1, _fail)
+        self.scheduler.callLater(1, self._fire, "a")
+        self.clock.advance(1)
+        self.assertEqual([("a", 1)], self.fired)
+
+if __name__ == '__main__':
+    unittest.main()
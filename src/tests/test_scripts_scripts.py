@@ -1,4 +1,7 @@
 import unittest
+from twisted.internet.task import Clock
+from src.scripts.scheduler import Scheduler
+from src.scripts.scripts import ExtendedLoopingCall
 
 class TestExtendedLoopingCall(unittest.TestCase):
     def test___call__(self):
@@ -17,9 +20,17 @@ class TestExtendedLoopingCall(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_start(self):
-        # extended_looping_call = ExtendedLoopingCall()
-        # self.assertEqual(expected, extended_looping_call.start(interval, now, start_delay, count_start))
-        assert True # TODO: implement your test here
+        clock = Clock()
+        calls = []
+        task = ExtendedLoopingCall(lambda: calls.append(clock.seconds()))
+        task.clock = Scheduler(clock=clock)
+        task.start(5, now=False, start_delay=2)
+        self.assertEqual(2, task.next_call_time())
+        clock.pump([1, 1, 5, 5])
+        self.assertEqual([2, 7, 12], calls)
+        self.assertEqual(3, task.callcount)
+        task.stop()
+        self.assertEqual([], clock.getDelayedCalls())
 
 class TestScriptBase(unittest.TestCase):
     def test___eq__(self):
@@ -1,24 +1,97 @@
 import unittest
+from itertools import count
+from twisted.internet.defer import succeed
+from twisted.internet.task import Clock
+from src.scripts.scheduler import Scheduler
+from src.scripts import tickerhandler
+from src.scripts.tickerhandler import Ticker
+
+class _Subscriber(object):
+    def __init__(self, ticks, fail=False):
+        self.ticks = ticks
+        self.fail = fail
+
+    def at_tick(self, *args, **kwargs):
+        if self.fail:
+            raise RuntimeError("tick failed")
+        self.ticks.append((self, args))
 
 class TestTicker(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.ticks = []
+
+    def _ticker(self, interval, phases=1, time_budget=0):
+        ticker = type("TestTicker", (Ticker,), {"phases": phases, "time_budget": time_budget})(interval)
+        ticker.task.clock = Scheduler(clock=self.clock)
+        return ticker
+
     def test___init__(self):
-        # ticker = Ticker(interval)
-        assert True # TODO: implement your test here
+        ticker = self._ticker(10)
+        self.assertEqual(1, ticker.nphases)
+        self.assertFalse(ticker.task.running)
 
     def test_add(self):
-        # ticker = Ticker(interval)
-        # self.assertEqual(expected, ticker.add(store_key, obj, *args, **kwargs))
-        assert True # TODO: implement your test here
+        ticker = self._ticker(10)
+        sub1, sub2 = _Subscriber(self.ticks), _Subscriber(self.ticks)
+        ticker.add("key1", sub1, 1)
+        ticker.add("key2", sub2)
+        ticker.add("key3", _Subscriber(self.ticks, fail=True))
+        self.assertTrue(ticker.task.running)
+        self.clock.advance(10)
+        self.assertEqual(set([(sub1, (1,)), (sub2, ())]), set(self.ticks))
+        self.assertEqual(1, ticker.stats["ticks"])
+        ticker.stop()
+
+    def test_phases(self):
+        ticker = self._ticker(10, phases=5)
+        subs = [_Subscriber(self.ticks) for i in range(50)]
+        for i, sub in enumerate(subs):
+            ticker.add("key%i" % i, sub)
+        # the subscribers are spread over the phases
+        self.assertEqual(50, sum(len(phase) for phase in ticker._phases))
+        self.assertTrue(all(len(phase) < 50 for phase in ticker._phases))
+        self.clock.advance(2)
+        self.assertEqual(len(ticker._phases[0]), len(self.ticks))
+        self.clock.pump([2, 2, 2, 2])
+        # every subscriber ticked once per interval
+        self.assertEqual(sorted(subs), sorted(sub for sub, args in self.ticks))
+        self.assertEqual(5, ticker.stats["ticks"])
+        ticker.stop()
+
+    def test_time_budget(self):
+        ticker = self._ticker(10, time_budget=0.5)
+        pauses = []
+        ticker._pause = lambda: pauses.append(1) or succeed(None)
+        for i in range(5):
+            ticker.add("key%i" % i, _Subscriber(self.ticks))
+        # every tick seems to take a second
+        old_time = tickerhandler.time
+        tickerhandler.time = count().next
+        try:
+            self.clock.advance(10)
+        finally:
+            tickerhandler.time = old_time
+        self.assertEqual(5, len(self.ticks))
+        self.assertEqual(5, len(pauses))
+        self.assertEqual(5, ticker.stats["chunks"])
+        ticker.stop()
 
     def test_remove(self):
-        # ticker = Ticker(interval)
-        # self.assertEqual(expected, ticker.remove(store_key))
-        assert True # TODO: implement your test here
+        ticker = self._ticker(10, phases=2)
+        ticker.add("key1", _Subscriber(self.ticks))
+        ticker.remove("key1")
+        self.assertEqual({}, ticker.subscriptions)
+        self.assertEqual([set(), set()], ticker._phases)
+        self.assertFalse(ticker.task.running)
 
     def test_stop(self):
-        # ticker = Ticker(interval)
-        # self.assertEqual(expected, ticker.stop())
-        assert True # TODO: implement your test here
+        ticker = self._ticker(10)
+        ticker.add("key1", _Subscriber(self.ticks))
+        ticker.stop()
+        self.clock.advance(10)
+        self.assertEqual([], self.ticks)
+        self.assertFalse(ticker.task.running)
 
     def test_validate(self):
         # ticker = Ticker(interval)
@@ -1,4 +1,6 @@
 import unittest
+from twisted.internet.defer import succeed
+from src.server import amp
 
 class TestGetRestartMode(unittest.TestCase):
     def test_get_restart_mode(self):
@@ -87,9 +89,34 @@ class TestAMPProtocol(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_call_remote_MsgServer2Portal(self):
-        # a_mp_protocol = AMPProtocol()
-        # self.assertEqual(expected, a_mp_protocol.call_remote_MsgServer2Portal(sessid, msg, data))
-        assert True # TODO: implement your test here
+        sent, received = [], []
+        class _Sessions(object):
+            def data_out(self, sessid, text=None, **kwargs):
+                received.append((sessid, text, kwargs))
+        class _Portal(object):
+            sessions = _Sessions()
+        a_mp_protocol = amp.AMPProtocol()
+        a_mp_protocol.factory = type("_Factory", (object,), {"portal": _Portal()})()
+        a_mp_protocol.callRemote = lambda command, **kwargs: sent.append((command, kwargs)) or succeed({})
+        a_mp_protocol.call_remote_MsgServer2Portal(1, "hello")
+        a_mp_protocol.call_remote_MsgServer2Portal(2, "hello")
+        a_mp_protocol.call_remote_MsgServer2PortalMulti([3, 4], "hello")
+        a_mp_protocol.call_remote_MsgServer2Portal(1, "hello", data={"raw": True})
+        # nothing is sent until the batch is flushed
+        self.assertEqual([], sent)
+        a_mp_protocol.send_msgbatch()
+        self.assertEqual(1, len(sent))
+        command, kwargs = sent[0]
+        self.assertEqual(amp.MsgServer2PortalBatch, command)
+        self.assertEqual([((1, 2, 3, 4), "hello", {}), ((1,), "hello", {"raw": True})],
+                         amp.loads(kwargs["data"]))
+        # portal side
+        a_mp_protocol.amp_msg_server2portal_batch(**kwargs)
+        self.assertEqual([((1, 2, 3, 4), "hello", {}), ((1,), "hello", {"raw": True})], received)
+        # sending an admin command flushes any waiting messages first
+        a_mp_protocol.call_remote_MsgServer2Portal(1, "bye")
+        a_mp_protocol.call_remote_PortalAdmin(1, operation=amp.SDISCONN)
+        self.assertEqual([amp.MsgServer2PortalBatch, amp.PortalAdmin], [tup[0] for tup in sent[1:]])
 
     def test_call_remote_PortalAdmin(self):
         # a_mp_protocol = AMPProtocol()
@@ -0,0 +1,53 @@
+import zlib
+import unittest
+from twisted.internet import defer
+from src.server.portal.mccp import Mccp, mccp_write
+
+class FakeTransport(object):
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+class FakeProtocol(object):
+    def __init__(self):
+        self.protocol_flags = {}
+        self.transport = FakeTransport()
+
+    def will(self, option):
+        return defer.Deferred()
+
+    def requestNegotiation(self, option, data):
+        mccp_write(self, "negotiation")
+
+class TestMccp(unittest.TestCase):
+    def setUp(self):
+        self.protocol = FakeProtocol()
+        self.protocol.mccp = Mccp(self.protocol)
+
+    def test_uncompressed(self):
+        mccp_write(self.protocol, "line1")
+        self.assertEqual(["line1"], self.protocol.transport.written)
+
+    def test_coalesce(self):
+        self.protocol.mccp.do_mccp(None)
+        mccp_write(self.protocol, "line1\r\n")
+        mccp_write(self.protocol, "line2\r\n")
+        self.assertEqual(["negotiation"], self.protocol.transport.written)
+        self.protocol.mccp.flush()
+        written = self.protocol.transport.written
+        self.assertEqual(2, len(written))
+        self.assertEqual("line1\r\nline2\r\n", zlib.decompressobj().decompress(written[1]))
+        stats = self.protocol.mccp.stats()
+        self.assertEqual(14, stats["raw_bytes"])
+        self.assertEqual(len(written[1]), stats["compressed_bytes"])
+        # turning compression off sends what is buffered first
+        mccp_write(self.protocol, "line3")
+        self.protocol.mccp.no_mccp(None)
+        self.assertEqual(3, len(written))
+        mccp_write(self.protocol, "line4")
+        self.assertEqual("line4", written[3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from twisted.conch.telnet import IAC
+from src.utils.ansi import ANSI_NORMAL, ANSI_HILITE, ANSI_RED, _PARSE_CACHE
+from src.server.portal.output import OutputPipeline
+
+class TestOutputPipeline(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = OutputPipeline()
+
+    def test_render_telnet(self):
+        render = self.pipeline.render
+        self.assertEqual(ANSI_HILITE + ANSI_RED + "red" + ANSI_NORMAL, render("{rred{n", "telnet"))
+        self.assertEqual("red\nline2", render("{rred\nline2", "telnet", nomarkup=True))
+        self.assertEqual("{rraw" + IAC, render("{rraw" + IAC, "telnet", raw=True))
+
+    def test_render_html(self):
+        self.assertEqual('<span class="red">red</span>', self.pipeline.render("{rred", "html"))
+        self.assertEqual("{rred", self.pipeline.render("{rred", "html", raw=True))
+
+    def test_render_ssh(self):
+        self.assertEqual("text", self.pipeline.render("text", "ssh", nomarkup=True))
+
+    def test_cache(self):
+        text = "{gcached text"
+        first = self.pipeline.render(text, "telnet", xterm256=1)
+        self.assertTrue(first is self.pipeline.render(text, "telnet", xterm256=True))
+        self.assertNotEqual(first, self.pipeline.render(text, "telnet", nomarkup=True))
+        # the ansi parse cache is not used as well
+        self.assertEqual(None, _PARSE_CACHE.get((text + "{n", "xterm256")))
+
+if __name__ == '__main__':
+    unittest.main()
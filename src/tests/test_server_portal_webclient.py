@@ -0,0 +1,85 @@
+import json
+import zlib
+import unittest
+from twisted.internet import task, defer
+from twisted.web import server
+from src.server.portal import webclient
+from src.server.portal.webclient import WebClient
+
+class FakeRequest(object):
+    def __init__(self, suid, gzip=False):
+        self.args = {"suid": [suid], "mode": ["receive"]}
+        self.headers = {"accept-encoding": "gzip"} if gzip else {}
+        self.written = []
+        self.finished = False
+        self.responseHeaders = {}
+
+    def getHeader(self, key):
+        return self.headers.get(key)
+
+    def setHeader(self, key, value):
+        self.responseHeaders[key] = value
+
+    def write(self, data):
+        self.written.append(data)
+
+    def finish(self):
+        self.finished = True
+
+    def notifyFinish(self):
+        return defer.Deferred()
+
+class TestWebClient(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.client = WebClient(clock=self.clock)
+
+    def test_receive_batch(self):
+        for i in range(3):
+            self.client.lineSend("suid1", "line %i" % i)
+        response = self.client.mode_receive(FakeRequest("suid1"))
+        self.assertEqual(["line 0", "line 1", "line 2"], [entry["msg"] for entry in json.loads(response)])
+        # nothing buffered: the request waits
+        request = FakeRequest("suid1")
+        self.assertEqual(server.NOT_DONE_YET, self.client.mode_receive(request))
+        self.client.lineSend("suid1", "a")
+        self.client.lineSend("suid1", "b")
+        self.assertFalse(request.finished)
+        self.clock.advance(0)
+        self.assertTrue(request.finished)
+        self.assertEqual(["a", "b"], [entry["msg"] for entry in json.loads(request.written[0])])
+
+    def test_buffer_cap(self):
+        old_size = webclient.BUFFER_SIZE
+        webclient.BUFFER_SIZE = 10
+        try:
+            for i in range(5):
+                self.client.lineSend("suid2", "msg%i" % i)
+            self.assertEqual(["msg3", "msg4"], [entry["msg"] for entry in self.client.databuffer["suid2"]])
+            self.assertEqual(8, self.client.buffersize["suid2"])
+        finally:
+            webclient.BUFFER_SIZE = old_size
+
+    def test_gzip(self):
+        old_minsize = webclient.GZIP_MINSIZE
+        webclient.GZIP_MINSIZE = 100
+        try:
+            self.client.lineSend("suid3", "x" * 200)
+            request = FakeRequest("suid3", gzip=True)
+            response = self.client.mode_receive(request)
+            self.assertEqual("gzip", request.responseHeaders["content-encoding"])
+            self.assertEqual("x" * 200, json.loads(zlib.decompress(response, 16 + zlib.MAX_WBITS))[0]["msg"])
+        finally:
+            webclient.GZIP_MINSIZE = old_minsize
+
+    def test_client_disconnect(self):
+        request = FakeRequest("suid4")
+        self.client.mode_receive(request)
+        self.client.lineSend("suid4", "bye")
+        self.client.client_disconnect("suid4")
+        self.assertTrue(request.finished)
+        self.assertEqual("bye", json.loads(request.written[0])[0]["msg"])
+        self.assertFalse("suid4" in self.client.databuffer)
+
+if __name__ == '__main__':
+    unittest.main()
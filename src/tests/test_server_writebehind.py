@@ -0,0 +1,95 @@
+import unittest
+from django.conf import settings
+from django.db.models.signals import post_save
+from src.objects.models import ObjectDB
+from src.typeclasses.models import Attribute
+from src.server.caches import field_post_save
+from src.server.writebehind import WRITEBEHIND
+from src.utils import create
+from src.utils.picklefield import dbsafe_decode
+
+class TestWriteBehind(unittest.TestCase):
+    def setUp(self):
+        post_save.connect(field_post_save, sender=Attribute, dispatch_uid="fieldcache_post")
+        self.obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="wbobj")
+        self.obj.db.counter = 0
+        WRITEBEHIND.active = True
+
+    def tearDown(self):
+        WRITEBEHIND.active = False
+        WRITEBEHIND.flush()
+        post_save.disconnect(sender=Attribute, dispatch_uid="fieldcache_post")
+
+    def _stored_value(self, key):
+        "Get the value as stored in the database, bypassing the idmapper"
+        attr_id = self.obj.attributes.get(key, return_obj=True).id
+        return dbsafe_decode(Attribute.objects.filter(id=attr_id).values_list("db_value", flat=True)[0])
+
+    def test_defer(self):
+        for i in range(10):
+            self.obj.db.counter = i
+        self.obj.key = "wbobj2"
+        # changes are visible in-memory but not yet written
+        self.assertEqual(9, self.obj.db.counter)
+        self.assertEqual(0, self._stored_value("counter"))
+        self.assertEqual("wbobj", ObjectDB.objects.filter(id=self.obj.id).values_list("db_key", flat=True)[0])
+        # coalesced into one pending entry per entity
+        self.assertEqual(2, len(WRITEBEHIND.pending))
+        WRITEBEHIND.flush()
+        self.assertEqual({}, WRITEBEHIND.pending)
+        self.assertEqual(9, self._stored_value("counter"))
+        self.assertEqual("wbobj2", ObjectDB.objects.filter(id=self.obj.id).values_list("db_key", flat=True)[0])
+
+    def test_inplace(self):
+        self.obj.db.inventory = [1, 2]
+        WRITEBEHIND.flush()
+        self.obj.db.inventory.append(3)
+        self.obj.db.inventory.append(4)
+        self.assertEqual([1, 2], self._stored_value("inventory"))
+        WRITEBEHIND.flush()
+        self.assertEqual([1, 2, 3, 4], self._stored_value("inventory"))
+
+    def test_new_and_deleted(self):
+        # new entities are written directly
+        obj2 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="wbnew")
+        self.assertTrue(ObjectDB.objects.filter(id=obj2.id).exists())
+        # pending changes of deleted entities are dropped
+        obj2.key = "wbnew2"
+        obj2.delete()
+        self.assertEqual([], [key for key in WRITEBEHIND.pending if key[1] == obj2.id])
+        WRITEBEHIND.flush()
+
+    def test_max_pending(self):
+        old_max = WRITEBEHIND.max_pending
+        WRITEBEHIND.max_pending = 1
+        try:
+            self.obj.db.counter = 5
+            self.obj.key = "wbobj3"
+            self.assertEqual({}, WRITEBEHIND.pending)
+            self.assertEqual(5, self._stored_value("counter"))
+        finally:
+            WRITEBEHIND.max_pending = old_max
+
+    def test_failed_write(self):
+        obj2 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="wbfail")
+        real_save = WRITEBEHIND._save
+        def _save(instance, fields):
+            if instance is obj2.dbobj:
+                raise ValueError("write failed")
+            real_save(instance, fields)
+        WRITEBEHIND._save = _save
+        try:
+            self.obj.key = "wbok"
+            obj2.key = "wbfail2"
+            WRITEBEHIND.flush()
+        finally:
+            del WRITEBEHIND._save
+        # the other entity was written, the failed one is kept for retrying
+        self.assertEqual("wbok", ObjectDB.objects.filter(id=self.obj.id).values_list("db_key", flat=True)[0])
+        self.assertEqual([(ObjectDB, obj2.id)], WRITEBEHIND.pending.keys())
+        WRITEBEHIND.flush()
+        self.assertEqual({}, WRITEBEHIND.pending)
+        self.assertEqual("wbfail2", ObjectDB.objects.filter(id=obj2.id).values_list("db_key", flat=True)[0])
+
+if __name__ == '__main__':
+    unittest.main()
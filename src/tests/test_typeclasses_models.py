@@ -1,6 +1,24 @@
 import unittest
+from django.conf import settings
+from django.db.models.signals import post_save
+from src.objects.models import ObjectDB
+from src.server.caches import field_post_save
+from src.utils import create
+from src.typeclasses.models import _NO_CACHE, _CACHED_VALUE_REFS, TYPECLASS_REGISTRY, Attribute
+from src.utils.dbserialize import dbobj_ref
+
+class _Holder(object):
+    "Picklable class for storing in Attributes"
+    def __init__(self, value):
+        self.value = value
 
 class TestAttribute(unittest.TestCase):
+    def setUp(self):
+        post_save.connect(field_post_save, sender=Attribute, dispatch_uid="fieldcache_post")
+
+    def tearDown(self):
+        post_save.disconnect(sender=Attribute, dispatch_uid="fieldcache_post")
+
     def test___init__(self):
         # attribute = Attribute(*args, **kwargs)
         assert True # TODO: implement your test here
@@ -25,11 +43,89 @@ class TestAttribute(unittest.TestCase):
         # self.assertEqual(expected, attribute.at_set(new_value))
         assert True # TODO: implement your test here
 
+    def test_value_cache(self):
+        obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="cacheobj")
+        obj.db.stats = {"str": 10}
+        attr = obj.attributes.get("stats", return_obj=True)
+        stats = attr.value
+        self.assertTrue(attr.value is stats)
+        # in-place updates keep the cached value
+        stats["str"] = 12
+        self.assertTrue(attr.value is stats)
+        self.assertEqual(12, attr.value["str"])
+        # assigning a new value drops it
+        obj.db.stats = {"str": 5}
+        self.assertFalse(attr.value is stats)
+        self.assertEqual(5, attr.value["str"])
+        # as does saving db_value directly
+        stats = attr.value
+        attr.db_value = {"str": 7}
+        attr.save()
+        self.assertEqual(7, attr.value["str"])
+        # values holding database objects are cached until the
+        # object is deleted
+        target = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="cachetarget")
+        obj.db.target = [target, 1]
+        attr = obj.attributes.get("target", return_obj=True)
+        value = attr.value
+        self.assertEqual(target, value[0])
+        self.assertTrue(attr.value is value)
+        # replacing the value unregisters the old references
+        ref = dbobj_ref(target)
+        self.assertTrue(attr in _CACHED_VALUE_REFS[ref])
+        obj.db.target = [1]
+        attr.value
+        self.assertFalse(ref in _CACHED_VALUE_REFS)
+        obj.db.target = [target, 1]
+        attr.value
+        target.delete()
+        self.assertFalse(ref in _CACHED_VALUE_REFS)
+        self.assertEqual([None, 1], list(attr.value))
+        # deleting the Attribute drops its cache
+        attr.delete()
+        self.assertTrue(attr._cached_value is _NO_CACHE)
+
+    def test_value_cache_instances(self):
+        obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="cacheinstobj")
+        obj.db.holder = [_Holder(1)]
+        attr = obj.attributes.get("holder", return_obj=True)
+        # values holding class instances are not cached, since changing
+        # them in-place would not be saved
+        value = attr.value
+        self.assertFalse(attr.value is value)
+        self.assertEqual(1, attr.value[0].value)
+        self.assertTrue(attr._cached_value is _NO_CACHE)
+        # plain values are still cached
+        obj.db.holder = [1, (2.0, u"three"), {"four": set([None])}]
+        value = attr.value
+        self.assertTrue(attr.value is value)
+
 class TestAttributeHandler(unittest.TestCase):
     def test___init__(self):
         # attribute_handler = AttributeHandler(obj)
         assert True # TODO: implement your test here
 
+    def test_prefetch(self):
+        obj1 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="prefetch1")
+        obj2 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="prefetch2")
+        obj1.db.test = 1
+        obj2.db.test = 2
+        obj1.nicks.add("pf", "prefetch")
+        obj1.attributes._cache = None
+        obj1.nicks._cache = None
+        obj2.attributes._cache = None
+        ObjectDB.objects.prefetch_attributes([obj1, obj2])
+        self.assertNotEqual(None, obj1.attributes._cache)
+        self.assertNotEqual(None, obj2.nicks._cache)
+        self.assertEqual(1, obj1.db.test)
+        self.assertEqual(2, obj2.db.test)
+        self.assertEqual("prefetch", obj1.nicks.get("pf"))
+        self.assertEqual(None, obj2.nicks.get("pf"))
+        # loaded caches are left alone
+        cache = obj1.attributes._cache
+        ObjectDB.objects.prefetch_attributes([obj1, obj2])
+        self.assertTrue(obj1.attributes._cache is cache)
+
     def test_add(self):
         # attribute_handler = AttributeHandler(obj)
         # self.assertEqual(expected, attribute_handler.add(key, value, category, lockstring, strattr, accessing_obj, default_access))
@@ -128,6 +224,9 @@ class TestTag(unittest.TestCase):
         assert True # TODO: implement your test here
 
 class TestTagHandler(unittest.TestCase):
+    def setUp(self):
+        self.obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="tagobj")
+
     def test___init__(self):
         # tag_handler = TagHandler(obj)
         assert True # TODO: implement your test here
@@ -138,19 +237,38 @@ class TestTagHandler(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_add(self):
-        # tag_handler = TagHandler(obj)
-        # self.assertEqual(expected, tag_handler.add(tag, category, data))
-        assert True # TODO: implement your test here
+        self.obj.tags.add("Forest")
+        self.obj.tags.add(["north", "cold"], category="zone")
+        self.assertEqual(["cold", "forest", "north"], sorted(self.obj.tags.all()))
+        self.assertEqual(["cold", "north"], sorted(self.obj.tags.all(category="zone")))
+
+    def test_add_many(self):
+        self.obj.tags.add("north", category="zone")
+        self.obj.tags.add_many(["forest", ("north", "zone"), ("south", "Zone")], category="biome", data="x")
+        self.assertEqual([("forest", "biome"), ("north", "zone"), ("south", "zone")],
+                         sorted(self.obj.tags.all(return_key_and_category=True)))
+        self.assertEqual("x", self.obj.tags.get("forest", category="biome").db_data)
+        # the cache matches the database
+        self.obj.tags._recache()
+        self.assertEqual(["forest", "north", "south"], sorted(self.obj.tags.all()))
+        # tags are shared between objects
+        obj2 = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="tagobj2")
+        obj2.tags.add_many([("forest", "biome")])
+        self.assertEqual(obj2.tags.get("forest", category="biome"), self.obj.tags.get("forest", category="biome"))
 
     def test_all(self):
-        # tag_handler = TagHandler(obj)
-        # self.assertEqual(expected, tag_handler.all(category, return_key_and_category))
-        assert True # TODO: implement your test here
+        self.obj.tags.add("forest", category="biome")
+        self.obj.tags.add("north", category="zone")
+        self.assertEqual(["forest"], self.obj.tags.all(category="biome"))
+        self.assertEqual([("north", "zone")], self.obj.tags.all(category="zone", return_key_and_category=True))
+        self.assertEqual([], self.obj.tags.all(category="weather"))
 
     def test_clear(self):
-        # tag_handler = TagHandler(obj)
-        # self.assertEqual(expected, tag_handler.clear())
-        assert True # TODO: implement your test here
+        self.obj.tags.add_many(["forest", "north"])
+        self.obj.aliases.add("forest")
+        self.obj.tags.clear()
+        self.assertEqual([], self.obj.tags.all())
+        self.assertEqual(["forest"], self.obj.aliases.all())
 
     def test_get(self):
         # tag_handler = TagHandler(obj)
@@ -158,9 +276,19 @@ class TestTagHandler(unittest.TestCase):
         assert True # TODO: implement your test here
 
     def test_remove(self):
-        # tag_handler = TagHandler(obj)
-        # self.assertEqual(expected, tag_handler.remove(key, category))
-        assert True # TODO: implement your test here
+        self.obj.tags.add_many(["forest", "north", ("north", "zone")])
+        self.obj.tags.remove("north")
+        self.assertEqual([("forest", None), ("north", "zone")],
+                         sorted(self.obj.tags.all(return_key_and_category=True)))
+
+    def test_remove_many(self):
+        self.obj.tags.add_many(["forest", "north", ("north", "zone")])
+        self.obj.aliases.add("forest")
+        self.obj.tags.remove_many(["forest", ("north", "zone"), "nonexistent"])
+        self.assertEqual(["north"], self.obj.tags.all())
+        self.assertEqual(["forest"], self.obj.aliases.all())
+        self.obj.tags._recache()
+        self.assertEqual(["north"], self.obj.tags.all())
 
 class TestTypedObject(unittest.TestCase):
     def test___eq__(self):
@@ -262,5 +390,30 @@ class TestTypedObject(unittest.TestCase):
         # self.assertEqual(expected, typed_object.swap_typeclass(new_typeclass, clean_attributes, no_default))
         assert True # TODO: implement your test here
 
+    def test_resolve_typeclass(self):
+        obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="tcobj")
+        dbobj = obj.dbobj
+        path = settings.BASE_OBJECT_TYPECLASS
+        tpath, tclass = dbobj._resolve_typeclass(path)
+        self.assertEqual(path, tpath)
+        self.assertEqual(obj.__class__, tclass)
+        self.assertEqual((tpath, tclass), TYPECLASS_REGISTRY.get(ObjectDB, path))
+        # failures are reported, and remembered too
+        tpath, errstring = dbobj._resolve_typeclass("src.objects.objects.NoSuchClass")
+        self.assertEqual(None, tpath)
+        self.assertTrue("NoSuchClass" in errstring)
+        hits = TYPECLASS_REGISTRY.stats()["hits"]
+        self.assertEqual((None, errstring), dbobj._resolve_typeclass("src.objects.objects.NoSuchClass"))
+        self.assertEqual(hits + 1, TYPECLASS_REGISTRY.stats()["hits"])
+        # but not for long
+        TYPECLASS_REGISTRY.failed[(ObjectDB, "src.objects.objects.NoSuchClass")] = 0
+        self.assertEqual(None, TYPECLASS_REGISTRY.get(ObjectDB, "src.objects.objects.NoSuchClass"))
+        dbobj._resolve_typeclass("src.objects.objects.NoSuchClass")
+        TYPECLASS_REGISTRY.flush("src.objects.objects.NoSuchClass")
+        self.assertEqual(None, TYPECLASS_REGISTRY.get(ObjectDB, "src.objects.objects.NoSuchClass"))
+        # loading the typeclass anew uses the registry
+        dbobj._cached_typeclass = None
+        self.assertEqual(tclass, dbobj.typeclass.__class__)
+
 if __name__ == '__main__':
     unittest.main()
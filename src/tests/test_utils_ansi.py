@@ -1,25 +1,46 @@
 import unittest
+from src.utils.ansi import ANSIParser, ANSIString, ParseCache, parse_ansi
+from src.utils.ansi import (ANSI_NORMAL, ANSI_HILITE, ANSI_RED, ANSI_BLUE,
+                            ANSI_BACK_RED, ANSI_BACK_CYAN)
 
 class TestANSIParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = ANSIParser()
+
     def test_parse_ansi(self):
-        # a_nsi_parser = ANSIParser()
-        # self.assertEqual(expected, a_nsi_parser.parse_ansi(string, strip_ansi, xterm256))
-        assert True # TODO: implement your test here
+        parse = self.parser.parse_ansi
+        self.assertEqual(ANSI_HILITE + ANSI_RED + "red" + ANSI_NORMAL, parse("{rred{n"))
+        self.assertEqual(ANSI_RED + "red\r\n", parse("%crred%r"))
+        self.assertEqual("\033[38;5;214mxterm", parse("{530xterm", xterm256=True))
+        self.assertEqual(ANSI_HILITE + ANSI_RED + "xterm", parse("{530xterm"))
+        self.assertEqual(ANSI_BACK_RED + "bg", parse("%[500bg"))
+        # escapes
+        self.assertEqual("{r %cr \\{r", parse("{{r %%cr \\{{r"))
+        self.assertEqual("\\" + ANSI_HILITE + ANSI_RED, parse("\\{r"))
+        # stripping keeps the whitespace codes
+        self.assertEqual("red\r\n\tgreen", parse("{rred%r{-{G\033[32mgreen{[500", strip_ansi=True))
+        self.assertEqual("plain", parse("plain"))
+        self.assertEqual("", parse(""))
+
+    def test_tokenize(self):
+        tokens = self.parser.tokenize("a{rb{{c%cn{123{[x")
+        self.assertEqual(["a", "{r", "b{c", "%cn", "", "{123", "", "{[x", ""], tokens)
+        self.assertEqual(["plain"], self.parser.tokenize("plain"))
+        self.assertEqual("ab{c", self.parser.render_strip(tokens))
+        self.assertEqual(self.parser.parse_ansi("a{rb{{c%cn{123{[x", xterm256=True),
+                         self.parser.render_xterm256(tokens))
 
     def test_strip_raw_codes(self):
-        # a_nsi_parser = ANSIParser()
-        # self.assertEqual(expected, a_nsi_parser.strip_raw_codes(string))
-        assert True # TODO: implement your test here
+        self.assertEqual("red", self.parser.strip_raw_codes("\033[1m\033[31mred\033[0m"))
 
     def test_sub_ansi(self):
-        # a_nsi_parser = ANSIParser()
-        # self.assertEqual(expected, a_nsi_parser.sub_ansi(ansimatch))
-        assert True # TODO: implement your test here
+        self.assertEqual(ANSI_BACK_CYAN, self.parser.sub_ansi(self.parser.ansi_sub.match("{[c")))
 
     def test_sub_xterm256(self):
-        # a_nsi_parser = ANSIParser()
-        # self.assertEqual(expected, a_nsi_parser.sub_xterm256(rgbmatch))
-        assert True # TODO: implement your test here
+        self.parser.do_xterm256 = False
+        self.assertEqual(ANSI_NORMAL + ANSI_BLUE, self.parser.sub_xterm256(self.parser.xterm256_sub.match("{002")))
+        self.parser.do_xterm256 = True
+        self.assertEqual("\033[48;5;016m", self.parser.sub_xterm256(self.parser.xterm256_sub.match("{[000")))
 
     def test_parse_rgb(self):
         # a_nsi_parser = ANSIParser()
@@ -28,8 +49,27 @@ class TestANSIParser(unittest.TestCase):
 
 class TestParseAnsi(unittest.TestCase):
     def test_parse_ansi(self):
-        # self.assertEqual(expected, parse_ansi(string, strip_ansi, parser, xterm256))
-        assert True # TODO: implement your test here
+        self.assertEqual(ANSI_NORMAL + "text", parse_ansi("{ntext"))
+        self.assertEqual("text", parse_ansi(ANSIString("{rtext"), strip_ansi=True))
+
+class TestParseCache(unittest.TestCase):
+    def test_cache(self):
+        cache = ParseCache(160)
+        cache.set("a", "A", 10)
+        cache.set("big", "BIG", 21)
+        self.assertEqual("A", cache.get("a"))
+        self.assertEqual(None, cache.get("big"))
+        for key in "bcde":
+            cache.set(key, key.upper(), 20)
+        # a-e now form the old generation
+        self.assertEqual("B", cache.get("b"))
+        for key in "fgh":
+            cache.set(key, key.upper(), 20)
+        cache.set("i", "I", 10)
+        # b was used, so it survived
+        self.assertEqual("B", cache.get("b"))
+        self.assertEqual(None, cache.get("a"))
+        self.assertEqual(None, cache.get("c"))
 
 class TestRaw(unittest.TestCase):
     def test_raw(self):
@@ -0,0 +1,21 @@
+import unittest
+from src.utils.benchmark import benchmark
+
+class TestTimeCase(unittest.TestCase):
+    def test_time_case(self):
+        calls = []
+        result = benchmark.time_case(lambda: calls.append(1), number=10, repeat=3)
+        self.assertEqual(30, len(calls))
+        self.assertEqual((10, 3, 0.0), (result["number"], result["repeat"], result["queries"]))
+        self.assertTrue(result["best"] <= result["median"] <= result["worst"])
+
+class TestCompare(unittest.TestCase):
+    def test_compare(self):
+        old = {"results": {"a": {"best": 1.0}, "b": {"best": 1.0}, "c": {"best": 1.0}}}
+        new = {"results": {"a": {"best": 1.05}, "b": {"best": 1.5}, "d": {"best": 1.0}}}
+        rows, regressions = benchmark.compare(old, new, threshold=0.1)
+        self.assertEqual(["a", "b"], [row[0] for row in rows])
+        self.assertEqual(["b"], regressions)
+
+if __name__ == '__main__':
+    unittest.main()
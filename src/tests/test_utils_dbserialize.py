@@ -1,4 +1,9 @@
 import unittest
+from cPickle import dumps
+from django.conf import settings
+from src.utils import create
+from src.utils.dbserialize import (to_pickle, from_pickle, do_pickle, do_unpickle,
+                                   is_compact, _SaverList, _SaverDict, _SaverSet)
 
 class test__SaverMutable(unittest.TestCase):
     def test___delitem__(self):
@@ -80,6 +85,10 @@ class test__SaverSet(unittest.TestCase):
         # self.assertEqual(expected, __saver_set.discard(value))
         assert True # TODO: implement your test here
 
+class _Unicode(unicode):
+    "unicode subclass, like ANSIString"
+    pass
+
 class TestPackDbobj(unittest.TestCase):
     def test_pack_dbobj(self):
         # self.assertEqual(expected, pack_dbobj(item))
@@ -92,23 +101,54 @@ class TestUnpackDbobj(unittest.TestCase):
 
 class TestToPickle(unittest.TestCase):
     def test_to_pickle(self):
-        # self.assertEqual(expected, to_pickle(data))
-        assert True # TODO: implement your test here
+        obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="pickleobj")
+        saverlist = _SaverList()
+        saverlist._data.extend([1, "two"])
+        packed = to_pickle({"a": saverlist, "b": (obj, set([1])), u"c": None})
+        self.assertEqual([1, "two"], packed["a"])
+        self.assertEqual(list, type(packed["a"]))
+        self.assertEqual("__packed_dbobj__", packed["b"][0][0])
+        self.assertEqual(obj.id, packed["b"][0][3])
+        self.assertEqual(set([1]), packed["b"][1])
+        self.assertEqual(None, packed[u"c"])
 
 class TestFromPickle(unittest.TestCase):
     def test_from_pickle(self):
-        # self.assertEqual(expected, from_pickle(data, db_obj))
-        assert True # TODO: implement your test here
+        obj = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="unpickleobj")
+        packed = to_pickle({"a": [1, [obj]], "b": set([2])})
+        self.assertEqual({"a": [1, [obj]], "b": set([2])}, from_pickle(packed))
+        # onto a db_obj we get a tree of _Saver* iterables
+        value = from_pickle(packed, db_obj=obj)
+        self.assertEqual(_SaverDict, type(value))
+        self.assertEqual(_SaverList, type(value["a"][1]))
+        self.assertEqual(_SaverSet, type(value["b"]))
+        self.assertTrue(value["a"]._parent is value)
+        self.assertEqual(obj, value["a"][1][0])
 
 class TestDoPickle(unittest.TestCase):
     def test_do_pickle(self):
-        # self.assertEqual(expected, do_pickle(data))
-        assert True # TODO: implement your test here
+        data = {"a": range(100), u"b": (1.5, None, True), "c": set(["x"]), "d": 10**20}
+        self.assertTrue(is_compact(do_pickle(data)))
+        self.assertTrue(is_compact(do_pickle(to_pickle(["x"] * 500))))
+        self.assertEqual(do_pickle(data), do_pickle(dict(data)))
+        # the encoding does not depend on how the parts are referenced
+        text = "".join(["te", "xt"])
+        self.assertEqual(do_pickle([text, text]), do_pickle(["text", "text"]))
+        self.assertTrue(is_compact(do_pickle(Exception("err"))))
+        # cyclic data is pickled
+        cyclic = [1]
+        cyclic.append(cyclic)
+        self.assertFalse(is_compact(do_pickle(cyclic)))
 
 class TestDoUnpickle(unittest.TestCase):
     def test_do_unpickle(self):
-        # self.assertEqual(expected, do_unpickle(data))
-        assert True # TODO: implement your test here
+        data = {"a": range(100), u"b": (1.5, None, True), "c": set(["x"]), "d": 10**20}
+        self.assertEqual(data, do_unpickle(do_pickle(data)))
+        self.assertEqual(["x"] * 500, do_unpickle(do_pickle(["x"] * 500)))
+        value = do_unpickle(do_pickle([u"a", _Unicode(u"b")]))
+        self.assertEqual(_Unicode, type(value[1]))
+        # plain pickles can still be read
+        self.assertEqual(data, do_unpickle(dumps(data, 2)))
 
 class TestDbserialize(unittest.TestCase):
     def test_dbserialize(self):
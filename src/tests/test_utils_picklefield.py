@@ -1,4 +1,8 @@
 import unittest
+from datetime import datetime
+from cPickle import dumps
+from base64 import b64encode
+from src.utils.picklefield import dbsafe_encode, dbsafe_decode, PickledObject
 
 class test__ObjectWrapper(unittest.TestCase):
     def test___init__(self):
@@ -12,13 +16,21 @@ class TestWrapConflictualObject(unittest.TestCase):
 
 class TestDbsafeEncode(unittest.TestCase):
     def test_dbsafe_encode(self):
-        # self.assertEqual(expected, dbsafe_encode(value, compress_object, pickle_protocol))
-        assert True # TODO: implement your test here
+        value = {"a": [1, 2], "b": u"text"}
+        self.assertEqual(PickledObject, type(dbsafe_encode(value)))
+        self.assertEqual(dbsafe_encode(value), dbsafe_encode(dict(value)))
+        self.assertNotEqual(dbsafe_encode(value), dbsafe_encode(value, compact=False))
 
 class TestDbsafeDecode(unittest.TestCase):
     def test_dbsafe_decode(self):
-        # self.assertEqual(expected, dbsafe_decode(value, compress_object))
-        assert True # TODO: implement your test here
+        value = {"a": [1, 2], "b": u"text"}
+        self.assertEqual(value, dbsafe_decode(dbsafe_encode(value)))
+        self.assertEqual(value, dbsafe_decode(dbsafe_encode(value, compact=False)))
+        self.assertEqual(value, dbsafe_decode(dbsafe_encode(value, compress_object=True), compress_object=True))
+        date = datetime(2014, 1, 1)
+        self.assertEqual(date, dbsafe_decode(dbsafe_encode(date)))
+        # rows stored by older versions
+        self.assertEqual(value, dbsafe_decode(b64encode(dumps(value, 2))))
 
 class TestPickledObjectField(unittest.TestCase):
     def test___init__(self):
@@ -1,9 +1,62 @@
 import unittest
+from django.conf import settings
+from src.typeclasses import managers
+from src.typeclasses.tagindex import TAG_INDEX
+from src.utils import create
+from src.utils.search import search_object_tag
 
 class TestSearchObjectTag(unittest.TestCase):
+    def setUp(self):
+        self.forest = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="forest")
+        self.plain = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="plain")
+        self.lake = create.create_object(settings.BASE_OBJECT_TYPECLASS, key="lake")
+        # the tags must be unique to this test run
+        self.wooded, self.north, self.south = ["%s%i" % (key, self.forest.id) for key in ("wooded", "north", "south")]
+        self.forest.tags.add_many([self.wooded.capitalize(), (self.north, "zone")])
+        self.plain.tags.add_many([(self.north, "zone"), (self.south, "zone")])
+        self.lake.tags.add(self.wooded)
+
+    def _search(self, *args, **kwargs):
+        "Search, in a fixed order"
+        return sorted(search_object_tag(*args, **kwargs), key=lambda obj: obj.id)
+
+    def _test_search(self):
+        wooded, north, south = self.wooded, self.north, self.south
+        self.assertEqual([self.forest, self.lake], self._search(wooded))
+        self.assertEqual([self.forest, self.plain], self._search(north, category="zone"))
+        self.assertEqual([self.forest, self.plain], self._search(north))
+        self.assertEqual([], self._search(north, category="region"))
+        # intersection and union
+        self.assertEqual([self.forest], self._search([wooded, (north.upper(), "zone")]))
+        self.assertEqual([self.plain], self._search([north, south], category="zone"))
+        self.assertEqual([], self._search([wooded, (south, "zone")]))
+        self.assertEqual([self.forest, self.plain, self.lake],
+                         self._search([wooded, (south, "zone"), (north, "zone")], union=True))
+        # changes are seen
+        self.lake.tags.add(south, category="zone")
+        self.forest.tags.remove(wooded)
+        self.assertEqual([self.lake], self._search([wooded, (south, "zone")]))
+        self.plain.tags.clear()
+        self.assertEqual([self.lake], self._search(south, category="zone"))
+        self.lake.delete()
+        self.assertEqual([], self._search(south, category="zone"))
+
     def test_search_object_tag(self):
-        # self.assertEqual(expected, search_object_tag(key, category))
-        assert True # TODO: implement your test here
+        old_cache = managers._TYPECLASS_AGGRESSIVE_CACHE
+        try:
+            managers._TYPECLASS_AGGRESSIVE_CACHE = True
+            TAG_INDEX.clear()
+            self._test_search()
+        finally:
+            managers._TYPECLASS_AGGRESSIVE_CACHE = old_cache
+
+    def test_search_object_tag_db(self):
+        old_cache = managers._TYPECLASS_AGGRESSIVE_CACHE
+        try:
+            managers._TYPECLASS_AGGRESSIVE_CACHE = False
+            self._test_search()
+        finally:
+            managers._TYPECLASS_AGGRESSIVE_CACHE = old_cache
 
 class TestSearchPlayerTag(unittest.TestCase):
     def test_search_player_tag(self):
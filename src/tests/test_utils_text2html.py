@@ -1,55 +1,75 @@
 import unittest
+from src.utils.ansi import ANSIString, ANSI_PARSER
+from src.utils.text2html import TextToHTMLparser, parse_html
 
 class TestTextToHTMLparser(unittest.TestCase):
+    def setUp(self):
+        self.parser = TextToHTMLparser()
+
     def test_convert_linebreaks(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.convert_linebreaks(text))
-        assert True # TODO: implement your test here
+        self.assertEqual("a<br>b", self.parser.convert_linebreaks(r"a\nb"))
 
     def test_convert_urls(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.convert_urls(text))
-        assert True # TODO: implement your test here
+        self.assertEqual('see <a href="http://evennia.com" target="_blank">http://evennia.com</a>',
+                         self.parser.convert_urls("see http://evennia.com"))
 
-    def test_do_sub(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.do_sub(m))
-        assert True # TODO: implement your test here
+    def test_convert_text(self):
+        self.assertEqual("a&nbsp;&nbsp;&lt;b&gt;<br>c", self.parser.convert_text("a  <b>\r\nc"))
 
     def test_parse(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.parse(text, strip_ansi))
-        assert True # TODO: implement your test here
+        parse = self.parser.parse
+        self.assertEqual('<span class="red">Red</span> plain', parse("{rRed{n plain"))
+        self.assertEqual('<span class="maroon">A</span><span class="red">B</span>', parse("%crA%chB"))
+        self.assertEqual('<span class="lime">A</span><span class="lime bgmaroon">B</span>C',
+                         parse("{gA{[rB{nC"))
+        self.assertEqual('<span class="yellow">x</span>', parse("{550x"))
+        self.assertEqual('<span class="blue">A<br></span>B{b', parse("{bA{/{nB{{b"))
+        self.assertEqual("A<br>B", parse("{bA%r{[rB", strip_ansi=True))
+        # ansi sequences in the text
+        self.assertEqual('<span class="red">A</span><span class="red underline">B</span>',
+                         parse("\033[1m\033[31mA\033[4mB"))
+        self.assertEqual('<span class="red">A</span>', parse(ANSIString("{rA")))
+        self.assertEqual("", parse(""))
+        self.assertEqual("<strong>A</strong>B", parse("%chA{nB"))
 
-    def test_re_bold(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.re_bold(text))
-        assert True # TODO: implement your test here
+    def test_parse_cache(self):
+        # parsers rendering differently don't share cached results
+        class _Parser(TextToHTMLparser):
+            colors = ("black", "darkred", "green", "olive", "navy", "purple", "teal", "gray")
+        self.assertEqual('<span class="maroon">A</span>', self.parser.parse("{RA"))
+        self.assertEqual('<span class="darkred">A</span>', _Parser().parse("{RA"))
+        # nor do parsers created after an earlier one was dropped
+        class _Parser2(TextToHTMLparser):
+            colors = ("black", "firebrick", "green", "olive", "navy", "purple", "teal", "gray")
+        parser = _Parser()
+        parser_id = parser.parser_id
+        del parser
+        parser = _Parser2()
+        self.assertNotEqual(parser_id, parser.parser_id)
+        self.assertEqual('<span class="firebrick">A</span>', parser.parse("{RA"))
 
-    def test_re_color(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.re_color(text))
-        assert True # TODO: implement your test here
+    def test_render_tokens(self):
+        tokens = ANSI_PARSER.tokenize("{rA{RB%cuC")
+        self.assertEqual('<span class="red">A</span><span class="maroon">B%cuC</span>',
+                         self.parser.render_tokens(tokens))
+        self.assertEqual("AB%cuC", self.parser.render_tokens(tokens, strip_ansi=True))
 
-    def test_re_underline(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.re_underline(text))
-        assert True # TODO: implement your test here
+    def test_span(self):
+        self.assertEqual(("", ""), self.parser.span(None, None, False, False))
+        self.assertEqual(('<span class="dimgray bgteal underline">', "</span>"), self.parser.span(0, 6, True, True))
+        # hilite without a colour is bold
+        self.assertEqual(("<strong>", "</strong>"), self.parser.span(None, None, True, False))
+        self.assertEqual(('<strong><span class="bgteal">', "</span></strong>"), self.parser.span(None, 6, True, False))
 
     def test_remove_backspaces(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.remove_backspaces(text))
-        assert True # TODO: implement your test here
+        self.assertEqual("ac", self.parser.remove_backspaces("ab\010c"))
 
     def test_remove_bells(self):
-        # text_to_htm_lparser = TextToHTMLparser()
-        # self.assertEqual(expected, text_to_htm_lparser.remove_bells(text))
-        assert True # TODO: implement your test here
+        self.assertEqual("ab", self.parser.remove_bells("a\07b"))
 
 class TestParseHtml(unittest.TestCase):
     def test_parse_html(self):
-        # self.assertEqual(expected, parse_html(string, strip_ansi, parser))
-        assert True # TODO: implement your test here
+        self.assertEqual('<span class="white">&lt;tag&gt;</span>', parse_html("{w<tag>"))
 
 if __name__ == '__main__':
     unittest.main()
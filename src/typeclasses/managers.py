@@ -6,6 +6,7 @@ all Attributes and TypedObjects).
 from functools import update_wrapper
 from django.db import models
 from django.db.models import Q
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from src.utils import idmapper
 from src.utils.utils import make_iter, variable_from_module
@@ -14,6 +15,8 @@ from src.utils.dbserialize import to_pickle
 __all__ = ("AttributeManager", "TypedObjectManager")
 _GA = object.__getattribute__
 _ObjectDB = None
+_TAG_INDEX = None
+_TYPECLASS_AGGRESSIVE_CACHE = settings.TYPECLASS_AGGRESSIVE_CACHE
 
 #
 # helper functions for the TypedObjectManager.
@@ -48,6 +51,7 @@ def returns_typeclass(method):
         return None
     return update_wrapper(func, method)
 
+
 # Managers
 
 def _attr_pickled(method):
@@ -168,21 +172,45 @@ class TagManager(models.Manager):
             return list(tags)
 
     @returns_typeclass_list
-    def get_objs_with_tag(self, key=None, category=None, model="objects.objectdb", tagtype=None):
+    def get_objs_with_tag(self, key=None, category=None, model="objects.objectdb", tagtype=None, union=False):
         """
         Search and return all objects of objclass that has tags matching
         the given search criteria.
-         key (string) - the tag identifier
-         category (string) - the tag category
+         key (string or list) - the tag identifier. If a list of keys
+                 and/or (key, category) tuples, return objects having
+                 all these tags.
+         category (string) - the tag category (used for keys given
+                 without one)
          model (string) - tag model name. Defaults to "ObjectDB"
          tagtype (string) - None, alias or permission
-         objclass (dbmodel) - the object class to search. If not given, use ObjectDB.
+         union (bool) - with a list of keys, return objects having any
+                 of the tags rather than all of them.
+
+        With settings.TYPECLASS_AGGRESSIVE_CACHE, the tags are looked
+        up in the in-memory tag index rather than the database.
         """
         objclass = ContentType.objects.get_by_natural_key(*model.split(".", 1)).model_class()
-        key_cands = Q(db_tags__db_key__iexact=key.lower().strip()) if key is not None else Q()
-        cat_cands = Q(db_tags__db_category__iexact=category.lower().strip()) if category is not None else Q()
-        tag_crit = Q(db_tags__db_model=model, db_tags__db_tagtype=tagtype)
-        return objclass.objects.filter(tag_crit & key_cands & cat_cands)
+        tags = make_iter(key) if key is not None else [None]
+        if _TYPECLASS_AGGRESSIVE_CACHE:
+            global _TAG_INDEX
+            if not _TAG_INDEX:
+                from src.typeclasses.tagindex import TAG_INDEX as _TAG_INDEX
+            ids = _TAG_INDEX.search(model, tags, category=category, tagtype=tagtype, union=union)
+            if not ids:
+                return objclass.objects.none()
+            return objclass.objects.filter(id__in=ids)
+        tag_crits = []
+        for tag in tags:
+            tkey, tcat = tag if isinstance(tag, tuple) else (tag, category)
+            key_cands = Q(db_tags__db_key__iexact=tkey.lower().strip()) if tkey is not None else Q()
+            cat_cands = Q(db_tags__db_category__iexact=tcat.lower().strip()) if tcat is not None else Q()
+            tag_crits.append(Q(db_tags__db_model=model, db_tags__db_tagtype=tagtype) & key_cands & cat_cands)
+        if len(tag_crits) == 1:
+            return objclass.objects.filter(tag_crits[0])
+        if union:
+            return objclass.objects.filter(reduce(lambda crit1, crit2: crit1 | crit2, tag_crits)).distinct()
+        # one filter (and so one tag join) per tag, to require all of them
+        return reduce(lambda matches, crit: matches.filter(crit), tag_crits, objclass.objects.all())
 
     def create_tag(self, key=None, category=None, data=None, model="objects.objectdb", tagtype=None):
         """
@@ -267,6 +295,48 @@ class TypedObjectManager(idmapper.manager.SharedMemoryManager):
             retval = retval.filter(id__lte=self.dbref(max_dbref, reqhash=False))
         return retval
 
+    def prefetch_attributes(self, objs):
+        """
+        Load the Attributes (and Nicks, where available) of many
+        objects with a single database query and store them in the
+        objects' attribute caches. This avoids one query per object
+        when accessing Attributes on e.g. all objects in a room or
+        all online characters.
+
+        objs - an iterable of objects (typeclassed or not) of this
+               manager's model.
+
+        Objects whose attribute caches are already loaded are skipped.
+        Without settings.TYPECLASS_AGGRESSIVE_CACHE the handlers
+        reload their cache on every access, so this does nothing.
+        """
+        if not _TYPECLASS_AGGRESSIVE_CACHE:
+            return
+        dbobjs = {}
+        for obj in make_iter(objs):
+            obj = hasattr(obj, "dbobj") and obj.dbobj or obj
+            objdict = _GA(obj, "__dict__")
+            if any(handler and handler._cache is None for handler in
+                   (objdict.get("attributes"), objdict.get("nicks"))):
+                dbobjs[_GA(obj, "id")] = obj
+        if not dbobjs:
+            return
+        m2mfield = self.model._meta.get_field("db_attributes")
+        source = m2mfield.m2m_field_name()
+        target = m2mfield.m2m_reverse_field_name()
+        # obj id -> attrtype -> list of attributes
+        attrs = dict((dbid, {}) for dbid in dbobjs)
+        for row in m2mfield.rel.through.objects.filter(
+                        **{"%s__in" % source: dbobjs.keys()}).select_related(target):
+            attr = getattr(row, target)
+            attrs[getattr(row, "%s_id" % source)].setdefault(attr.db_attrtype, []).append(attr)
+        for dbid, dbobj in dbobjs.items():
+            for handlername in ("attributes", "nicks"):
+                handler = _GA(dbobj, "__dict__").get(handlername)
+                if handler:
+                    handler._set_cache(attr for attr in attrs[dbid].get(handler._attrtype, ())
+                                       if attr.db_model == handler._model)
+
     def object_totals(self):
         """
         Returns a dictionary with all the typeclasses active in-game
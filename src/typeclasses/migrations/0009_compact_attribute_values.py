@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+from src.utils.dbserialize import COMPACT_VERSION, compact_version, is_compact
+from src.utils.picklefield import dbsafe_encode, dbsafe_decode
+
+# number of Attributes converted per query
+_BATCH_SIZE = 500
+
+
+def _convert_values(orm, convert):
+    """
+    Re-store the Attribute values for which convert(raw) returns a new
+    database string, reading and updating them in batches.
+    """
+    table = db.quote_name(orm['typeclasses.Attribute']._meta.db_table)
+    ids = list(orm['typeclasses.Attribute'].objects.filter(
+        db_value__isnull=False).order_by("id").values_list("id", flat=True))
+    cursor = db._get_connection().cursor()
+    for start in range(0, len(ids), _BATCH_SIZE):
+        batch = ids[start:start + _BATCH_SIZE]
+        rows = db.execute("SELECT id, db_value FROM %s WHERE id IN (%s)"
+                          % (table, ", ".join(["%s"] * len(batch))), batch)
+        updates = []
+        for attr_id, raw in rows:
+            if raw is None:
+                continue
+            try:
+                new_raw = convert(str(raw))
+            except Exception, err:
+                # such as a pickled class that no longer imports; the
+                # value is left as it is
+                print "Attribute %s could not be converted and was left unchanged (%s: %s)." % (
+                    attr_id, err.__class__.__name__, err)
+                continue
+            if new_raw is not None:
+                updates.append((new_raw, attr_id))
+        if updates:
+            cursor.executemany("UPDATE %s SET db_value = %%s WHERE id = %%s" % table, updates)
+
+
+def _to_compact(raw):
+    "Get raw in the current compact format, or None if it already is"
+    if compact_version(raw.decode("base64")) == COMPACT_VERSION:
+        return None
+    return dbsafe_encode(dbsafe_decode(raw))
+
+
+def _to_pickle(raw):
+    "Get raw as a plain pickle, or None if it already is"
+    if not is_compact(raw.decode("base64")):
+        return None
+    return dbsafe_encode(dbsafe_decode(raw), compact=False)
+
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        "Re-store all Attribute values, in the compact format where possible."
+        # Note: Don't use "from appname.models import ModelName".
+        # Use orm.ModelName to refer to models in this application,
+        # and orm['appname.ModelName'] for models in other applications.
+        _convert_values(orm, _to_compact)
+
+    def backwards(self, orm):
+        "Store all Attribute values as pickles again."
+        _convert_values(orm, _to_pickle)
+
+    models = {
+        u'typeclasses.attribute': {
+            'Meta': {'object_name': 'Attribute'},
+            'db_attrtype': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '16', 'null': 'True', 'blank': 'True'}),
+            'db_category': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '128', 'null': 'True', 'blank': 'True'}),
+            'db_date_created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'db_key': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'db_lock_storage': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'db_model': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '32', 'null': 'True', 'blank': 'True'}),
+            'db_strvalue': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'db_value': ('src.utils.picklefield.PickledObjectField', [], {'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        },
+        u'typeclasses.tag': {
+            'Meta': {'unique_together': "(('db_key', 'db_category'),)", 'object_name': 'Tag', 'index_together': "(('db_key', 'db_category'),)"},
+            'db_category': ('django.db.models.fields.CharField', [], {'max_length': '64', 'null': 'True', 'db_index': 'True'}),
+            'db_data': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'db_key': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'db_index': 'True'}),
+            'db_model': ('django.db.models.fields.CharField', [], {'max_length': '32', 'null': 'True', 'db_index': 'True'}),
+            'db_tagtype': ('django.db.models.fields.CharField', [], {'max_length': '16', 'null': 'True', 'db_index': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+
+    complete_apps = ['typeclasses']
+    symmetrical = True
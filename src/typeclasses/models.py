@@ -29,8 +29,12 @@ these to create custom managers.
 import sys
 import re
 import traceback
+from time import time
+from weakref import WeakSet
+from collections import defaultdict
 
 from django.db import models
+from django.db.models.signals import post_delete
 from django.conf import settings
 from django.utils.encoding import smart_str
 from django.contrib.contenttypes.models import ContentType
@@ -42,10 +46,11 @@ from src.server.caches import get_prop_cache, set_prop_cache
 #from src.server.caches import call_ndb_hooks
 from src.server.models import ServerConfig
 from src.typeclasses import managers
+from src.typeclasses.tagindex import TAG_INDEX
 from src.locks.lockhandler import LockHandler
 from src.utils import logger
 from src.utils.utils import make_iter, is_iter, to_str, inherits_from
-from src.utils.dbserialize import to_pickle, from_pickle
+from src.utils.dbserialize import to_pickle, from_pickle, dbobj_ref, packed_dbobj_refs, packed_is_plain
 from src.utils.picklefield import PickledObjectField
 
 __all__ = ("Attribute", "TypeNick", "TypedObject")
@@ -58,6 +63,12 @@ _GA = object.__getattribute__
 _SA = object.__setattr__
 _DA = object.__delattr__
 
+# marks an Attribute value that is not yet decoded
+_NO_CACHE = object()
+# (natural_key, id) of a database object -> the Attributes whose
+# cached value refers to that object
+_CACHED_VALUE_REFS = defaultdict(WeakSet)
+
 
 #------------------------------------------------------------
 #
@@ -112,6 +123,11 @@ class Attribute(SharedMemoryModel):
     # Database manager
     objects = managers.AttributeManager()
 
+    # decoded value cache, see the value property
+    _cached_value = _NO_CACHE
+    # the database objects referenced by the cached value
+    _cached_value_refs = ()
+
     # Lock handler self.locks
     def __init__(self, *args, **kwargs):
         "Initializes the parent first -important!"
@@ -135,20 +151,36 @@ class Attribute(SharedMemoryModel):
     def __value_get(self):
         """
         Getter. Allows for value = self.value.
-        We cannot cache here since it makes certain cases (such
-        as storing a dbobj which is then deleted elsewhere) out-of-sync.
-        The overhead of unpickling seems hard to avoid.
-        """
-        return from_pickle(self.db_value, db_obj=self)
+        Values made only of basic types, dates, database objects and
+        the lists, tuples, dicts and sets holding them are decoded
+        once and the result cached on the Attribute until db_value is
+        saved again. If the value refers to database objects, the
+        cache is also dropped when any of those objects are deleted.
+        Other values (such as class instances) could be changed
+        in-place without being saved, so they are not cached but
+        decoded anew on every access; such changes are only saved if
+        the value is assigned again.
+        """
+        value = _GA(self, "_cached_value")
+        if value is _NO_CACHE:
+            db_value = self.db_value
+            value = from_pickle(db_value, db_obj=self)
+            _GA(self, "_cache_value")(value, db_value)
+        return value
 
     #@value.setter
     def __value_set(self, new_value):
         """
-        Setter. Allows for self.value = value. We cannot cache here,
-        see self.__value_get.
+        Setter. Allows for self.value = value.
         """
         self.db_value = to_pickle(new_value)
         self.save()
+        if getattr(new_value, "_db_obj", None) is self:
+            # an in-place update of our own _Saver* value; it
+            # already reflects the stored data.
+            _GA(self, "_cache_value")(new_value, self.db_value)
+        else:
+            _GA(self, "_uncache_value")()
         try:
             self._track_db_value_change.update(self.cached_value)
         except AttributeError:
@@ -191,6 +223,62 @@ class Attribute(SharedMemoryModel):
         """
         pass
 
+    def _cache_value(self, value, db_value):
+        """
+        Store the decoded value, registering the database objects
+        stored in db_value so the cache can be dropped if they are
+        deleted. Values that are not plain (see
+        dbserialize.packed_is_plain) are not stored.
+        """
+        _GA(self, "_uncache_value")()
+        if not packed_is_plain(db_value):
+            return
+        refs = packed_dbobj_refs(db_value)
+        for ref in refs:
+            _CACHED_VALUE_REFS[ref].add(self)
+        _SA(self, "_cached_value_refs", refs)
+        _SA(self, "_cached_value", value)
+
+    def _uncache_value(self):
+        """
+        Drop the decoded value, unregistering the database objects
+        it referred to.
+        """
+        for ref in _GA(self, "_cached_value_refs"):
+            attrs = _CACHED_VALUE_REFS.get(ref)
+            if attrs is not None:
+                attrs.discard(self)
+                if not attrs:
+                    del _CACHED_VALUE_REFS[ref]
+        _SA(self, "_cached_value_refs", ())
+        _SA(self, "_cached_value", _NO_CACHE)
+
+    def _at_db_value_postsave(self):
+        """
+        Called by the field_post_save signal handler whenever db_value
+        was saved. Makes sure the decoded value is not re-used.
+        """
+        _GA(self, "_uncache_value")()
+
+
+def _drop_cached_values(sender, instance=None, **kwargs):
+    """
+    Called by the post_delete signal. Drops the decoded value of a
+    deleted Attribute as well as that of all Attributes whose cached
+    value refers to the deleted object.
+    """
+    if not issubclass(sender, (TypedObject, Attribute)):
+        # only these can be packed into Attribute values
+        return
+    if isinstance(instance, Attribute):
+        _GA(instance, "_uncache_value")()
+    if _CACHED_VALUE_REFS:
+        ref = dbobj_ref(instance)
+        if ref:
+            for attr in list(_CACHED_VALUE_REFS.pop(ref, ())):
+                _GA(attr, "_uncache_value")()
+post_delete.connect(_drop_cached_values, dispatch_uid="attribute_value_cache")
+
 
 #
 # Handlers making use of the Attribute model
@@ -213,12 +301,20 @@ class AttributeHandler(object):
         self._cache = None
 
     def _recache(self):
-        self._cache = dict(("%s-%s" % (to_str(attr.db_key).lower(),
-                                       attr.db_category.lower() if attr.db_category else None), attr)
-                        for attr in _GA(self.obj, self._m2m_fieldname).filter(
+        self._set_cache(_GA(self.obj, self._m2m_fieldname).filter(
                             db_model=self._model, db_attrtype=self._attrtype))
         #set_attr_cache(self.obj, self._cache) # currently only for testing
 
+    def _set_cache(self, attrs):
+        """
+        Build the lookup cache from an iterable of Attributes. This is
+        also used by TypedObjectManager.prefetch_attributes to warm
+        the caches of many objects at once.
+        """
+        self._cache = dict(("%s-%s" % (to_str(attr.db_key).lower(),
+                                       attr.db_category.lower() if attr.db_category else None), attr)
+                           for attr in attrs)
+
     def has(self, key, category=None):
         """
         Checks if the given Attribute (or list of Attributes) exists on
@@ -542,24 +638,62 @@ class TagHandler(object):
                             for tag in _GA(self.obj, self._m2m_fieldname).filter(
                                          db_model=self._model, db_tagtype=self._tagtype))
 
+    def _parse(self, tags, category):
+        """
+        Get a dict {cachekey: (key, category)} from a list of tag
+        keys and/or (key, category) tuples. Empty keys are skipped.
+        """
+        parsed = {}
+        for tag in tags:
+            key, cat = tag if isinstance(tag, tuple) else (tag, category)
+            if not key or not key.strip():
+                continue
+            key = key.strip().lower()
+            cat = cat.strip().lower() if cat is not None else None
+            parsed["%s-%s" % (key, cat)] = (key, cat)
+        return parsed
+
     def add(self, tag, category=None, data=None):
         "Add a new tag to the handler. Tag is a string or a list of strings."
-        for tagstr in make_iter(tag):
-            if not tagstr:
-                continue
-            tagstr = tagstr.strip().lower()
-            category = category.strip().lower() if category is not None else None
-            data = str(data) if data is not None else None
-            # this will only create tag if no matches existed beforehand (it
-            # will overload data on an existing tag since that is not
-            # considered part of making the tag unique)
-            tagobj = Tag.objects.create_tag(key=tagstr, category=category, data=data,
-                                            model=self._model, tagtype=self._tagtype)
-            _GA(self.obj, self._m2m_fieldname).add(tagobj)
-            if self._cache is None:
-                self._recache()
-            cachestring = "%s-%s" % (tagstr, category)
-            self._cache[cachestring] = tagobj
+        self.add_many(make_iter(tag), category=category, data=data)
+
+    def add_many(self, tags, category=None, data=None):
+        """
+        Add several tags to the handler at once, using a fixed number
+        of queries. tags is a list of tag keys and/or (key, category)
+        tuples; category is used for the keys given without one. Tags
+        not yet existing are created. A given data will overload the
+        data of existing tags (it is not part of what makes the tag
+        unique).
+        """
+        wanted = self._parse(tags, category)
+        if not wanted:
+            return
+        data = str(data) if data is not None else None
+        if self._cache is None:
+            self._recache()
+        keys = set(key for key, cat in wanted.values())
+        tagobjs = dict(("%s-%s" % (tag.db_key, tag.db_category), tag)
+                       for tag in Tag.objects.filter(db_model=self._model, db_tagtype=self._tagtype,
+                                                     db_key__in=keys)
+                       if "%s-%s" % (tag.db_key, tag.db_category) in wanted)
+        if data is not None and tagobjs:
+            Tag.objects.filter(id__in=[tag.id for tag in tagobjs.values()]).update(db_data=data)
+            for tag in tagobjs.values():
+                tag.db_data = data
+        missing = [cachekey for cachekey in wanted if cachekey not in tagobjs]
+        if missing:
+            Tag.objects.bulk_create([Tag(db_key=wanted[cachekey][0], db_category=wanted[cachekey][1],
+                                         db_data=data, db_model=self._model, db_tagtype=self._tagtype)
+                                     for cachekey in missing])
+            # bulk_create does not give us the ids, so re-fetch the new tags
+            for tag in Tag.objects.filter(db_model=self._model, db_tagtype=self._tagtype,
+                                          db_key__in=set(wanted[cachekey][0] for cachekey in missing)):
+                cachekey = "%s-%s" % (tag.db_key, tag.db_category)
+                if cachekey in wanted:
+                    tagobjs.setdefault(cachekey, tag)
+        _GA(self.obj, self._m2m_fieldname).add(*tagobjs.values())
+        self._cache.update(tagobjs)
 
     def get(self, key, category="", return_tagobj=False):
         """
@@ -578,24 +712,30 @@ class TagHandler(object):
 
     def remove(self, key, category=None):
         "Remove a tag from the handler based ond key and category."
-        for key in make_iter(key):
-            if not (key or key.strip()):  # we don't allow empty tags
-                continue
-            tagstr = key.strip().lower()
-            category = category.strip().lower() if category is not None else None
-
-            # This does not delete the tag object itself. Maybe it should do
-            # that when no objects reference the tag anymore (how to check)?
-            tagobj = self.obj.db_tags.filter(db_key=tagstr, db_category=category)
-            if tagobj:
-                _GA(self.obj, self._m2m_fieldname).remove(tagobj[0])
-        self._recache()
+        self.remove_many(make_iter(key), category=category)
+
+    def remove_many(self, tags, category=None):
+        """
+        Remove several tags from the handler at once. tags is a list
+        of tag keys and/or (key, category) tuples; category is used
+        for the keys given without one.
+        """
+        # This does not delete the tag objects themselves. Maybe it should do
+        # that when no objects reference the tag anymore (how to check)?
+        if self._cache is None or not _TYPECLASS_AGGRESSIVE_CACHE:
+            self._recache()
+        tagobjs = [tag for tag in (self._cache.pop(cachekey, None)
+                                   for cachekey in self._parse(tags, category)) if tag]
+        if tagobjs:
+            _GA(self.obj, self._m2m_fieldname).remove(*tagobjs)
 
     def clear(self):
         "Remove all tags from the handler"
-        for tag in _GA(self.obj, self._m2m_fieldname).filter(db_model=self._model, db_tagtype=self._tagtype):
-            _GA(self.obj, self._m2m_fieldname).remove(tag)
-        self._recache()
+        if self._cache is None or not _TYPECLASS_AGGRESSIVE_CACHE:
+            self._recache()
+        if self._cache:
+            _GA(self.obj, self._m2m_fieldname).remove(*self._cache.values())
+        self._cache = {}
 
     def all(self, category=None, return_key_and_category=False):
         """
@@ -605,22 +745,15 @@ class TagHandler(object):
         """
         if self._cache is None or not _TYPECLASS_AGGRESSIVE_CACHE:
             self._recache()
+        matches = self._cache.values()
         if category:
-            category = category.strip().lower() if category is not None else None
-            matches = _GA(self.obj, self._m2m_fieldname).filter(db_category=category,
-                                                                db_tagtype=self._tagtype,
-                                                                db_model=self._model).values_list("db_key")
+            category = category.strip().lower()
+            matches = [tag for tag in matches if tag.db_category == category]
+        if return_key_and_category:
+            # return tuple (key, category)
+            return [(to_str(p.db_key), to_str(p.db_category)) for p in matches]
         else:
-            matches = self._cache.values()
-        if matches:
-            if return_key_and_category:
-                # return tuple (key, category)
-                return [(to_str(p.db_key), to_str(p.db_category)) for p in matches]
-            else:
-                return [to_str(p.db_key) for p in matches]
-        return []
-
-        #return [to_str(p[0]) for p in _GA(self.obj, self._m2m_fieldname).filter(db_category__startswith=self.prefix).values_list("db_key") if p[0]]
+            return [to_str(p.db_key) for p in matches]
 
     def __str__(self):
         return ",".join(self.all())
@@ -632,11 +765,118 @@ class TagHandler(object):
 class AliasHandler(TagHandler):
     _tagtype = "alias"
 
+    def _at_change(self):
+        "Let the object know its aliases changed (to update search indices)"
+        hook = getattr(type(self.obj), "_at_aliases_change", None)
+        if hook:
+            hook(self.obj)
+
+    def add_many(self, tags, category=None, data=None):
+        super(AliasHandler, self).add_many(tags, category=category, data=data)
+        self._at_change()
+
+    def remove_many(self, tags, category=None):
+        super(AliasHandler, self).remove_many(tags, category=category)
+        self._at_change()
+
+    def clear(self):
+        super(AliasHandler, self).clear()
+        self._at_change()
+
 
 class PermissionHandler(TagHandler):
     _tagtype = "permission"
 
 
+#------------------------------------------------------------
+#
+# Typeclass registry
+#
+#------------------------------------------------------------
+
+class TypeclassRegistry(object):
+    """
+    Cache of typeclass path resolutions, shared by all TypedObjects
+    so that each path is only imported once rather than once for
+    every object loaded.
+
+    Entries are keyed on (database model, typeclass path) - the model
+    matters since it decides the path prefixes searched - and hold
+    (full path, class) for paths that could be resolved and (None,
+    error message) for those that could not. Failed paths are only
+    remembered for failed_timeout seconds, so a typeclass module
+    that is fixed or was failing to import for a passing reason
+    (like a database error at import time) is picked up again. The
+    registry is emptied at every @reload (which restarts the server
+    process); code changing typeclass modules while the server runs
+    should call flush(). Swapping to a typeclass with
+    swap_typeclass() always resolves its path anew.
+    """
+    # seconds to remember that a path could not be resolved
+    failed_timeout = 10
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        "Empty the registry and reset all statistics."
+        self.registry = {}
+        # (model, path) -> expiry time of failed resolutions
+        self.failed = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, model, path):
+        "Return (full path, class), (None, errstring) or None if not resolved yet."
+        key = (model, path)
+        try:
+            entry = self.registry[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        if entry[0] is None and self.failed.get(key, 0) < time():
+            # a failure that is too old to trust
+            del self.registry[key]
+            self.failed.pop(key, None)
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def set(self, model, path, tpath, typeclass):
+        "Store a resolution. tpath is None for a failed one."
+        key = (model, path)
+        self.registry[key] = (tpath, typeclass)
+        if tpath is None:
+            self.failed[key] = time() + self.failed_timeout
+        else:
+            self.failed.pop(key, None)
+
+    def flush(self, path=None):
+        "Forget the resolutions of path (of all models), or all of them."
+        if path is None:
+            self.invalidations += len(self.registry)
+            self.registry = {}
+            self.failed = {}
+        else:
+            for key in [key for key in self.registry if key[1] == path]:
+                del self.registry[key]
+                self.failed.pop(key, None)
+                self.invalidations += 1
+
+    def stats(self):
+        "Return a dict of registry statistics."
+        return {"size": len(self.registry),
+                "failed": len([entry for entry in self.registry.values() if entry[0] is None]),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations}
+
+TYPECLASS_REGISTRY = TypeclassRegistry()
+
+
 #------------------------------------------------------------
 #
 # Typed Objects
@@ -842,47 +1082,65 @@ class TypedObject(SharedMemoryModel):
                 return typeclass
         except AttributeError:
             pass
-        errstring = ""
         if not path:
             # this means we should get the default obj without giving errors.
             return _GA(self, "_get_default_typeclass")(cache=True, silent=True, save=True)
+        tpath, typeclass = _GA(self, "_resolve_typeclass")(path)
+        if tpath:
+            # we succeeded to import. Cache and return.
+            if tpath != path:
+                _SA(self, "typeclass_path", tpath)
+            typeclass = typeclass(self)
+            _SA(self, "_cached_typeclass", typeclass)
+            try:
+                typeclass.at_init()
+                return typeclass
+            except AttributeError:
+                logger.log_trace("\n%s: Error initializing typeclass %s. Using default." % (self, tpath))
+                errstring = ""
+            except Exception:
+                logger.log_trace()
+                return typeclass
         else:
-            # handle loading/importing of typeclasses, searching all paths.
-            # (self._typeclass_paths is a shortcut to settings.TYPECLASS_*_PATHS
-            # where '*' is either OBJECT, SCRIPT or PLAYER depending on the
-            # typed entities).
-            typeclass_paths = [path] + ["%s.%s" % (prefix, path)
-                                    for prefix in _GA(self, '_typeclass_paths')]
-
-            for tpath in typeclass_paths:
-
-                # try to import and analyze the result
-                typeclass = _GA(self, "_path_import")(tpath)
-                if callable(typeclass):
-                    # we succeeded to import. Cache and return.
-                    _SA(self, "typeclass_path", tpath)
-                    typeclass = typeclass(self)
-                    _SA(self, "_cached_typeclass", typeclass)
-                    try:
-                        typeclass.at_init()
-                    except AttributeError:
-                        logger.log_trace("\n%s: Error initializing typeclass %s. Using default." % (self, tpath))
-                        break
-                    except Exception:
-                        logger.log_trace()
-                    return typeclass
-                elif hasattr(typeclass, '__file__'):
-                    errstring += "\n%s seems to be just the path to a module. You need" % tpath
-                    errstring +=  " to specify the actual typeclass name inside the module too."
-                elif typeclass:
-                    errstring += "\n%s" % typeclass.strip()    # this will hold a growing error message.
-            errstring += "\nTypeclass failed to load. Falling back to default."
+            errstring = typeclass
+        errstring += "\nTypeclass failed to load. Falling back to default."
         # If we reach this point we couldn't import any typeclasses. Return
         # default. It's up to the calling method to use e.g. self.is_typeclass()
         # to detect that the result is not the one asked for.
         _GA(self, "_display_errmsg")(errstring.strip())
         return _GA(self, "_get_default_typeclass")(cache=False, silent=False, save=False)
 
+    def _resolve_typeclass(self, path):
+        """
+        Find the typeclass class for path, also searching the
+        prefixes in self._typeclass_paths (a shortcut to
+        settings.TYPECLASS_*_PATHS where '*' is either OBJECT, SCRIPT
+        or PLAYER depending on the typed entities).
+
+        Returns (full path, class) or (None, errstring). The results
+        are remembered in TYPECLASS_REGISTRY (failures only briefly),
+        so the imports are only done once per path and not for every
+        object using it.
+        """
+        model = _GA(self, "__class__")
+        entry = TYPECLASS_REGISTRY.get(model, path)
+        if entry:
+            return entry
+        errstring = ""
+        for tpath in [path] + ["%s.%s" % (prefix, path) for prefix in _GA(self, "_typeclass_paths")]:
+            # try to import and analyze the result
+            typeclass = _GA(self, "_path_import")(tpath)
+            if callable(typeclass):
+                TYPECLASS_REGISTRY.set(model, path, tpath, typeclass)
+                return tpath, typeclass
+            elif hasattr(typeclass, '__file__'):
+                errstring += "\n%s seems to be just the path to a module. You need" % tpath
+                errstring +=  " to specify the actual typeclass name inside the module too."
+            elif typeclass:
+                errstring += "\n%s" % typeclass.strip()    # this will hold a growing error message.
+        TYPECLASS_REGISTRY.set(model, path, None, errstring)
+        return None, errstring
+
     #@typeclass.deleter
     def __typeclass_del(self):
         "Deleter. Disallow 'del self.typeclass'"
@@ -952,7 +1210,7 @@ class TypedObject(SharedMemoryModel):
         Default operation is to load a default typeclass.
         """
         defpath = _GA(self, "_default_typeclass_path")
-        typeclass = _GA(self, "_path_import")(defpath)
+        typeclass = _GA(self, "_resolve_typeclass")(defpath)[1]
         # if not silent:
         #     #errstring = "\n\nUsing Default class '%s'." % defpath
         #     _GA(self, "_display_errmsg")(errstring)
@@ -963,7 +1221,7 @@ class TypedObject(SharedMemoryModel):
             # scripts/players etc.
             failpath = defpath
             defpath = "src.objects.objects.Object"
-            typeclass = _GA(self, "_path_import")(defpath)
+            typeclass = _GA(self, "_resolve_typeclass")(defpath)[1]
             if not silent:
                 #errstring = "  %s\n%s" % (typeclass, errstring)
                 errstring = "  Default class '%s' failed to load." % failpath
@@ -1073,7 +1331,11 @@ class TypedObject(SharedMemoryModel):
                                    "Script '%s'.\nStop and start a new Script of the " \
                                    "right type instead." % self.key)
 
-        _SA(self, "typeclass_path", new_typeclass.strip())
+        new_typeclass = new_typeclass.strip()
+        # the typeclass module may have been added or changed since
+        # the path was last resolved
+        TYPECLASS_REGISTRY.flush(new_typeclass)
+        _SA(self, "typeclass_path", new_typeclass)
         # this will automatically use a default class if
         # there is an error with the given typeclass.
         new_typeclass = self.typeclass
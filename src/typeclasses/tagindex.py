@@ -0,0 +1,228 @@
+"""
+Tag index
+
+This keeps an in-memory index from every tag - a (key, category,
+tagtype) combination - to the set of ids of the entities carrying
+it, so that questions like "all objects tagged both 'forest' and
+'north'" can be answered with set operations instead of database
+joins.
+
+The index for a given model (like "objects.objectdb") is loaded from
+the database the first time it is queried. After that it is kept up
+to date through the m2m_changed signal of the db_tags relations
+(which all TagHandler operations go through) and the deletion of
+tagged entities. Deleting or changing a Tag itself drops the index of
+its model so it is reloaded when next needed.
+"""
+
+from collections import defaultdict
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.contrib.contenttypes.models import ContentType
+
+__all__ = ("TAG_INDEX", "TagIndex")
+
+_Tag = None
+
+
+def _natural_key(model):
+    "Get the natural key of a model class, like objects.objectdb"
+    meta = model._meta
+    return "%s.%s" % (meta.app_label, meta.model_name)
+
+
+def _tag_class():
+    "Lazy-load the Tag model"
+    global _Tag
+    if not _Tag:
+        from src.typeclasses.models import Tag as _Tag
+    return _Tag
+
+
+class TagIndex(object):
+    """
+    Index of (key, category, tagtype) -> entity ids, per model.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        "Drop all indices; they will be reloaded when needed"
+        # model -> (key, category, tagtype) -> set of entity ids
+        self.tags = {}
+        # model -> entity id -> set of (key, category, tagtype)
+        self.entities = {}
+        # tag id -> (key, category, tagtype)
+        self.tagdata = {}
+
+    def _tagkey(self, tag):
+        "Get and remember the index key of a Tag"
+        tagkey = (tag.db_key, tag.db_category, tag.db_tagtype)
+        self.tagdata[tag.id] = tagkey
+        return tagkey
+
+    def _tagkeys(self, tag_ids):
+        "Get the index keys of Tags from their ids"
+        tagdata = self.tagdata
+        missing = [tag_id for tag_id in tag_ids if tag_id not in tagdata]
+        if missing:
+            for tag in _tag_class().objects.filter(id__in=missing):
+                self._tagkey(tag)
+        return [tagdata[tag_id] for tag_id in tag_ids if tag_id in tagdata]
+
+    def load(self, model):
+        """
+        Load the index of model (a natural key like objects.objectdb)
+        from the database.
+        """
+        objclass = ContentType.objects.get_by_natural_key(*model.split(".", 1)).model_class()
+        field = objclass._meta.get_field("db_tags")
+        through = field.rel.through
+        tags = defaultdict(set)
+        entities = defaultdict(set)
+        for tag in _tag_class().objects.filter(id__in=through.objects.values("%s_id" % field.m2m_reverse_field_name())):
+            self._tagkey(tag)
+        tagdata = self.tagdata
+        for entity_id, tag_id in through.objects.values_list("%s_id" % field.m2m_field_name(),
+                                                             "%s_id" % field.m2m_reverse_field_name()):
+            tagkey = tagdata[tag_id]
+            tags[tagkey].add(entity_id)
+            entities[entity_id].add(tagkey)
+        self.tags[model] = tags
+        self.entities[model] = entities
+
+    def unload(self, model):
+        "Drop the index of model"
+        self.tags.pop(model, None)
+        self.entities.pop(model, None)
+
+    def add(self, model, entity_id, tagkeys):
+        "Note that an entity got tags"
+        if model in self.tags:
+            tags, entities = self.tags[model], self.entities[model]
+            for tagkey in tagkeys:
+                tags[tagkey].add(entity_id)
+                entities[entity_id].add(tagkey)
+
+    def remove(self, model, entity_id, tagkeys=None):
+        "Note that an entity lost tags (all its tags if tagkeys is None)"
+        if model in self.tags:
+            tags, entities = self.tags[model], self.entities[model]
+            if tagkeys is None:
+                tagkeys = entities.pop(entity_id, ())
+            else:
+                entities[entity_id].difference_update(tagkeys)
+            for tagkey in tagkeys:
+                ids = tags.get(tagkey)
+                if ids:
+                    ids.discard(entity_id)
+                    if not ids:
+                        del tags[tagkey]
+
+    def get(self, model, key=None, category=None, tagtype=None):
+        """
+        Get the set of ids of the entities of model carrying a tag.
+        If key or category is None, tags with any key or category
+        match. Key and category are case-insensitive.
+        """
+        if model not in self.tags:
+            self.load(model)
+        tags = self.tags[model]
+        key = key.lower().strip() if key is not None else None
+        category = category.lower().strip() if category is not None else None
+        if key is not None and category is not None:
+            return set(tags.get((key, category, tagtype), ()))
+        ids = set()
+        for (tkey, tcategory, ttagtype), tids in tags.items():
+            if (ttagtype == tagtype and (key is None or tkey == key)
+                    and (category is None or tcategory == category)):
+                ids.update(tids)
+        return ids
+
+    def search(self, model, tags, category=None, tagtype=None, union=False):
+        """
+        Get the set of ids of the entities of model carrying all (or
+        with union set, any) of the given tags. tags is a list of
+        keys or of (key, category) tuples; category is used for plain
+        keys.
+        """
+        result = None
+        for tag in tags:
+            key, cat = tag if isinstance(tag, tuple) else (tag, category)
+            ids = self.get(model, key=key, category=cat, tagtype=tagtype)
+            if result is None:
+                result = ids
+            elif union:
+                result.update(ids)
+            else:
+                result.intersection_update(ids)
+            if not result and not union:
+                break
+        return result or set()
+
+
+TAG_INDEX = TagIndex()
+
+
+#
+# Signal handlers keeping the index up to date
+#
+
+def _tags_changed(sender, instance=None, action=None, reverse=False, model=None, pk_set=None, **kwargs):
+    "Called by the m2m_changed signal"
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    Tag = _tag_class()
+    if not reverse and model is Tag:
+        # entity.db_tags.add/remove/clear(tags)
+        objmodel = _natural_key(instance.__class__)
+        if objmodel not in TAG_INDEX.tags:
+            return
+        if action == "post_clear":
+            TAG_INDEX.remove(objmodel, instance.id)
+        elif action == "post_add":
+            TAG_INDEX.add(objmodel, instance.id, TAG_INDEX._tagkeys(pk_set))
+        else:
+            TAG_INDEX.remove(objmodel, instance.id, TAG_INDEX._tagkeys(pk_set))
+    elif reverse and isinstance(instance, Tag):
+        # tag.<entity>_set.add/remove/clear(entities)
+        objmodel = _natural_key(model)
+        if objmodel not in TAG_INDEX.tags:
+            return
+        if action == "post_clear":
+            TAG_INDEX.unload(objmodel)
+            return
+        tagkeys = [TAG_INDEX._tagkey(instance)]
+        for entity_id in pk_set:
+            if action == "post_add":
+                TAG_INDEX.add(objmodel, entity_id, tagkeys)
+            else:
+                TAG_INDEX.remove(objmodel, entity_id, tagkeys)
+
+
+def _entity_deleted(sender, instance=None, **kwargs):
+    "Called by the post_delete signal"
+    if not TAG_INDEX.tags:
+        return
+    if isinstance(instance, _tag_class()):
+        tagkey = TAG_INDEX.tagdata.pop(instance.id, None)
+        if tagkey:
+            TAG_INDEX.unload(instance.db_model)
+    else:
+        objmodel = _natural_key(sender)
+        if objmodel in TAG_INDEX.tags:
+            TAG_INDEX.remove(objmodel, instance.id)
+
+
+def _tag_saved(sender, instance=None, created=False, **kwargs):
+    "Called by the post_save signal"
+    if not created and TAG_INDEX.tags and isinstance(instance, _tag_class()):
+        tagkey = TAG_INDEX.tagdata.get(instance.id)
+        if tagkey and tagkey != (instance.db_key, instance.db_category, instance.db_tagtype):
+            # the tag itself was changed
+            del TAG_INDEX.tagdata[instance.id]
+            TAG_INDEX.unload(instance.db_model)
+
+
+m2m_changed.connect(_tags_changed, dispatch_uid="tagindex_m2m")
+post_delete.connect(_entity_deleted, dispatch_uid="tagindex_delete")
+post_save.connect(_tag_saved, dispatch_uid="tagindex_tagsave")
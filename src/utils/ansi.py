@@ -14,7 +14,7 @@ user.
 
 """
 import re
-from src.utils import utils
+from itertools import product
 from src.utils.utils import to_str, to_unicode
 
 # ANSI definitions
@@ -60,9 +60,62 @@ ANSI_SPACE = " "
 # Escapes
 ANSI_ESCAPES = ("{{", "%%", "\\\\")
 
-from collections import OrderedDict
-_PARSE_CACHE = OrderedDict()
-_PARSE_CACHE_SIZE = 10000
+# max total length (in bytes) of the strings kept in the parse cache
+_PARSE_CACHE_MAXSIZE = 4 * 1024 * 1024
+
+
+class ParseCache(object):
+    """
+    Cache of parsed strings, limited by the total length of the
+    strings it holds rather than by their number, so a few long texts
+    (like room descriptions) don't push out lots of short ones.
+
+    Entries are kept in two generations. New entries go into the
+    recent one; when that holds half the max size it becomes the old
+    generation and the previous old one is thrown away. Entries found
+    in the old generation are moved back into the recent one, so
+    entries in use survive (an approximation of an LRU cache needing
+    only plain dict operations).
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        "Empty the cache"
+        # key -> (value, size)
+        self.recent = {}
+        self.old = {}
+        self.size = 0
+
+    def get(self, key):
+        "Get a cached value, or None"
+        entry = self.recent.get(key)
+        if entry is None:
+            entry = self.old.pop(key, None)
+            if entry is None:
+                return None
+            self._store(key, entry)
+        return entry[0]
+
+    def set(self, key, value, size):
+        """
+        Cache value under key. size is the number of bytes it is
+        counted as. Values too large to be worth caching are ignored.
+        """
+        if size <= self.maxsize / 8:
+            self._store(key, (value, size))
+
+    def _store(self, key, entry):
+        "Add an entry to the recent generation"
+        self.recent[key] = entry
+        self.size += entry[1]
+        if self.size > self.maxsize / 2:
+            self.old = self.recent
+            self.recent = {}
+            self.size = 0
+
+_PARSE_CACHE = ParseCache(_PARSE_CACHE_MAXSIZE)
 
 
 class ANSIParser(object):
@@ -172,6 +225,107 @@ class ANSIParser(object):
         """
         return self.ansi_regex.sub("", string)
 
+    def code_map(self, target="ansi"):
+        """
+        Get a dict mapping all the colour codes (the ansi_map keys as
+        well as all the xterm256 codes) to what they are rendered as
+        for target: ANSI sequences for "ansi" and "xterm256" (for
+        "ansi", xterm256 codes are mapped to the closest normal ANSI
+        colour) and only the whitespace codes for "strip".
+        """
+        attrname = "_%s_code_map" % target
+        codemap = self.__dict__.get(attrname)
+        if codemap is None:
+            if target == "strip":
+                codemap = dict((code, self.strip_raw_codes(seq))
+                               for code, seq in self.code_map("ansi").items())
+            else:
+                codemap = dict(self.ansi_map)
+                self.do_xterm256 = target == "xterm256"
+                for prefix in ("%", "%[", "{", "{["):
+                    for rgb in product("012345", repeat=3):
+                        code = prefix + "".join(rgb)
+                        codemap[code] = self.sub_xterm256(self.xterm256_sub.match(code))
+            setattr(self, attrname, codemap)
+        return codemap
+
+    def tokenize(self, string):
+        """
+        Scans markup into a list of tokens. Even-numbered tokens are
+        plain text (with escapes resolved, and possibly empty), the
+        odd-numbered ones are the colour codes between them (like {r,
+        %cn or {123). The result is cached and must not be changed.
+        """
+        cachekey = (string, "tokens")
+        tokens = _PARSE_CACHE.get(cachekey)
+        if tokens is None:
+            string = to_str(string)
+            tokens = self.markup_regex.split(string)
+            if len(tokens) > 1 and ("{{" in string or "%%" in string or "\\" in string):
+                # escapes are just text; merge them with their neighbours
+                parts, tokens = tokens, tokens[:1]
+                escape_map = self.escape_map
+                for icode in xrange(1, len(parts), 2):
+                    code = parts[icode]
+                    if code in escape_map:
+                        tokens[-1] += escape_map[code] + parts[icode + 1]
+                    else:
+                        tokens.append(code)
+                        tokens.append(parts[icode + 1])
+            _PARSE_CACHE.set(cachekey, tokens, 2 * len(string))
+        return tokens
+
+    def _render(self, tokens, target):
+        "Replace the codes in a token list using the code map of target"
+        if len(tokens) == 1:
+            return tokens[0]
+        codemap = self.code_map(target)
+        out = tokens[:]
+        out[1::2] = [codemap[code] for code in tokens[1::2]]
+        return "".join(out)
+
+    def render_ansi(self, tokens):
+        """
+        Renders a token list to text with ANSI sequences.
+        """
+        return self._render(tokens, "ansi")
+
+    def render_xterm256(self, tokens):
+        """
+        Renders a token list to text with ANSI sequences, using
+        xterm256 colours.
+        """
+        return self._render(tokens, "xterm256")
+
+    def render_strip(self, tokens):
+        """
+        Renders a token list to text without any colour.
+        """
+        string = self._render(tokens, "strip")
+        if ANSI_ESCAPE in string:
+            # remove ansi codes manually inserted in the string
+            string = self.strip_raw_codes(string)
+        return string
+
+    def render(self, string, target="ansi", renderer=None):
+        """
+        Renders markup for the given target, which is the name of one
+        of the render_<target> methods (ansi, xterm256, strip). The
+        string is only tokenized once for all targets, and the
+        results are cached.
+
+        renderer - a callable taking the token list and returning the
+                   rendered string, used instead of the render_<target>
+                   method (target must still be a unique name for it).
+        """
+        cachekey = (string, target)
+        rendered = _PARSE_CACHE.get(cachekey)
+        if rendered is None:
+            renderer = renderer or getattr(self, "render_%s" % target)
+            rendered = renderer(self.tokenize(string))
+            _PARSE_CACHE.set(cachekey, rendered, len(string) + len(rendered))
+        return rendered
+
     def parse_ansi(self, string, strip_ansi=False, xterm256=False):
         """
         Parses a string, subbing color codes according to
@@ -189,34 +343,10 @@ class ANSIParser(object):
         if not string:
             return ''
 
-        # check cached parsings
-        global _PARSE_CACHE
-        cachekey = "%s-%s-%s" % (string, strip_ansi, xterm256)
-        if cachekey in _PARSE_CACHE:
-            return _PARSE_CACHE[cachekey]
-
-        self.do_xterm256 = xterm256
-        in_string = utils.to_str(string)
-
-        # do string replacement
-        parsed_string =  ""
-        parts = self.ansi_escapes.split(in_string) + [" "]
-        for part, sep in zip(parts[::2], parts[1::2]):
-            pstring = self.xterm256_sub.sub(self.sub_xterm256, part)
-            pstring = self.ansi_sub.sub(self.sub_ansi, pstring)
-            parsed_string += "%s%s" % (pstring, sep[0].strip())
-
         if strip_ansi:
-            # remove all ansi codes (including those manually
-            # inserted in string)
-            return self.strip_raw_codes(parsed_string)
-
-         # cache and crop old cache
-        _PARSE_CACHE[cachekey] = parsed_string
-        if len(_PARSE_CACHE) > _PARSE_CACHE_SIZE:
-           _PARSE_CACHE.popitem(last=False)
+            return self.render(string, "strip")
+        return self.render(string, "xterm256" if xterm256 else "ansi")
 
-        return parsed_string
     # MUX-style mappings %cr %cn etc
 
     mux_ansi_map = [
@@ -315,6 +445,13 @@ class ANSIParser(object):
     # escapes - these double-chars will be replaced with a single
     # instance of each
     ansi_escapes = re.compile(r"(%s)" % "|".join(ANSI_ESCAPES), re.DOTALL)
+    escape_map = {"{{": "{", "%%": "%", "\\": "\\"}
+
+    # all markup (escapes first), for splitting strings into tokens
+    markup_regex = re.compile(r"(%s)" % "|".join(list(ANSI_ESCAPES) +
+                                                 [tup[0] for tup in xterm256_map] +
+                                                 [re.escape(tup[0]) for tup in mux_ansi_map + ext_ansi_map]),
+                              re.DOTALL)
 
 ANSI_PARSER = ANSIParser()
 
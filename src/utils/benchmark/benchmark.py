@@ -0,0 +1,230 @@
+"""
+Benchmark runner
+
+This module times a set of central code paths of Evennia (the command
+pipeline, locks, Attributes, serialization, ANSI parsing and so on)
+without needing a running server or any network connections. The
+benchmarks are run against a fresh in-memory sqlite database, so your
+real database is never touched.
+
+Run from the game/ directory:
+
+    python ../src/utils/benchmark/benchmark.py [options] [case names]
+
+This runs all cases (or only the given ones) and prints the time per
+call. Use -o <file> to also store the results as JSON. Two such
+result files can be compared to find regressions:
+
+    python ../src/utils/benchmark/benchmark.py --compare old.json new.json
+
+This lists the change of every case and exits with an error status if
+any case got slower than the threshold (default 10%).
+
+The cases are defined in benchmark_cases.py. Use --cases to give the
+python path to your own module of cases, which must follow the same
+form.
+
+Each case is called repeatedly in rounds; the number of calls per
+round is increased until a round takes long enough to be measured
+reliably. The best round (least disturbed by the rest of the system)
+is the main result, like for Python's timeit module. The average
+number of database queries per call is recorded too.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import platform
+from optparse import OptionParser
+
+# Tack on the root evennia directory to the python path and initialize django settings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game.settings")
+
+from django.conf import settings
+
+# default module holding the cases
+DEFAULT_CASES_MODULE = "src.utils.benchmark.benchmark_cases"
+# number of timed rounds per case
+DEFAULT_REPEAT = 5
+# minimum time (in seconds) a round should take
+DEFAULT_MINTIME = 0.1
+# slowdown (fraction) flagged as a regression when comparing results
+DEFAULT_THRESHOLD = 0.1
+
+
+#------------------------------------------------------------
+# Timing
+#------------------------------------------------------------
+
+def _time_round(func, number):
+    "Time number calls to func, returning the total time in seconds"
+    gcold = gc.isenabled()
+    gc.disable()
+    try:
+        t0 = time.time()
+        for _ in xrange(number):
+            func()
+        return time.time() - t0
+    finally:
+        if gcold:
+            gc.enable()
+
+
+def time_case(func, number=0, repeat=DEFAULT_REPEAT, mintime=DEFAULT_MINTIME):
+    """
+    Time a callable.
+
+    func - callable without arguments to time
+    number - calls per round. If 0, this is calibrated so that a round
+             takes at least mintime seconds.
+    repeat - number of timed rounds
+
+    Returns a dict with the number of calls per round, the best,
+    median and worst time per call (in seconds) and the mean number
+    of database queries per call.
+    """
+    from django.db import connection
+
+    if not number:
+        number = 1
+        while _time_round(func, number) < mintime:
+            number *= 10
+    old_debug_cursor = connection.use_debug_cursor
+    connection.use_debug_cursor = True
+    try:
+        times = []
+        nqueries = 0
+        for _ in range(repeat):
+            connection.queries = []
+            times.append(_time_round(func, number) / number)
+            nqueries += len(connection.queries)
+    finally:
+        connection.use_debug_cursor = old_debug_cursor
+        connection.queries = []
+    times.sort()
+    return {"number": number,
+            "repeat": repeat,
+            "best": times[0],
+            "median": times[len(times) // 2],
+            "worst": times[-1],
+            "queries": float(nqueries) / (number * repeat)}
+
+
+def setup_database():
+    """
+    Point Django at a new in-memory sqlite database and create all
+    tables. This must be called before anything touches the database.
+    """
+    from django.db import connection
+    settings.DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3",
+                                     "NAME": ":memory:"}
+    if "south" in settings.INSTALLED_APPS:
+        # create the tables directly from the models
+        from south.management.commands import patch_for_test_db_setup
+        settings.SOUTH_TESTS_MIGRATE = False
+        patch_for_test_db_setup()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def run_benchmarks(cases_module=DEFAULT_CASES_MODULE, names=None, number=0,
+                   repeat=DEFAULT_REPEAT, mintime=DEFAULT_MINTIME, verbose=True):
+    """
+    Run the benchmark cases of cases_module, optionally limited to
+    those whose names are given. The database must already be set up.
+    Returns the results as a dict.
+    """
+    from src.utils.utils import mod_import
+
+    module = mod_import(cases_module)
+    cases = [(name, func) for name, func in module.CASES if not names or name in names]
+    env = module.setup_environment() if hasattr(module, "setup_environment") else {}
+
+    results = {}
+    for name, case in cases:
+        func = case(env)
+        # one untimed call to warm up caches
+        func()
+        results[name] = time_case(func, number=number, repeat=repeat, mintime=mintime)
+        if verbose:
+            print "%-25s %12.2f us/call %8.2f queries/call" % (
+                  name, results[name]["best"] * 1e6, results[name]["queries"])
+    return {"timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cases_module": cases_module,
+            "results": results}
+
+
+#------------------------------------------------------------
+# Comparing results
+#------------------------------------------------------------
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two result dicts (as returned by run_benchmarks).
+
+    Returns a list of (name, old time, new time, change) for all
+    cases found in both, where change is the relative change of the
+    best time (0.1 means 10% slower), as well as a list of the
+    names of cases that got slower than threshold.
+    """
+    rows = []
+    regressions = []
+    for name in sorted(set(old["results"]).intersection(new["results"])):
+        oldtime = old["results"][name]["best"]
+        newtime = new["results"][name]["best"]
+        change = (newtime - oldtime) / oldtime if oldtime else 0.0
+        rows.append((name, oldtime, newtime, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def _load(filename):
+    "Load a JSON result file"
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+
+    parser = OptionParser(usage="%prog [options] [case names]\n       %prog --compare <old.json> <new.json>",
+                          description="Time central Evennia code paths against an in-memory database.")
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help="store the results as JSON in this file")
+    parser.add_option('-c', '--cases', dest='cases', default=DEFAULT_CASES_MODULE,
+                      help="python path to module defining the CASES to run")
+    parser.add_option('-n', '--number', dest='number', type='int', default=0,
+                      help="calls per timed round (default is to calibrate)")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=DEFAULT_REPEAT,
+                      help="number of timed rounds (default %i)" % DEFAULT_REPEAT)
+    parser.add_option('--compare', action='store_true', dest='compare', default=False,
+                      help="compare two result files instead of running")
+    parser.add_option('-t', '--threshold', dest='threshold', type='float', default=DEFAULT_THRESHOLD,
+                      help="slowdown to flag when comparing (default %g)" % DEFAULT_THRESHOLD)
+
+    options, args = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error("--compare needs two result files.")
+        rows, regressions = compare(_load(args[0]), _load(args[1]), threshold=options.threshold)
+        for name, oldtime, newtime, change in rows:
+            print "%-25s %12.2f us -> %12.2f us %+7.1f%%%s" % (
+                  name, oldtime * 1e6, newtime * 1e6, change * 100,
+                  name in regressions and "  SLOWER" or "")
+        if regressions:
+            print "%i case(s) got more than %g%% slower." % (len(regressions), options.threshold * 100)
+            sys.exit(1)
+        sys.exit(0)
+
+    setup_database()
+    results = run_benchmarks(cases_module=options.cases, names=args,
+                             number=options.number, repeat=options.repeat)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print "Results were written to %s." % options.output
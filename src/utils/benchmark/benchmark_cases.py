@@ -0,0 +1,159 @@
+"""
+Benchmark cases
+
+This module defines the cases timed by benchmark.py. Each case is a
+function taking the environment dictionary created by
+setup_environment() and returning a callable without arguments. This
+callable is what is timed, so the case function should do all
+needed preparation before returning it.
+
+CASES lists (name, function) for all cases, in the order they are run.
+To benchmark your own game code, make a module with a CASES list (and
+optionally a setup_environment function) of the same form and give its
+python path with the --cases option.
+"""
+
+from itertools import cycle
+from django.conf import settings
+from src.utils import create, dbserialize
+from src.utils.ansi import ANSI_PARSER
+from src.utils.text2html import parse_html
+from src.utils.evtable import EvTable
+from src.commands.cmdhandler import get_and_merge_cmdsets
+from src.commands.cmdparser import cmdparser
+
+
+def setup_environment():
+    """
+    Create the entities used by the benchmarks. Returns a dict.
+    """
+    room1 = create.create_object(settings.BASE_ROOM_TYPECLASS, key="BenchRoom1", nohome=True)
+    room2 = create.create_object(settings.BASE_ROOM_TYPECLASS, key="BenchRoom2", nohome=True)
+    room1.db.desc = "A {rred{n and {bblue{n room used for benchmarking."
+    char = create.create_object(settings.BASE_CHARACTER_TYPECLASS, key="BenchChar",
+                                location=room1, home=room1)
+    char.permissions.add("Builders")
+    objs = [create.create_object(settings.BASE_OBJECT_TYPECLASS, key="BenchObj%i" % i,
+                                 location=room1, home=room1) for i in range(10)]
+    exit = create.create_object(settings.BASE_EXIT_TYPECLASS, key="north", aliases=["n"],
+                                location=room1, home=room1, destination=room2)
+    objs[0].locks.add("get:perm(Builders) and not attr(immovable);"
+                      "examine:perm(Builders) or id(%i)" % char.id)
+    return {"room1": room1, "room2": room2, "char": char, "objs": objs, "exit": exit}
+
+
+def _result(deferred):
+    "Get the result of an already fired deferred"
+    results = []
+    deferred.addCallback(results.append)
+    return results[0]
+
+
+def case_cmdhandler(env):
+    "The full command pipeline for a look command"
+    char = env["char"]
+    return lambda: char.execute_cmd("look")
+
+
+def case_get_and_merge_cmdsets(env):
+    "Gathering and merging the cmdsets in a room"
+    char = env["char"]
+    return lambda: get_and_merge_cmdsets(char, None, None, char, "object")
+
+
+def case_cmdparser(env):
+    "Matching input against a merged cmdset"
+    char = env["char"]
+    cmdset = _result(get_and_merge_cmdsets(char, None, None, char, "object"))
+    return lambda: cmdparser("look BenchObj1", cmdset, char)
+
+
+def case_lockhandler_check(env):
+    "Checking a compound lock"
+    char, obj = env["char"], env["objs"][0]
+    return lambda: obj.locks.check(char, "get")
+
+
+def case_attribute_get(env):
+    "Reading an Attribute"
+    obj = env["objs"][1]
+    obj.attributes.add("bench", {"key": [1, 2, 3], "obj": env["room1"]})
+    return lambda: obj.attributes.get("bench")
+
+
+def case_attribute_add(env):
+    "Storing an Attribute"
+    obj = env["objs"][2]
+    values = cycle(({"key": [1, 2, 3]}, {"key": [4, 5, 6]}))
+    return lambda: obj.attributes.add("bench", next(values))
+
+
+def case_dbserialize(env):
+    "Packing and unpacking a nested structure holding an object"
+    data = {"list": range(20), "tuple": ("a", "b", (1, 2)),
+            "dict": {"x": 1.5, "y": u"unicode"}, "obj": env["room1"]}
+    return lambda: dbserialize.from_pickle(dbserialize.to_pickle(data))
+
+
+def case_dbserialize_blob(env):
+    "Storing and reading back a large blob, like the ticker storage"
+    data = dict((("key%i" % i, i), ([env["room1"], i], {"x": "text %i" % i})) for i in range(50))
+    return lambda: dbserialize.do_unpickle(dbserialize.dbserialize(data))
+
+
+def case_parse_ansi(env):
+    "Parsing a (previously parsed) line of markup"
+    text = "{rRed{n {gGreen{n {bBlue{n {555xterm{n {[rbg{n plain text " * 3
+    return lambda: ANSI_PARSER.parse_ansi(text, xterm256=True)
+
+
+def case_parse_ansi_uncached(env):
+    "Parsing a new line of markup"
+    text = "{rRed{n {gGreen{n {bBlue{n {555xterm{n {[rbg{n plain text %i" * 3
+    counter = iter(xrange(10**9))
+    return lambda: ANSI_PARSER.parse_ansi(text % ((next(counter),) * 3), xterm256=True)
+
+
+def case_parse_html_uncached(env):
+    "Converting a new line of markup to html for the webclient"
+    text = "{rRed{n {gGreen{n <{bBlue{n> {555xterm{n {[rbg{n plain  text %i" * 3
+    counter = iter(xrange(10**9))
+    return lambda: parse_html(text % ((next(counter),) * 3))
+
+
+def case_evtable(env):
+    "Rendering a 4x10 table"
+    table = [["{wcell %i-%i{n" % (icol, irow) for irow in range(10)] for icol in range(4)]
+    return lambda: unicode(EvTable("one", "two", "three", "four", table=table, border="cells"))
+
+
+def case_typeclass_load(env):
+    "Loading the typeclass of an object fresh from the database"
+    dbobj = env["objs"][4].dbobj
+    def load():
+        object.__setattr__(dbobj, "_cached_typeclass", None)
+        return dbobj.typeclass
+    return load
+
+
+def case_move_to(env):
+    "Moving an object between rooms"
+    obj = env["objs"][3]
+    rooms = cycle((env["room2"], env["room1"]))
+    return lambda: obj.move_to(next(rooms), quiet=True)
+
+
+CASES = (("cmdhandler", case_cmdhandler),
+         ("get_and_merge_cmdsets", case_get_and_merge_cmdsets),
+         ("cmdparser", case_cmdparser),
+         ("lockhandler_check", case_lockhandler_check),
+         ("attribute_get", case_attribute_get),
+         ("attribute_add", case_attribute_add),
+         ("dbserialize", case_dbserialize),
+         ("dbserialize_blob", case_dbserialize_blob),
+         ("parse_ansi", case_parse_ansi),
+         ("parse_ansi_uncached", case_parse_ansi_uncached),
+         ("parse_html_uncached", case_parse_html_uncached),
+         ("evtable", case_evtable),
+         ("typeclass_load", case_typeclass_load),
+         ("move_to", case_move_to))
@@ -20,11 +20,15 @@ be out of sync with the database.
 """
 
 from functools import update_wrapper
+from datetime import date, timedelta
 from collections import defaultdict, MutableSequence, MutableSet, MutableMapping
+from zlib import compress, decompress
 try:
-    from cPickle import dumps, loads
+    from cPickle import dumps, loads, Pickler
+    from cStringIO import StringIO
 except ImportError:
-    from pickle import dumps, loads
+    from pickle import dumps, loads, Pickler
+    from StringIO import StringIO
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.contenttypes.models import ContentType
@@ -32,7 +36,8 @@ from src.server.models import ServerConfig
 from src.utils.utils import to_str, uses_database
 from src.utils import logger
 
-__all__ = ("to_pickle", "from_pickle", "do_pickle", "do_unpickle")
+__all__ = ("to_pickle", "from_pickle", "do_pickle", "do_unpickle",
+           "compact_dumps", "compact_loads", "is_compact", "compact_version")
 
 PICKLE_PROTOCOL = 2
 
@@ -243,6 +248,177 @@ def unpack_dbobj(item):
         dbobj = obj
     return _TO_DATESTRING(dbobj) == item[2] and obj or None
 
+def dbobj_ref(obj):
+    """
+    Get the (natural_key, id) reference identifying a database
+    object, the same as is stored in its packed form. Returns None
+    for things that would not be packed.
+    """
+    _init_globals()
+    obj = hasattr(obj, 'dbobj') and obj.dbobj or obj
+    natural_key = _FROM_MODEL_MAP[hasattr(obj, "id") and hasattr(obj, "db_date_created") and
+                                  hasattr(obj, '__class__') and obj.__class__.__name__.lower()]
+    return natural_key and (natural_key, _GA(obj, "id")) or None
+
+def packed_dbobj_refs(data, refs=None):
+    """
+    Find the packed database objects in data (on the form returned
+    by to_pickle). Returns a set of (natural_key, id) references, as
+    returned by dbobj_ref.
+    """
+    refs = set() if refs is None else refs
+    dtype = type(data)
+    if _IS_PACKED_DBOBJ(data):
+        refs.add((data[1], data[3]))
+    elif dtype in (tuple, list, set):
+        for val in data:
+            packed_dbobj_refs(val, refs)
+    elif dtype == dict:
+        for key, val in data.items():
+            packed_dbobj_refs(key, refs)
+            packed_dbobj_refs(val, refs)
+    elif dtype not in (str, unicode, int, long, float, bool) and hasattr(data, '__iter__'):
+        try:
+            for val in data:
+                packed_dbobj_refs(val, refs)
+        except TypeError:
+            pass
+    return refs
+
+def packed_is_plain(data):
+    """
+    Check if data (on the form returned by to_pickle) holds only
+    basic (immutable) types and dates in lists, tuples, dicts and
+    sets, and packed database objects. Once decoded onto an
+    Attribute, such a value can only be changed in-place through the
+    _Saver* iterables, which save the change.
+    """
+    dtype = type(data)
+    if dtype in _BASIC_TYPES or isinstance(data, (date, timedelta)):
+        return True
+    if dtype in (tuple, list, set):
+        return all(packed_is_plain(val) for val in data)
+    if dtype == dict:
+        return all(packed_is_plain(key) and packed_is_plain(val) for key, val in data.iteritems())
+    return False
+
+#
+# Type dispatch
+#
+# Each serialization step looks up a handler for the exact type of
+# the item being processed, instead of testing the type against a
+# chain of alternatives. Types not in a table go to its fallback.
+#
+
+_BASIC_TYPES = (str, unicode, int, long, float, bool, type(None))
+
+
+def _identity(item, *args):
+    "Handler for data that needs no conversion"
+    return item
+
+
+# to_pickle
+
+def _pack_item(item):
+    "Convert an item to its storable form"
+    return _PACK_DISPATCH.get(type(item), pack_dbobj)(item)
+
+def _pack_tuple(item):
+    return tuple(_pack_item(val) for val in item)
+
+def _pack_list(item):
+    return [_pack_item(val) for val in item]
+
+def _pack_dict(item):
+    return dict((_pack_item(key), _pack_item(val)) for key, val in item.items())
+
+def _pack_set(item):
+    return set(_pack_item(val) for val in item)
+
+_PACK_DISPATCH = dict((dtype, _identity) for dtype in _BASIC_TYPES)
+_PACK_DISPATCH.update({tuple: _pack_tuple,
+                       list: _pack_list,
+                       _SaverList: lambda item: _pack_list(item._data),
+                       dict: _pack_dict,
+                       _SaverDict: lambda item: _pack_dict(item._data),
+                       set: _pack_set,
+                       _SaverSet: lambda item: _pack_set(item._data)})
+
+
+# from_pickle
+
+def _unpack_item(item):
+    "Convert an item back from its stored form"
+    return _UNPACK_DISPATCH.get(type(item), _unpack_other)(item)
+
+def _unpack_tuple(item):
+    if len(item) == 4 and item[0] == '__packed_dbobj__':
+        return unpack_dbobj(item)
+    return tuple(_unpack_item(val) for val in item)
+
+def _unpack_dict(item):
+    return dict((_unpack_item(key), _unpack_item(val)) for key, val in item.items())
+
+def _unpack_other(item):
+    if hasattr(item, '__iter__'):
+        try:
+            # we try to conserve the iterable class if
+            # it accepts an iterator
+            return item.__class__(_unpack_item(val) for val in item)
+        except (AttributeError, TypeError):
+            return [_unpack_item(val) for val in item]
+    return item
+
+_UNPACK_DISPATCH = dict((dtype, _identity) for dtype in _BASIC_TYPES)
+_UNPACK_DISPATCH.update({tuple: _unpack_tuple,
+                         list: lambda item: [_unpack_item(val) for val in item],
+                         dict: _unpack_dict,
+                         set: lambda item: set(_unpack_item(val) for val in item)})
+
+
+# from_pickle onto a db_obj, building a tree of _Saver* iterables
+
+def _unpack_tree(item, parent):
+    "Convert an item back from its stored form, as part of a _Saver* tree"
+    return _TREE_DISPATCH.get(type(item), _tree_other)(item, parent)
+
+def _tree_tuple(item, parent):
+    if len(item) == 4 and item[0] == '__packed_dbobj__':
+        return unpack_dbobj(item)
+    return tuple(_unpack_tree(val, item) for val in item)
+
+def _tree_list(item, parent=None, db_obj=None):
+    dat = _SaverList(parent=parent, db_obj=db_obj)
+    dat._data.extend(_unpack_tree(val, dat) for val in item)
+    return dat
+
+def _tree_dict(item, parent=None, db_obj=None):
+    dat = _SaverDict(parent=parent, db_obj=db_obj)
+    dat._data.update((_unpack_item(key), _unpack_tree(val, dat)) for key, val in item.items())
+    return dat
+
+def _tree_set(item, parent=None, db_obj=None):
+    dat = _SaverSet(parent=parent, db_obj=db_obj)
+    dat._data.update(_unpack_tree(val, dat) for val in item)
+    return dat
+
+def _tree_other(item, parent):
+    if hasattr(item, '__iter__'):
+        try:
+            # we try to conserve the iterable class if it
+            # accepts an iterator
+            return item.__class__(_unpack_tree(val, parent) for val in item)
+        except (AttributeError, TypeError):
+            return _tree_list(item, parent=parent)
+    return item
+
+_TREE_DISPATCH = dict((dtype, _identity) for dtype in _BASIC_TYPES)
+_TREE_DISPATCH.update({tuple: _tree_tuple,
+                       list: _tree_list,
+                       dict: _tree_dict,
+                       set: _tree_set})
+
 #
 # Access methods
 #
@@ -255,27 +431,7 @@ def to_pickle(data):
     We also convert any Saver*-type objects back to their normal
     representations, they are not pickle-safe.
     """
-    def process_item(item):
-        "Recursive processor and identification of data"
-        dtype = type(item)
-        if dtype in (basestring, int, long, float, bool):
-            return item
-        elif dtype == tuple:
-            return tuple(process_item(val) for val in item)
-        elif dtype in (list, _SaverList):
-            return [process_item(val) for val in item]
-        elif dtype in (dict, _SaverDict):
-            return dict((process_item(key), process_item(val)) for key, val in item.items())
-        elif dtype in (set, _SaverSet):
-            return set(process_item(val) for val in item)
-        elif hasattr(item, '__item__'):
-            # we try to conserve the iterable class, if not convert to list
-            try:
-                return item.__class__([process_item(val) for val in item])
-            except (AttributeError, TypeError):
-                return [process_item(val) for val in item]
-        return pack_dbobj(item)
-    return process_item(data)
+    return _pack_item(data)
 
 
 @transaction.autocommit
@@ -295,91 +451,103 @@ def from_pickle(data, db_obj=None):
     to their _SaverList, _SaverDict and _SaverSet counterparts.
 
     """
-    def process_item(item):
-        "Recursive processor and identification of data"
-        dtype = type(item)
-        if dtype in (basestring, int, long, float, bool):
-            return item
-        elif _IS_PACKED_DBOBJ(item):
-            # this must be checked before tuple
-            return unpack_dbobj(item)
-        elif dtype == tuple:
-            return tuple(process_item(val) for val in item)
-        elif dtype == dict:
-            return dict((process_item(key), process_item(val)) for key, val in item.items())
-        elif dtype == set:
-            return set(process_item(val) for val in item)
-        elif hasattr(item, '__iter__'):
-            try:
-                # we try to conserve the iterable class if
-                # it accepts an iterator
-                return item.__class__(process_item(val) for val in item)
-            except (AttributeError, TypeError):
-                return [process_item(val) for val in item]
-        return item
-
-    def process_tree(item, parent):
-        "Recursive processor, building a parent-tree from iterable data"
-        dtype = type(item)
-        if dtype in (basestring, int, long, float, bool):
-            return item
-        elif _IS_PACKED_DBOBJ(item):
-            # this must be checked before tuple
-            return unpack_dbobj(item)
-        elif dtype == tuple:
-            return tuple(process_tree(val, item) for val in item)
-        elif dtype == list:
-            dat = _SaverList(parent=parent)
-            dat._data.extend(process_tree(val, dat) for val in item)
-            return dat
-        elif dtype == dict:
-            dat = _SaverDict(parent=parent)
-            dat._data.update(dict((process_item(key), process_tree(val, dat))
-                                   for key, val in item.items()))
-            return dat
-        elif dtype == set:
-            dat = _SaverSet(parent=parent)
-            dat._data.update(set(process_tree(val, dat) for val in item))
-            return dat
-        elif hasattr(item, '__iter__'):
-            try:
-                # we try to conserve the iterable class if it
-                # accepts an iterator
-                return item.__class__(process_tree(val, parent) for val in item)
-            except (AttributeError, TypeError):
-                dat = _SaverList(parent=parent)
-                dat._data.extend(process_tree(val, dat) for val in item)
-                return dat
-        return item
-
     if db_obj:
         # convert lists, dicts and sets to their Saved* counterparts. It
         # is only relevant if the "root" is an iterable of the right type.
         dtype = type(data)
         if dtype == list:
-            dat = _SaverList(db_obj=db_obj)
-            dat._data.extend(process_tree(val, parent=dat) for val in data)
-            return dat
+            return _tree_list(data, db_obj=db_obj)
         elif dtype == dict:
-            dat = _SaverDict(db_obj=db_obj)
-            dat._data.update((process_item(key), process_tree(val, parent=dat))
-                              for key, val in data.items())
-            return dat
+            return _tree_dict(data, db_obj=db_obj)
         elif dtype == set:
-            dat = _SaverSet(db_obj=db_obj)
-            dat._data.update(process_tree(val, parent=dat) for val in data)
-            return dat
-    return process_item(data)
+            return _tree_set(data, db_obj=db_obj)
+    return _unpack_item(data)
+
+#
+# Storage format
+#
+# Attribute values (the data returned by to_pickle) are stored in a
+# compact format: a header, a flag telling if the rest is compressed
+# and the data pickled with protocol 2. Larger dumps are compressed,
+# making them considerably smaller than the plain pickle. The pickler
+# runs in "fast" mode (without its memo), which is quicker and makes
+# equal data always give the same string no matter how its parts
+# reference each other - Attribute value lookups rely on this. Data
+# that cannot be pickled this way (self-referencing structures) is
+# stored as a plain pickle instead.
+#
+
+COMPACT_VERSION = 2
+_COMPACT_MAGIC = "\x00evdb"
+_COMPACT_HEADER = _COMPACT_MAGIC + chr(COMPACT_VERSION)
+_HEADER_LEN = len(_COMPACT_HEADER)
+# dumps longer than this (in bytes) are compressed
+_COMPRESS_MIN = 256
+_COMPRESS_LEVEL = 1
+
+
+def is_compact(data):
+    "Check if a serialized string is in the compact format"
+    return data.startswith(_COMPACT_MAGIC)
+
+
+def compact_version(data):
+    "Get the compact format version of a serialized string (None if not compact)"
+    if data.startswith(_COMPACT_MAGIC) and len(data) >= _HEADER_LEN:
+        return ord(data[_HEADER_LEN - 1])
+    return None
+
+
+def compact_dumps(data):
+    """
+    Serialize data (on the form returned by to_pickle) to a string in
+    the compact format. Raises ValueError if data contains things
+    that cannot be stored in this format.
+    """
+    buf = StringIO()
+    pickler = Pickler(buf, PICKLE_PROTOCOL)
+    pickler.fast = 1
+    try:
+        pickler.dump(data)
+    except RuntimeError:
+        # the pure-python pickler recurses on cyclic data
+        raise ValueError("dbserialize: cyclic data cannot be stored in compact format.")
+    dump = buf.getvalue()
+    if len(dump) > _COMPRESS_MIN:
+        compressed = compress(dump, _COMPRESS_LEVEL)
+        if len(compressed) < len(dump):
+            return _COMPACT_HEADER + "\x01" + compressed
+    return _COMPACT_HEADER + "\x00" + dump
+
+
+def compact_loads(data):
+    """
+    Retrieve data from a string in the compact format.
+    """
+    if not data.startswith(_COMPACT_HEADER):
+        raise ValueError("dbserialize: unknown compact format version %i." % ord(data[_HEADER_LEN - 1]))
+    if data[_HEADER_LEN] == "\x01":
+        return loads(decompress(data[_HEADER_LEN + 1:]))
+    return loads(data[_HEADER_LEN + 1:])
 
 
 def do_pickle(data):
-    "Perform pickle to string"
-    return to_str(dumps(data, protocol=PICKLE_PROTOCOL))
+    """
+    Serialize to string, using the compact format if possible and
+    pickle otherwise.
+    """
+    try:
+        return compact_dumps(data)
+    except ValueError:
+        return to_str(dumps(data, protocol=PICKLE_PROTOCOL))
 
 
 def do_unpickle(data):
-    "Retrieve pickle from pickled string"
-    return loads(to_str(data))
+    "Retrieve data from a string made by do_pickle (or a plain pickle)"
+    data = to_str(data)
+    if is_compact(data):
+        return compact_loads(data)
+    return loads(data)
 
 
 def dbserialize(data):
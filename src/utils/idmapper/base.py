@@ -20,6 +20,7 @@ from manager import SharedMemoryManager
 
 _FIELD_CACHE_GET = None
 _FIELD_CACHE_SET = None
+_WRITEBEHIND = None
 _GA = object.__getattribute__
 _SA = object.__setattr__
 _DA = object.__delattr__
@@ -315,10 +316,15 @@ class SharedMemoryModel(Model):
         Method to flush an instance from the cache. The instance will always be flushed from the cache,
         since this is most likely called from delete(), and we want to make sure we don't cache dead objects.
         """
+        if _WRITEBEHIND and _WRITEBEHIND.pending:
+            # make sure a re-loaded instance is up-to-date
+            _WRITEBEHIND.flush_instance(instance)
         cls._flush_cached_by_key(instance._get_pk_val())
     flush_cached_instance = classmethod(flush_cached_instance)
 
     def flush_instance_cache(cls):
+        if _WRITEBEHIND and _WRITEBEHIND.pending:
+            _WRITEBEHIND.flush()
         cls.__instance_cache__ = {} #WeakValueDictionary()
     flush_instance_cache = classmethod(flush_instance_cache)
 
@@ -332,6 +338,13 @@ class SharedMemoryModel(Model):
 
         if _IS_MAIN_THREAD:
             # in main thread - normal operation
+            global _WRITEBEHIND
+            if not _WRITEBEHIND:
+                from src.server.writebehind import WRITEBEHIND as _WRITEBEHIND
+            if (_WRITEBEHIND.active and not args and not _IS_SUBPROCESS and not kwargs.get("force_insert")
+                    and _WRITEBEHIND.defer(cls, kwargs.get("update_fields"))):
+                # the write is made later, see src.server.writebehind
+                return
             super(SharedMemoryModel, cls).save(*args, **kwargs)
         else:
             # in another thread; make sure to save in reactor thread
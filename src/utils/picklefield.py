@@ -27,6 +27,11 @@ Pickle field implementation for Django.
 
 Modified for Evennia by Griatch.
 
+Values are stored in the compact (compressed, memo-less pickle)
+format of src.utils.dbserialize rather than as plain pickles, except
+for self-referencing data which cannot use it. Both forms can be
+read.
+
 """
 
 from copy import deepcopy
@@ -35,6 +40,7 @@ from zlib import compress, decompress
 #import six # this is actually a pypy component, not in default syslib
 import django
 from django.db import models
+from src.utils.dbserialize import compact_dumps, compact_loads, is_compact
 
 # django 1.5 introduces force_text instead of force_unicode
 try:
@@ -85,7 +91,14 @@ def wrap_conflictual_object(obj):
     return obj
 
 
-def dbsafe_encode(value, compress_object=False, pickle_protocol=DEFAULT_PROTOCOL):
+def dbsafe_encode(value, compress_object=False, pickle_protocol=DEFAULT_PROTOCOL, compact=True):
+    # Values are stored in dbserialize's compact format unless compact
+    # is False or they cannot use it (self-referencing data).
+    if compact:
+        try:
+            return PickledObject(b64encode(compact_dumps(value)).decode())
+        except ValueError:
+            pass
     # We use deepcopy() here to avoid a problem with cPickle, where dumps
     # can generate different character streams for same lookup value if
     # they are referenced differently.
@@ -102,6 +115,8 @@ def dbsafe_encode(value, compress_object=False, pickle_protocol=DEFAULT_PROTOCOL
 def dbsafe_decode(value, compress_object=False):
     value = value.encode() # encode str to bytes
     value = b64decode(value)
+    if is_compact(value):
+        return compact_loads(value)
     if compress_object:
         value = decompress(value)
     return loads(value)
@@ -182,18 +182,20 @@ help_entries = search_help_entries
 
 # Locate Tags
 
-#    search_object_tag(key, category=None) (also search_tag works)
-#    search_player_tag(key, category=None)
-#    search_script_tag(key, category=None)
-#    search_channel_tag(key, category=None)
+#    search_object_tag(key, category=None, union=False) (also search_tag works)
+#    search_player_tag(key, category=None, union=False)
+#    search_script_tag(key, category=None, union=False)
+#    search_channel_tag(key, category=None, union=False)
 
 # Note that this returns the object attached to the tag, not the tag itself
-# (this is usually what you want)
+# (this is usually what you want). The key can also be a list of keys
+# and/or (key, category) tuples, returning the objects having all of
+# these tags (or any of them, with union=True).
 search_tag = Tag.objects.get_objs_with_tag
-def search_object_tag(key, category=None): return Tag.objects.get_objs_with_tag(key, category, model="objects.objectdb")
-def search_player_tag(key, category=None): return Tag.objects.get_objs_with_tag(key, category, model="players.playerdb")
-def search_script_tag(key, category=None): return Tag.objects.get_objs_with_tag(key, category, model="scripts.scriptdb")
-def search_channel_tag(key, category=None): return Tag.objects.get_objs_with_tag(key, category, model="comms.channeldb")
+def search_object_tag(key, category=None, union=False): return Tag.objects.get_objs_with_tag(key, category, model="objects.objectdb", union=union)
+def search_player_tag(key, category=None, union=False): return Tag.objects.get_objs_with_tag(key, category, model="players.playerdb", union=union)
+def search_script_tag(key, category=None, union=False): return Tag.objects.get_objs_with_tag(key, category, model="scripts.scriptdb", union=union)
+def search_channel_tag(key, category=None, union=False): return Tag.objects.get_objs_with_tag(key, category, model="comms.channeldb", union=union)
 
 #        """
 #        Search and return all tags matching any combination of
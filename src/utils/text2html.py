@@ -2,6 +2,9 @@
 """
 ANSI -> html converter
 
+This converts Evennia markup (and ANSI sequences) directly to html
+for the webclient, in one pass over the tokens of ANSIParser.tokenize.
+
 Credit for original idea and implementation
 goes to Muhammad Alkarouri and his
 snippet #577349 on http://code.activestate.com.
@@ -11,8 +14,12 @@ snippet #577349 on http://code.activestate.com.
 
 import re
 import cgi
+from itertools import count
 from ansi import *
 
+# gives every parser instance its own cache target
+_PARSER_IDS = count(1)
+
 
 class TextToHTMLparser(object):
     """
@@ -20,81 +27,161 @@ class TextToHTMLparser(object):
     """
 
     tabstop = 4
-    # mapping html color name <-> ansi code.
-    hilite = ANSI_HILITE
-    normal = ANSI_NORMAL
-    underline = ANSI_UNDERLINE
-    colorcodes = [
-            ('red', hilite + ANSI_RED),
-            ('maroon', ANSI_RED),
-            ('lime', hilite + ANSI_GREEN),
-            ('green', ANSI_GREEN),
-            ('yellow', hilite + ANSI_YELLOW),
-            ('olive', ANSI_YELLOW),
-            ('blue', hilite + ANSI_BLUE),
-            ('navy', ANSI_BLUE),
-            ('magenta', hilite + ANSI_MAGENTA),
-            ('purple', ANSI_MAGENTA),
-            ('cyan', hilite + ANSI_CYAN),
-            ('teal', ANSI_CYAN),
-            ('white', hilite + ANSI_WHITE),  # pure white
-            ('gray', ANSI_WHITE),  # light grey
-            ('dimgray', hilite + ANSI_BLACK),  # dark grey
-            ('black', ANSI_BLACK),  # pure black
-    ]
-    colorback = [
-            ('bgred', hilite + ANSI_BACK_RED),
-            ('bgmaroon', ANSI_BACK_RED),
-            ('bglime', hilite + ANSI_BACK_GREEN),
-            ('bggreen', ANSI_BACK_GREEN),
-            ('bgyellow', hilite + ANSI_BACK_YELLOW),
-            ('bgolive', ANSI_BACK_YELLOW),
-            ('bgblue', hilite + ANSI_BACK_BLUE),
-            ('bgnavy', ANSI_BACK_BLUE),
-            ('bgmagenta', hilite + ANSI_BACK_MAGENTA),
-            ('bgpurple', ANSI_BACK_MAGENTA),
-            ('bgcyan', hilite + ANSI_BACK_CYAN),
-            ('bgteal', ANSI_BACK_CYAN),
-            ('bgwhite', hilite + ANSI_BACK_WHITE),
-            ('bggray', ANSI_BACK_WHITE),
-            ('bgdimgray', hilite + ANSI_BACK_BLACK),
-            ('bgblack', ANSI_BACK_BLACK),
-    ]
-
-    # make sure to escape [
-    colorcodes = [(c, code.replace("[", r"\[")) for c, code in colorcodes]
-    colorback = [(c, code.replace("[", r"\[")) for c, code in colorback]
-    # create stop markers
-    fgstop = [("", c.replace("[", r"\[")) for c in (normal, hilite, underline)]
-    bgstop = [("", c.replace("[", r"\[")) for c in (normal,)]
-    fgstop = "|".join(co[1] for co in colorcodes + fgstop + [("", "$")])
-    bgstop = "|".join(co[1] for co in colorback + bgstop + [("", "$")])
-
-    # pre-compile regexes
-    re_fgs = [(cname, re.compile("(?:%s)(.*?)(?=%s)" % (code, fgstop))) for cname, code in colorcodes]
-    re_bgs = [(cname, re.compile("(?:%s)(.*?)(?=%s)" % (code, bgstop))) for cname, code in colorback]
-    re_normal = re.compile(normal.replace("[", r"\["))
-    re_hilite = re.compile("(?:%s)(.*)(?=%s)" % (hilite.replace("[", r"\["), fgstop))
-    re_uline = re.compile("(?:%s)(.*?)(?=%s)" % (ANSI_UNDERLINE.replace("[", r"\["), fgstop))
+    # the parser tokenizing the markup
+    ansi_parser = ANSI_PARSER
+    # html color class names for the ansi colours 0-7 (fg 30-37, bg 40-47)
+    colors = ("black", "maroon", "green", "olive", "navy", "purple", "teal", "gray")
+    hilite_colors = ("dimgray", "red", "lime", "yellow", "blue", "magenta", "cyan", "white")
+
+    re_sgr = re.compile("\033\[([0-9;]+)m")
     re_string = re.compile(r'(?P<htmlchars>[<&>])|(?P<space> [ \t]+)|(?P<lineend>\r\n|\r|\n)', re.S|re.M|re.I)
 
-    def re_color(self, text):
+    def __init__(self):
+        # unlike id(self), this is never reused by a later parser
+        self.parser_id = _PARSER_IDS.next()
+
+    def code_effects(self):
+        """
+        Get a dict mapping every colour code of the ansi parser to
+        (sgr, text), where sgr is the tuple of ANSI SGR numbers (like
+        1 for hilite, 31 for red) it sets and text is the text it
+        inserts (for codes like {/).
+        """
+        effects = self.__dict__.get("_code_effects")
+        if effects is None:
+            effects = {}
+            re_sgr = self.re_sgr
+            for code, seq in self.ansi_parser.code_map("ansi").items():
+                sgr = tuple(int(num) for params in re_sgr.findall(seq) for num in params.split(";"))
+                effects[code] = (sgr, re_sgr.sub("", seq))
+            self._code_effects = effects
+        return effects
+
+    def span(self, fg, bg, hilite, underline):
         """
-        Replace ansi colors with html color class names.
-        Let the client choose how it will display colors, if it wishes to.  """
-        for colorname, regex in self.re_fgs:
-            text = regex.sub(r'''<span class="%s">\1</span>''' % colorname, text)
-        for bgname, regex in self.re_bgs:
-            text = regex.sub(r'''<span class="%s">\1</span>''' % bgname, text)
-        return self.re_normal.sub("", text)
-
-    def re_bold(self, text):
-        "Clean out superfluous hilights rather than set <strong>to make it match the look of telnet."
-        return self.re_hilite.sub(r'<strong>\1</strong>', text)
-
-    def re_underline(self, text):
-        "Replace ansi underline with html underline class name."
-        return self.re_uline.sub(r'<span class="underline">\1</span>', text)
+        Get the (start, end) html tags enclosing a text with the given
+        ansi state (colour numbers 0-7 or None and flags); empty
+        strings for plain text. Hilite without a foreground colour
+        makes the text bold.
+        """
+        spans = self.__dict__.setdefault("_spans", {})
+        state = (fg, bg, hilite, underline)
+        span = spans.get(state)
+        if span is None:
+            classes = []
+            if fg is not None:
+                classes.append((self.hilite_colors if hilite else self.colors)[fg])
+            if bg is not None:
+                classes.append("bg" + self.colors[bg])
+            if underline:
+                classes.append("underline")
+            start, end = classes and ('<span class="%s">' % " ".join(classes), "</span>") or ("", "")
+            if hilite and fg is None:
+                start, end = "<strong>" + start, end + "</strong>"
+            span = (start, end)
+            spans[state] = span
+        return span
+
+    def _split_raw(self, tokens):
+        """
+        Returns the token list with any ANSI sequences already in its
+        texts (like from an ANSIString) split out into codes of their
+        own.
+        """
+        re_sgr = self.re_sgr
+        split = [""]
+        for itoken, token in enumerate(tokens):
+            if itoken % 2:
+                split.append(token)
+                split.append("")
+            else:
+                parts = re_sgr.split(token)
+                split[-1] += parts[0]
+                for ipart in xrange(1, len(parts), 2):
+                    split.append("\033[%sm" % parts[ipart])
+                    split.append(parts[ipart + 1])
+        return split
+
+    def _effect(self, code):
+        "Get the (sgr, text) of a code, or of a raw ANSI sequence"
+        effect = self.code_effects().get(code)
+        if effect is None:
+            effect = (tuple(int(num) for num in self.re_sgr.match(code).group(1).split(";")), "")
+        return effect
+
+    def render_tokens(self, tokens, strip_ansi=False):
+        """
+        Renders a token list from ANSIParser.tokenize to html in one
+        pass, keeping track of the colour state the codes would set
+        on an ANSI terminal. Every stretch of text is wrapped in a
+        single span with the class names of its colours (see span()),
+        so the spans are never nested.
+        """
+        if any("\033[" in token for token in tokens[::2]):
+            tokens = self._split_raw(tokens)
+        effects = self.code_effects()
+        spans = self.__dict__.setdefault("_spans", {})
+        out = []
+        fg = bg = None
+        hilite = underline = False
+        span = ("", "")
+        run = [tokens[0]]
+        for icode in xrange(1, len(tokens), 2):
+            sgr, text = effects.get(tokens[icode]) or self._effect(tokens[icode])
+            if text:
+                run.append(text)
+            if sgr and not strip_ansi:
+                for num in sgr:
+                    if num == 0:
+                        fg = bg = None
+                        hilite = underline = False
+                    elif num == 1:
+                        hilite = True
+                    elif num == 4:
+                        underline = True
+                    elif 30 <= num <= 37:
+                        fg = num - 30
+                    elif 40 <= num <= 47:
+                        bg = num - 40
+                state = (fg, bg, hilite, underline)
+                newspan = spans.get(state)
+                if newspan is None:
+                    newspan = self.span(*state)
+                if newspan != span:
+                    self._add_run(out, run, span)
+                    run = []
+                    span = newspan
+            run.append(tokens[icode + 1])
+        self._add_run(out, run, span)
+        return "".join(out)
+
+    def _add_run(self, out, run, span):
+        "Convert a stretch of text with the same colours and add it to out"
+        text = "".join(run)
+        if text:
+            # short texts (like single words) are converted once
+            fragments = self.__dict__.setdefault("_fragments", {})
+            html = fragments.get(text)
+            if html is None:
+                html = self.convert_text(text)
+                if len(text) <= 256:
+                    if len(fragments) >= 10000:
+                        fragments.clear()
+                    fragments[text] = html
+            out.append(span[0] and "%s%s%s" % (span[0], html, span[1]) or html)
+
+    def convert_text(self, text):
+        "Convert plain text (no markup) to html"
+        if "\033" in text or "\07" in text or "\010" in text:
+            text = self.remove_bells(text)
+            text = self.remove_backspaces(text)
+            # remove ansi codes manually inserted in the text
+            text = self.ansi_parser.strip_raw_codes(text)
+        text = self.re_string.sub(self.do_sub, text)
+        text = self.convert_linebreaks(text)
+        if "tp" in text or "www" in text:
+            text = self.convert_urls(text)
+        return text
 
     def remove_bells(self, text):
         "Remove ansi specials"
@@ -136,23 +223,19 @@ class TextToHTMLparser(object):
     def parse(self, text, strip_ansi=False):
         """
         Main access function, converts a text containing
-        ansi codes into html statements.
+        ansi markup into html statements.
         """
-        # parse everything to ansi first
-        text = parse_ansi(text, strip_ansi=strip_ansi, xterm256=False)
-        # convert all ansi to html
-        result = re.sub(self.re_string, self.do_sub, text)
-        result = self.re_color(result)
-        result = self.re_bold(result)
-        result = self.re_underline(result)
-        result = self.remove_bells(result)
-        result = self.convert_linebreaks(result)
-        result = self.remove_backspaces(result)
-        result = self.convert_urls(result)
-        # clean out eventual ansi that was missed
-        #result = parse_ansi(result, strip_ansi=True)
-
-        return result
+        if hasattr(text, '_raw_string'):
+            # an ANSIString is already parsed
+            return self.render_tokens([text.raw()], strip_ansi=strip_ansi)
+        if not text:
+            return ""
+        # the rendering depends on the parser, so it is part of the
+        # cache target
+        if strip_ansi:
+            return self.ansi_parser.render(text, "html_strip-%s" % self.parser_id,
+                                           lambda tokens: self.render_tokens(tokens, strip_ansi=True))
+        return self.ansi_parser.render(text, "html-%s" % self.parser_id, self.render_tokens)
 
 HTML_PARSER = TextToHTMLparser()
 
@@ -15,7 +15,8 @@ contain the 'mode' of the request to be handled by the protocol:
  mode 'receive' - tell the server that we are ready to receive data. This is a
                   long-polling (comet-style) request since the server
                   will not reply until it actually has data available.
-                  The returned data object has two variables 'msg' and 'data'
+                  The server returns an array of all data waiting for the
+                  client, each a data object with two variables 'msg' and 'data'
                   where msg should be output and 'data' is an arbitrary piece
                   of data the server and client understands (not used in default
                   client).
@@ -96,7 +97,9 @@ function webclient_receive(){
         // callback methods
 
         success: function(data){       // called when request to waitreceive completes
-            msg_display("out", data.msg);  // Add response to the message area
+            for (var i = 0; i < data.length; i++) {
+                msg_display("out", data[i].msg);  // Add response to the message area
+            }
             webclient_receive();              // immediately start a new request
         },
         error: function(XMLHttpRequest, textStatus, errorThrown){